@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Production Analytics
+
+import datetime
+import itertools
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from aurora_storage import is_compact, readings_query
+
+logger = logging.getLogger("aurora_analytics")
+
+# Loaded per reading, after the timestamp
+ANALYTICS_COLUMNS = ('power_output', 'voltage_1', 'current_1', 'voltage_2', 'current_2', 'energy_today')
+
+# Timestamps are local wall clock; as seconds since the epoch they keep day boundaries at local midnight
+LOCAL_EPOCH_SQL = "(julianday(timestamp) - 2440587.5) * 86400.0"
+
+# Gaps longer than this (seconds) are not integrated over: the inverter was off or unreachable
+MAX_GAP = 900
+
+# Power within this fraction of the AC limit counts as clipped
+CLIP_TOLERANCE = 0.98
+
+# String mismatch is only judged while the DC input is at least this share of the day's DC peak
+MISMATCH_MIN_SHARE = 0.1
+
+# Per-day results, in the order of the arrays returned by daily_metrics()
+DAILY_FIELDS = ('energy_kwh', 'energy_reported_kwh', 'dc1_kwh', 'dc2_kwh', 'peak_power',
+                'clipped_hours', 'mismatch_pct', 'samples')
+
+
+def load_arrays(conn: sqlite3.Connection, start_time: str, end_time: Optional[str] = None,
+                inverter_id: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """Load readings as one float64 array per column, plus 'epoch' (local wall-clock seconds).
+
+    Rows go straight from the cursor into a single flat array, without
+    building per-row Python objects beyond the tuples sqlite3 returns.
+    """
+    compact = is_compact(conn)
+    # The compact format already keeps timestamps as local epoch seconds
+    epoch = 'ts' if compact else LOCAL_EPOCH_SQL
+    columns = ', '.join([epoch] + [f"ifnull({c}, 0.0)" for c in ANALYTICS_COLUMNS])
+    sql, params = readings_query(start_time, end_time, inverter_id, columns=columns, compact=compact)
+    cursor = conn.cursor()
+    cursor.row_factory = None  # Plain tuples, whatever the connection uses
+    flat = np.fromiter(itertools.chain.from_iterable(cursor.execute(sql, params)), dtype=np.float64)
+    data = flat.reshape(-1, len(ANALYTICS_COLUMNS) + 1)
+    arrays = {'epoch': data[:, 0]}
+    arrays.update(zip(ANALYTICS_COLUMNS, data[:, 1:].T))
+    return arrays
+
+
+def daily_metrics(arrays: Dict[str, np.ndarray], ac_limit: Optional[float] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Per-day metrics of one inverter's time-ordered readings.
+
+    Returns the day numbers (local days since the epoch) and one array per
+    DAILY_FIELDS entry. Energy is integrated with the trapezoidal rule,
+    skipping gaps longer than MAX_GAP. Clipping is time spent at the AC
+    limit (the highest power in arrays when ac_limit is not given);
+    mismatch is the mean relative difference between the two MPPT inputs
+    while they produce.
+    """
+    epoch = arrays['epoch']
+    if len(epoch) == 0:
+        return np.array([], dtype=np.int64), {name: np.array([]) for name in DAILY_FIELDS}
+
+    day = np.floor(epoch / 86400).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+    days = day[starts]
+    index = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(day)]))
+    count = len(days)
+
+    dt = np.diff(epoch)
+    valid = (day[1:] == day[:-1]) & (dt > 0) & (dt <= MAX_GAP)
+    weights = np.where(valid, dt, 0.0)
+
+    def integrate(power: np.ndarray) -> np.ndarray:
+        """kWh per day."""
+        segments = (power[1:] + power[:-1]) * weights / (2 * 3600 * 1000)
+        return np.bincount(index[1:], weights=segments, minlength=count)
+
+    power = arrays['power_output']
+    dc1 = arrays['voltage_1'] * arrays['current_1']
+    dc2 = arrays['voltage_2'] * arrays['current_2']
+    dc = dc1 + dc2
+
+    limit = ac_limit or power.max()
+    clipped = power >= CLIP_TOLERANCE * limit if limit > 0 else np.zeros(len(power), dtype=bool)
+    clipped_seconds = np.bincount(index[1:], weights=np.where(clipped[1:] & clipped[:-1], weights, 0.0),
+                                  minlength=count)
+
+    dc_peak = np.maximum.reduceat(dc, starts)
+    producing = (dc > 0) & (dc >= MISMATCH_MIN_SHARE * dc_peak[index])
+    mismatch = np.abs(dc1 - dc2) / np.where(producing, dc / 2, 1.0)
+    producing_samples = np.bincount(index, weights=producing, minlength=count)
+    mismatch_sum = np.bincount(index, weights=np.where(producing, mismatch, 0.0), minlength=count)
+
+    metrics = {
+        'energy_kwh': integrate(power),
+        'energy_reported_kwh': np.maximum.reduceat(arrays['energy_today'], starts),
+        'dc1_kwh': integrate(dc1),
+        'dc2_kwh': integrate(dc2),
+        'peak_power': np.maximum.reduceat(power, starts),
+        'clipped_hours': clipped_seconds / 3600,
+        'mismatch_pct': np.divide(mismatch_sum * 100, producing_samples,
+                                  out=np.full(count, np.nan), where=producing_samples > 0),
+        'samples': np.bincount(index, minlength=count).astype(np.float64),
+    }
+    return days, metrics
+
+
+def solar_cos_zenith(utc: np.ndarray, latitude: float, longitude: float) -> np.ndarray:
+    """Cosine of the solar zenith angle at UTC epoch seconds (NOAA approximation)."""
+    moments = utc.astype('datetime64[s]')
+    day_of_year = (moments.astype('datetime64[D]') - moments.astype('datetime64[Y]')).astype(np.float64)
+    hour = (utc % 86400) / 3600
+    g = 2 * np.pi / 365 * (day_of_year + (hour - 12) / 24)
+    eqtime = 229.18 * (0.000075 + 0.001868 * np.cos(g) - 0.032077 * np.sin(g)
+                       - 0.014615 * np.cos(2 * g) - 0.040849 * np.sin(2 * g))
+    decl = (0.006918 - 0.399912 * np.cos(g) + 0.070257 * np.sin(g)
+            - 0.006758 * np.cos(2 * g) + 0.000907 * np.sin(2 * g)
+            - 0.002697 * np.cos(3 * g) + 0.00148 * np.sin(3 * g))
+    solar_minutes = hour * 60 + eqtime + 4 * longitude
+    hour_angle = np.radians(solar_minutes / 4 - 180)
+    lat = np.radians(latitude)
+    return np.sin(lat) * np.sin(decl) + np.cos(lat) * np.cos(decl) * np.cos(hour_angle)
+
+
+def clear_sky_insolation(days: np.ndarray, latitude: float, longitude: float,
+                         tz: Optional[datetime.tzinfo] = None, step: int = 300) -> np.ndarray:
+    """Clear-sky horizontal irradiation (kWh/m²) of each local day, Haurwitz model."""
+    if len(days) == 0:
+        return np.array([])
+    epoch = datetime.date(1970, 1, 1)
+    tz = tz or datetime.datetime.now().astimezone().tzinfo
+    offsets = np.array([
+        datetime.datetime.combine(epoch + datetime.timedelta(days=int(d)), datetime.time(12), tz)
+        .utcoffset().total_seconds() for d in days])
+    utc = days[:, None] * 86400 + np.arange(0, 86400, step)[None, :] - offsets[:, None]
+    cos_zenith = solar_cos_zenith(utc, latitude, longitude)
+    safe = np.maximum(cos_zenith, 1e-3)
+    ghi = np.where(cos_zenith > 0, 1098 * safe * np.exp(-0.057 / safe), 0.0)
+    return ghi.sum(axis=1) * step / 3600 / 1000
+
+
+class AnalyticsCache:
+    """Daily analytics of each inverter, computed once per completed day.
+
+    Past days don't change, so their metrics are kept and only days after
+    the last completed one (normally just today) are loaded and computed on
+    each request. The first request over a long range pays for loading
+    it once. Without a configured AC limit, clipping is judged against the
+    highest power seen when the cache was filled. Call invalidate() when
+    older readings are added.
+    """
+
+    def __init__(self):
+        """Initialize an empty cache."""
+        # (inverter_id, ac_limit) -> {day: {field: value}}
+        self._days: Dict[Tuple[Optional[str], Optional[float]], Dict[int, Dict[str, float]]] = {}
+        # Same key -> (first, last) completed day computed
+        self._covered: Dict[Tuple[Optional[str], Optional[float]], Tuple[int, int]] = {}
+        # Same key -> AC limit the cached days were computed with
+        self._limits: Dict[Tuple[Optional[str], Optional[float]], float] = {}
+        # Bumped by invalidate(), so loads that started before it aren't cached
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self, inverter_id: Optional[str] = None):
+        """Forget cached days (of one inverter, or all)."""
+        with self._lock:
+            self._generation += 1
+            for key in list(self._days):
+                if inverter_id is None or key[0] == inverter_id:
+                    del self._days[key]
+                    self._covered.pop(key, None)
+                    self._limits.pop(key, None)
+
+    def daily(self, conn: sqlite3.Connection, first_day: int, today: int,
+              inverter_id: Optional[str] = None, ac_limit: Optional[float] = None) -> Dict[int, Dict[str, float]]:
+        """Metrics for each day with data from first_day to today (local days since the epoch)."""
+        key = (inverter_id, ac_limit)
+        while True:
+            with self._lock:
+                covered = self._covered.get(key)
+                generation = self._generation
+            # Load only what isn't covered by completed days already computed
+            if covered is None or first_day < covered[0]:
+                load_from = first_day
+            else:
+                load_from = covered[1] + 1
+            # Outside the lock: a slow load doesn't hold up requests served from cached days
+            computed = self._compute(conn, key, load_from)
+
+            with self._lock:
+                if generation != self._generation:
+                    # Invalidated while loading
+                    continue
+                days = self._days.setdefault(key, {})
+                for day, values in computed.items():
+                    if day < today:
+                        days[day] = values
+                if today - 1 >= load_from:
+                    # Other requests may have extended the range meanwhile
+                    covered = self._covered.get(key)
+                    if covered is None:
+                        self._covered[key] = (load_from, today - 1)
+                    else:
+                        self._covered[key] = (min(load_from, covered[0]), max(today - 1, covered[1]))
+
+                result = {day: values for day, values in days.items() if first_day <= day < today}
+                if today in computed:
+                    result[today] = computed[today]
+                return result
+
+    def _compute(self, conn: sqlite3.Connection, key: Tuple[Optional[str], Optional[float]],
+                 from_day: int) -> Dict[int, Dict[str, float]]:
+        """Load and compute the days from from_day on."""
+        inverter_id, ac_limit = key
+        start = (datetime.datetime(1970, 1, 1) + datetime.timedelta(days=from_day)).strftime('%Y-%m-%d %H:%M:%S')
+        arrays = load_arrays(conn, start, inverter_id=inverter_id)
+        if not ac_limit and len(arrays['epoch']):
+            ac_limit = self._limits.setdefault(key, float(arrays['power_output'].max()))
+        days, metrics = daily_metrics(arrays, ac_limit)
+        return {int(day): {name: float(metrics[name][i]) for name in DAILY_FIELDS}
+                for i, day in enumerate(days)}
+
+
+def summarize(daily: Dict[int, Dict[str, float]], system_kwp: Optional[float] = None,
+              latitude: Optional[float] = None, longitude: Optional[float] = None,
+              tz: Optional[datetime.tzinfo] = None) -> Dict[str, Any]:
+    """Turn per-day metrics into the /api/analytics payload.
+
+    With the DC nameplate power (system_kwp) each day also gets its specific
+    yield, and with the site coordinates a performance ratio against the
+    clear-sky irradiation of that day. Without an irradiance sensor that
+    ratio reads low on cloudy days; it is meant for spotting trends.
+    """
+    ordered = sorted(daily)
+    days = np.array(ordered, dtype=np.int64)
+    insolation = None
+    if system_kwp and latitude is not None and longitude is not None:
+        insolation = clear_sky_insolation(days, latitude, longitude, tz)
+
+    epoch = datetime.date(1970, 1, 1)
+    rows: List[Dict[str, Any]] = []
+    for i, day in enumerate(ordered):
+        values = daily[day]
+        dc = values['dc1_kwh'] + values['dc2_kwh']
+        row = {
+            'date': (epoch + datetime.timedelta(days=day)).isoformat(),
+            'energy_kwh': round(values['energy_kwh'], 3),
+            'energy_reported_kwh': round(values['energy_reported_kwh'], 3),
+            'peak_power': round(values['peak_power'], 1),
+            'efficiency_pct': round(values['energy_kwh'] / dc * 100, 2) if dc > 0 else None,
+            'mppt1_kwh': round(values['dc1_kwh'], 3),
+            'mppt2_kwh': round(values['dc2_kwh'], 3),
+            'mismatch_pct': None if np.isnan(values['mismatch_pct']) else round(values['mismatch_pct'], 2),
+            'clipped_hours': round(values['clipped_hours'], 2),
+            'samples': int(values['samples']),
+        }
+        if system_kwp:
+            row['specific_yield'] = round(values['energy_kwh'] / system_kwp, 3)
+        if insolation is not None:
+            reference = system_kwp * insolation[i]
+            row['performance_ratio'] = round(values['energy_kwh'] / float(reference), 3) if reference > 0 else None
+        rows.append(row)
+
+    energy = sum(values['energy_kwh'] for values in daily.values())
+    dc = sum(values['dc1_kwh'] + values['dc2_kwh'] for values in daily.values())
+    mismatches = [row['mismatch_pct'] for row in rows if row['mismatch_pct'] is not None]
+    summary = {
+        'days': len(rows),
+        'energy_kwh': round(energy, 3),
+        'efficiency_pct': round(energy / dc * 100, 2) if dc > 0 else None,
+        'clipped_hours': round(sum(row['clipped_hours'] for row in rows), 2),
+        'mismatch_pct': round(float(np.mean(mismatches)), 2) if mismatches else None,
+    }
+    if system_kwp:
+        summary['specific_yield'] = round(energy / system_kwp, 3)
+    if insolation is not None and insolation.sum() > 0:
+        summary['performance_ratio'] = round(energy / (system_kwp * float(insolation.sum())), 3)
+    return {'days': rows, 'summary': summary}
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - History Backfill
+
+import datetime
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from aurora_daylight import ACTIVE
+from aurora_metrics import REGISTRY
+from aurora_poller import InverterTarget, PollingEngine
+from aurora_storage import ReadingStore
+
+logger = logging.getLogger("aurora_backfill")
+
+BACKFILLED_DAYS = REGISTRY.counter('aurora_backfilled_days_total',
+                                   'Days of energy history read back from the inverter logs', ('inverter',))
+
+# The inverter keeps a year of daily energy
+MAX_DAYS = 365
+
+
+class Backfiller:
+    """Fills the days the monitor missed from the inverters' daily energy logs.
+
+    Each run looks for incomplete days among the last days days (see
+    ReadingStore.incomplete_days) and reads their energy from the inverter
+    over the poller's own connection, batch_size days per request batch.
+    Every batch is stored in its own transaction, so an interrupted run
+    keeps what it read and the next run only asks for the rest. Between
+    batches the connection is free for the poller and the backfill pauses
+    for pause seconds; inverters that are asleep are left alone.
+    """
+
+    def __init__(self, store: ReadingStore, engine: PollingEngine, days: int = MAX_DAYS,
+                 batch_size: int = 8, pause: float = 2.0, interval: float = 3600,
+                 min_power: float = 50, timeout: float = 30):
+        """Initialize the backfill; call start() to run it every interval seconds."""
+        self.store = store
+        self.engine = engine
+        self.days = min(int(days), MAX_DAYS)
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self.min_power = min_power
+        self.timeout = timeout
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self, today: Optional[datetime.date] = None) -> Dict[str, Any]:
+        """Backfill every inverter; returns and logs a report of the run."""
+        begin = time.perf_counter()
+        today = today or datetime.date.today()
+        # Today is still being recorded
+        first_day = (today - datetime.timedelta(days=self.days)).isoformat()
+        last_day = (today - datetime.timedelta(days=1)).isoformat()
+
+        filled, missing = {}, {}
+        for target in self.engine.targets:
+            if self._stop.is_set():
+                break
+            days = self.store.incomplete_days(target.inverter_id, first_day, last_day, self.min_power)
+            filled[target.inverter_id] = self.backfill(target, days, today) if days else 0
+            missing[target.inverter_id] = len(days) - filled[target.inverter_id]
+
+        self.last_report = {
+            'filled': filled,
+            'missing': missing,
+            'elapsed_seconds': round(time.perf_counter() - begin, 3),
+        }
+        if any(filled.values()) or any(missing.values()):
+            logger.info(f"Backfill stored {sum(filled.values())} days from the inverter logs, "
+                        f"{sum(missing.values())} still missing ({self.last_report['elapsed_seconds']:.1f}s)")
+        return self.last_report
+
+    def backfill(self, target: InverterTarget, days: List[str], today: datetime.date) -> int:
+        """Read and store the given days (newest first) of one inverter; returns how many were stored."""
+        stored = 0
+        for start in range(0, len(days), self.batch_size):
+            if self._stop.is_set():
+                break
+            if target.activity is not None and target.activity.state != ACTIVE:
+                # Don't wake up a sleeping inverter: retry on the next run
+                break
+            connection = self.engine.connection_for(target.inverter_id)
+            if connection is None:
+                break
+
+            batch = days[start:start + self.batch_size]
+            days_back = [(today - datetime.date.fromisoformat(day)).days for day in batch]
+            try:
+                values = connection.request_threadsafe(
+                    lambda client, address: client.send_daily_energy_commands(address, days_back),
+                    target.address, timeout=self.timeout)
+            except Exception as e:
+                logger.warning(f"Backfill of inverter {target.inverter_id} stopped: {e}")
+                break
+
+            rows = [(day, wh / 1000) for day, wh in zip(batch, values) if wh is not None]
+            if not rows:
+                # No answers: asleep, or the inverter has no energy log
+                break
+            stored += self.store.add_daily_energy(target.inverter_id, rows)
+            BACKFILLED_DAYS.labels(target.inverter_id).inc(len(rows))
+            self._stop.wait(self.pause)
+        return stored
+
+    def start(self, delay: float = 60):
+        """Run the backfill in a background thread, first after delay seconds."""
+        if not self.days:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(delay,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread, interrupting a run between batches."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, delay: float):
+        """Background thread: backfill every interval seconds."""
+        wait = delay
+        while not self._stop.wait(wait):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Error backfilling history: {e}")
+            wait = self.interval
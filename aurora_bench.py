@@ -0,0 +1,944 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Benchmarks
+# Runs against the local simulator, no inverter needed
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import math
+import os
+import random
+import sqlite3
+import statistics
+import struct
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from aurora_client import AuroraClient, read_inverter_data
+from aurora_connection import AuroraConnection
+from aurora_poller import InverterTarget, PollingEngine
+from aurora_schedule import MEASUREMENTS, MeasurementSchedule, measurement_intervals
+from aurora_simulator import AuroraSimulator
+from aurora_storage import (INSERT_READING, MIGRATIONS, ReadingStore, add_measurement_columns,
+                            create_schema, reading_row, readings_query)
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of samples."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(name: str, samples: List[float], unit: str = "ms", scale: float = 1000.0):
+    """Print mean/p50/p95/max for a list of durations in seconds."""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{name:<28} n={len(samples):<5} "
+          f"mean={statistics.mean(samples) * scale:8.2f}{unit} "
+          f"p50={statistics.median(samples) * scale:8.2f}{unit} "
+          f"p95={p95 * scale:8.2f}{unit} "
+          f"max={ordered[-1] * scale:8.2f}{unit}")
+
+
+async def cycles_reconnect(host: str, port: int, cycles: int) -> List[float]:
+    """Old behaviour: connect, read, close on every poll cycle."""
+    samples = []
+    for _ in range(cycles):
+        start = time.perf_counter()
+        client = AuroraClient(host, port, timeout=2000)
+        if await client.connect():
+            await read_inverter_data(client)
+            client.close()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def cycles_pooled(host: str, port: int, cycles: int) -> List[float]:
+    """New behaviour: one AuroraConnection reused across poll cycles."""
+    connection = AuroraConnection(host, port, timeout=2000)
+    await connection.open()
+    samples = []
+    try:
+        for _ in range(cycles):
+            start = time.perf_counter()
+            await connection.request(read_inverter_data)
+            samples.append(time.perf_counter() - start)
+    finally:
+        await connection.close()
+    return samples
+
+
+def bench_connection(args):
+    """Per-cycle latency with connect/close per cycle vs. a pooled connection."""
+    simulator = AuroraSimulator(connect_latency=args.connect_latency,
+                                response_latency=args.response_latency)
+    simulator.start_in_thread()
+    try:
+        print(f"Simulator: connect latency {args.connect_latency * 1000:.0f}ms, "
+              f"response latency {args.response_latency * 1000:.1f}ms, {args.cycles} cycles")
+        # AuroraClient prints on every connect, keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            old = asyncio.run(cycles_reconnect(simulator.host, simulator.port, args.cycles))
+        report("connect/close per cycle", old)
+        print(f"{'':<28} connections opened: {simulator.connections}")
+        opened = simulator.connections
+        with contextlib.redirect_stdout(io.StringIO()):
+            new = asyncio.run(cycles_pooled(simulator.host, simulator.port, args.cycles))
+        report("pooled connection", new)
+        print(f"{'':<28} connections opened: {simulator.connections - opened}")
+    finally:
+        simulator.stop_thread()
+
+
+async def loop_lag(inverters: int, cycles: int, response_latency: float):
+    """Poll several simulated inverters from one loop while measuring loop lag."""
+    simulators = [AuroraSimulator(response_latency=response_latency) for _ in range(inverters)]
+    for simulator in simulators:
+        await simulator.start()
+    clients = [AuroraClient(s.host, s.port, timeout=2000) for s in simulators]
+
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        # A 10ms timer that should fire on time if nothing blocks the loop
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+
+    async def poll(client):
+        await client.connect()
+        for _ in range(cycles):
+            await read_inverter_data(client)
+        client.close()
+
+    tick = asyncio.ensure_future(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(poll(client) for client in clients))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await tick
+    for simulator in simulators:
+        await simulator.stop()
+    return elapsed, lags
+
+
+def bench_loop(args):
+    """Event loop responsiveness while polling several inverters concurrently."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        elapsed, lags = asyncio.run(loop_lag(args.inverters, args.cycles, args.response_latency))
+    print(f"{args.inverters} inverters x {args.cycles} cycles, "
+          f"response latency {args.response_latency * 1000:.1f}ms: {elapsed:.2f}s total")
+    report("event loop lag", lags)
+
+
+async def engine_throughput(bridges: int, addresses: int, duration: float,
+                            response_latency: float, concurrent: bool):
+    """Readings/sec polling bridges x addresses simulated inverters back to back."""
+    simulators = [AuroraSimulator(response_latency=response_latency,
+                                  addresses=range(2, 2 + addresses)) for _ in range(bridges)]
+    for simulator in simulators:
+        await simulator.start()
+    # Every field on every poll, back to back
+    targets = [InverterTarget(f"s{b}a{a}", sim.host, sim.port, a,
+                              schedule=MeasurementSchedule({m.name: 0 for m in MEASUREMENTS}))
+               for b, sim in enumerate(simulators) for a in range(2, 2 + addresses)]
+
+    readings = []
+    stop = asyncio.Event()
+    if concurrent:
+        engine = PollingEngine(targets, lambda target, data: readings.append(target.inverter_id), timeout=2000)
+        runner = asyncio.ensure_future(engine.run(stop))
+    else:
+        # Baseline: one loop walking every target in turn, as a single poller would
+        async def sequential():
+            connections = {}
+            for target in targets:
+                if target.bridge not in connections:
+                    connections[target.bridge] = AuroraConnection(target.host, target.port, 2000, keepalive_interval=0)
+                    await connections[target.bridge].open()
+            while not stop.is_set():
+                for target in targets:
+                    await connections[target.bridge].request(read_inverter_data, target.address)
+                    readings.append(target.inverter_id)
+            for connection in connections.values():
+                await connection.close()
+        runner = asyncio.ensure_future(sequential())
+
+    await asyncio.sleep(duration)
+    stop.set()
+    await runner
+    for simulator in simulators:
+        await simulator.stop()
+    return len(readings) / duration
+
+
+def bench_engine(args):
+    """Readings/sec of the multi-inverter engine vs. polling every target in turn."""
+    print(f"{args.bridges} bridges x {args.addresses} addresses, "
+          f"response latency {args.response_latency * 1000:.1f}ms, {args.duration:.0f}s per run")
+    for name, concurrent in (("sequential", False), ("polling engine", True)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            rate = asyncio.run(engine_throughput(args.bridges, args.addresses, args.duration,
+                                                 args.response_latency, concurrent))
+        print(f"{name:<28} {rate:8.2f} readings/s")
+
+
+async def command_throughput(depth: int, duration: float, link_latency: float, response_latency: float,
+                             fragment: int, noise: float):
+    """Commands/sec with depth requests in flight; returns (rate, wrong values, resyncs, reconnects)."""
+    simulator = AuroraSimulator(response_latency=response_latency, link_latency=link_latency,
+                                fragment=fragment, noise=noise)
+    await simulator.start()
+    connection = AuroraConnection(simulator.host, simulator.port, timeout=2000, keepalive_interval=0)
+    await connection.open()
+    connection.client.pipeline_depth = depth
+    expected = AuroraSimulator.DSP_VALUES[AuroraClient.DSP_OUTPUT_POWER]
+    batch = [(2, AuroraClient.CMD_GET_DSP, (AuroraClient.DSP_OUTPUT_POWER, 0))] * 16
+
+    commands = wrong = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        responses = await connection.request(lambda client: client.send_commands(batch))
+        commands += len(batch)
+        wrong += sum(1 for r in responses if AuroraClient.decode_dsp(AuroraClient.DSP_OUTPUT_POWER, r) != expected)
+    elapsed = time.perf_counter() - start
+    resyncs = connection.client.frames.resyncs if connection.client.frames else 0
+    reconnects = simulator.connections - 1
+    await connection.close()
+    await simulator.stop()
+    return commands / elapsed, wrong, resyncs, reconnects
+
+
+def bench_commands(args):
+    """Commands/sec through the framing layer, one request at a time vs. pipelined."""
+    print(f"link latency {args.link_latency * 1000:.1f}ms, bus time {args.response_latency * 1000:.1f}ms, "
+          f"fragments <= {args.fragment or 'off'} bytes, noise {args.noise:.0%}, {args.duration:.0f}s per run")
+    for depth in args.depths:
+        with contextlib.redirect_stdout(io.StringIO()):
+            rate, wrong, resyncs, reconnects = asyncio.run(command_throughput(
+                depth, args.duration, args.link_latency, args.response_latency, args.fragment, args.noise))
+        print(f"{'pipeline depth ' + str(depth):<28} {rate:8.1f} commands/s  wrong values {wrong}  "
+              f"resyncs {resyncs}  reconnects {reconnects}")
+
+
+async def schedule_load(intervals: dict, duration: float, response_latency: float):
+    """Poll one simulated inverter with the given field intervals; returns (readings, requests)."""
+    simulator = AuroraSimulator(response_latency=response_latency)
+    await simulator.start()
+    schedule = MeasurementSchedule(intervals)
+    target = InverterTarget('bench', simulator.host, simulator.port, schedule=schedule)
+    readings = []
+    stop = asyncio.Event()
+    engine = PollingEngine([target], lambda target, data: readings.append(data), timeout=2000)
+    runner = asyncio.ensure_future(engine.run(stop))
+    await asyncio.sleep(duration)
+    stop.set()
+    await runner
+    await simulator.stop()
+    return len(readings), schedule.requests
+
+
+def bench_schedule(args):
+    """Bus requests per power sample with one polling rate vs. per-field rates."""
+    flat = {m.name: args.interval for m in MEASUREMENTS}
+    scheduled = measurement_intervals(args.interval * args.slow_factor, {'power_output': args.interval})
+    print(f"power every {args.interval}s, response latency {args.response_latency * 1000:.1f}ms, "
+          f"{args.duration:.0f}s per run")
+    for name, intervals in (("all fields every cycle", flat), ("per-field rates", scheduled)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            readings, requests = asyncio.run(schedule_load(intervals, args.duration, args.response_latency))
+        busy = requests * args.response_latency / args.duration
+        print(f"{name:<28} {readings / args.duration:6.2f} readings/s "
+              f"{requests / args.duration:7.2f} requests/s  bus busy {busy:6.1%}")
+
+
+async def suite_run(args) -> Dict[str, float]:
+    """End-to-end run against simulated PV inverters; returns the suite metrics."""
+    def simulator():
+        # Midday, so the simulated inverters are awake
+        start = datetime.datetime.now().astimezone().replace(hour=12, minute=0)
+        return AuroraSimulator(response_latency=args.response_latency, jitter=args.jitter, loss=args.loss,
+                               link_latency=args.link_latency, fragment=args.fragment,
+                               addresses=range(2, 2 + args.addresses), pv=True, start=start)
+
+    metrics: Dict[str, float] = {}
+    sim = simulator()
+    await sim.start()
+    connection = AuroraConnection(sim.host, sim.port, timeout=args.timeout, keepalive_interval=0)
+    await connection.open()
+
+    # Single commands
+    samples, lost = [], 0
+    request = (2, AuroraClient.CMD_GET_DSP, (AuroraClient.DSP_OUTPUT_POWER, 0))
+    for _ in range(args.commands):
+        start = time.perf_counter()
+        if await connection.request(lambda client: client.send_command(*request)):
+            samples.append(time.perf_counter() - start)
+        else:
+            lost += 1
+    report("per-command latency", samples)
+    print(f"{'':<28} unanswered: {lost}")
+    metrics['command_p50_ms'] = statistics.median(samples) * 1000
+    metrics['command_p95_ms'] = percentile(samples, 0.95) * 1000
+
+    # Full cycles: every field of one inverter
+    schedule = MeasurementSchedule({m.name: 0 for m in MEASUREMENTS})
+    samples = []
+    for _ in range(args.cycles):
+        start = time.perf_counter()
+        await connection.request(schedule.read_window, 2)
+        samples.append(time.perf_counter() - start)
+    report("cycle latency", samples)
+    metrics['cycle_p50_ms'] = statistics.median(samples) * 1000
+    metrics['cycle_p95_ms'] = percentile(samples, 0.95) * 1000
+    await connection.close()
+    await sim.stop()
+
+    # Engine: bridges x addresses, every field on every poll
+    simulators = [simulator() for _ in range(args.bridges)]
+    for sim in simulators:
+        await sim.start()
+    targets = [InverterTarget(f"s{b}a{a}", sim.host, sim.port, a,
+                              schedule=MeasurementSchedule({m.name: 0 for m in MEASUREMENTS}))
+               for b, sim in enumerate(simulators) for a in range(2, 2 + args.addresses)]
+    readings = []
+    stop = asyncio.Event()
+    engine = PollingEngine(targets, lambda target, data: readings.append(data), timeout=args.timeout)
+    runner = asyncio.ensure_future(engine.run(stop))
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await runner
+    for sim in simulators:
+        await sim.stop()
+    metrics['readings_per_s'] = len(readings) / args.duration
+    print(f"{'polling engine':<28} {metrics['readings_per_s']:8.2f} readings/s "
+          f"({args.bridges} bridges x {args.addresses} addresses)")
+
+    # Storage: write what the engine collected
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ReadingStore(os.path.join(tmp, 'suite.db'), flush_interval=0)
+        store.open()
+        rows = [dict(readings[i % len(readings)]) for i in range(args.rows)] if readings else []
+        start = time.perf_counter()
+        for row in rows:
+            store.add(row)
+        store.close()
+        elapsed = time.perf_counter() - start
+    metrics['db_rows_per_s'] = len(rows) / elapsed if rows else 0.0
+    print(f"{'database writes':<28} {metrics['db_rows_per_s']:8.0f} rows/s")
+    return metrics
+
+
+# Metrics where a higher value is better; the rest are latencies
+SUITE_HIGHER_IS_BETTER = ('readings_per_s', 'db_rows_per_s')
+
+
+def bench_suite(args):
+    """End-to-end suite: command and cycle latency, readings/sec, DB write rate; can compare to a baseline."""
+    print(f"link latency {args.link_latency * 1000:.1f}ms, bus time {args.response_latency * 1000:.1f}ms "
+          f"+ jitter {args.jitter * 1000:.1f}ms, loss {args.loss:.0%}, fragments <= {args.fragment or 'off'} bytes")
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        metrics = asyncio.run(suite_run(args))
+    # Only keep the report lines, not the client's connection chatter
+    print('\n'.join(line for line in output.getvalue().splitlines()
+                    if line.startswith(('per-command', 'cycle', 'polling', 'database', ' '))))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(metrics, f, indent=2)
+        print(f"Saved metrics to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = 0
+        print(f"Compared to {args.compare} (tolerance {args.tolerance:.0%}):")
+        for name, value in metrics.items():
+            if name not in baseline or not baseline[name]:
+                continue
+            change = value / baseline[name] - 1
+            worse = -change if name in SUITE_HIGHER_IS_BETTER else change
+            flag = "REGRESSION" if worse > args.tolerance else ""
+            regressions += bool(flag)
+            print(f"  {name:<20} {baseline[name]:10.2f} -> {value:10.2f} ({change:+.1%}) {flag}")
+        if regressions:
+            sys.exit(1)
+
+
+def sample_reading(index: int) -> dict:
+    """A plausible reading for storage benchmarks."""
+    return {
+        'inverter_id': 'default',
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(1700000000 + index * 60)),
+        'power_output': 2450.0, 'voltage_1': 340.5, 'current_1': 3.85,
+        'voltage_2': 338.0, 'current_2': 3.72, 'temperature': 41.2,
+        'grid_voltage': 231.2, 'efficiency': 95.4, 'peak_today': 3120.0,
+        'energy_today': 12.45, 'energy_week': 84.21, 'energy_month': 312.4,
+        'energy_year': 2810.3, 'energy_total': 45210.9, 'grid_frequency': 50.01,
+        'leakage_current': 0.012, 'isolation_resistance': 12.5
+    }
+
+
+def bench_storage(args):
+    """Rows/sec with a connection and commit per row vs. the batched WAL writer."""
+    with tempfile.TemporaryDirectory() as tmp:
+        # Old behaviour: connect, insert, commit, close for every reading
+        path = os.path.join(tmp, 'per_row.db')
+        conn = sqlite3.connect(path)
+        create_schema(conn)
+        conn.close()
+        start = time.perf_counter()
+        for i in range(args.rows):
+            conn = sqlite3.connect(path)
+            conn.execute(INSERT_READING, reading_row(sample_reading(i)))
+            conn.commit()
+            conn.close()
+        elapsed = time.perf_counter() - start
+        print(f"{'connection per row':<28} {args.rows / elapsed:10.0f} rows/s")
+
+        store = ReadingStore(os.path.join(tmp, 'batched.db'), batch_size=args.batch_size, flush_interval=0)
+        store.open()
+        start = time.perf_counter()
+        for i in range(args.rows):
+            store.add(sample_reading(i))
+        store.close()
+        elapsed = time.perf_counter() - start
+        print(f"{'batched WAL writer':<28} {args.rows / elapsed:10.0f} rows/s "
+              f"({store.flushes} transactions)")
+
+        # Spool and flusher, with another connection holding the write lock meanwhile
+        path = os.path.join(tmp, 'spooled.db')
+        store = ReadingStore(path, batch_size=args.batch_size, spool_dir=path + '-spool')
+        store.open()
+        blocker = sqlite3.connect(path, isolation_level=None)
+        blocker.execute('BEGIN IMMEDIATE')
+        latencies = []
+        start = time.perf_counter()
+        for i in range(args.rows):
+            begin = time.perf_counter()
+            store.add(sample_reading(i))
+            latencies.append(time.perf_counter() - begin)
+        elapsed = time.perf_counter() - start
+        blocker.execute('COMMIT')
+        blocker.close()
+        store.close()
+        latencies.sort()
+        print(f"{'spooled, database locked':<28} {args.rows / elapsed:10.0f} rows/s "
+              f"(add p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.0f}us, "
+              f"max {latencies[-1] * 1e6:.0f}us, {store.rows_written} written on close)")
+
+
+def build_history_db(path: str, rows: int, step: int = 60, schema_version: int = 1) -> float:
+    """Fill a database with rows synthetic readings, step seconds apart, ending now.
+
+    The schema is left at schema_version so upgrades can be timed. Returns
+    the end of the synthetic range as an epoch timestamp.
+    """
+    end = time.time()
+    start = end - rows * step
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+    with conn:
+        for migration in MIGRATIONS[:schema_version]:
+            migration(conn.cursor())
+        conn.execute(f'PRAGMA user_version = {schema_version}')
+        add_measurement_columns(conn)
+
+    base = sample_reading(0)
+    rng = random.Random(42)
+
+    def generate():
+        energy = base['energy_total']
+        for i in range(rows):
+            moment = time.localtime(start + i * step)
+            # Daylight bell curve with cloud noise, so data doesn't compress unrealistically
+            hour = moment.tm_hour + moment.tm_min / 60
+            sun = max(0.0, math.sin(math.pi * (hour - 6) / 12))
+            power = round(3000 * sun * rng.uniform(0.6, 1.0)) if sun else 0
+            energy += power * step / 3600000
+            base.update(timestamp=time.strftime('%Y-%m-%d %H:%M:%S', moment),
+                        power_output=power,
+                        current_1=round(power / 680, 2), current_2=round(power / 680, 2),
+                        temperature=round(20 + 25 * sun + rng.uniform(-0.5, 0.5), 1),
+                        grid_voltage=round(rng.uniform(228, 236), 1),
+                        energy_total=round(energy, 2))
+            yield reading_row(base)
+
+    with conn:
+        conn.executemany(INSERT_READING, generate())
+    conn.close()
+    return end
+
+
+def time_windows(path: str, end: float, windows, repeat: int):
+    """Time readings_query() over each (name, hours) window."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    for name, hours in windows:
+        start_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(end - hours * 3600))
+        sql, params = readings_query(start_time)
+        samples = []
+        for _ in range(repeat):
+            begin = time.perf_counter()
+            count = len(conn.execute(sql, params).fetchall())
+            samples.append(time.perf_counter() - begin)
+        report(f"  {name} ({count} rows)", samples)
+    conn.close()
+
+
+def bench_history(args):
+    """History query latency for 24h/7d/1y windows before and after the time index."""
+    windows = (('24h', 24), ('7d', 24 * 7), ('1y', 24 * 365))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'history.db')
+        begin = time.perf_counter()
+        end = build_history_db(path, args.rows)
+        print(f"Built {args.rows} rows ({args.rows / 525600:.1f} years of 1-minute data) "
+              f"in {time.perf_counter() - begin:.1f}s")
+
+        print("schema v1 (no index):")
+        time_windows(path, end, windows, args.repeat)
+
+        conn = sqlite3.connect(path)
+        begin = time.perf_counter()
+        create_schema(conn)
+        conn.close()
+        print(f"upgraded to current schema in {time.perf_counter() - begin:.1f}s")
+        time_windows(path, end, windows, args.repeat)
+
+        print(f"auto resolution, {args.max_points} point budget:")
+        store = ReadingStore(path, flush_interval=0)
+        store.open()
+        for name, hours in windows:
+            start_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(end - hours * 3600))
+            samples = []
+            for _ in range(args.repeat):
+                begin = time.perf_counter()
+                resolution, rows = store.history(start_time, max_points=args.max_points)
+                samples.append(time.perf_counter() - begin)
+            report(f"  {name} ({len(rows)} {resolution})", samples)
+        store.close()
+
+
+def bench_downsample(args):
+    """/api/history payload size and server time: every raw row vs. LTTB downsampling."""
+    import aurora_web_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'history.db')
+        rows = args.days * 1440
+        # Rollups are backfilled by the schema upgrade in init_db()
+        build_history_db(path, rows, schema_version=2)
+        aurora_web_app.db_path = path
+        aurora_web_app.init_db()
+        app = aurora_web_app.app.test_client()
+        hours = args.days * 24
+        print(f"{args.days} days of 1-minute data ({rows} rows)")
+
+        def measure(name, fetch):
+            samples = []
+            for _ in range(args.repeat):
+                begin = time.perf_counter()
+                body, points = fetch()
+                samples.append(time.perf_counter() - begin)
+            print(f"{name:<36} {points:7d} points {len(body) / 1024:9.1f} KiB "
+                  f"{statistics.median(samples) * 1000:8.1f}ms")
+
+        def everything():
+            # What /api/history used to do: every row, every column
+            with aurora_web_app.app.test_request_context():
+                readings = aurora_web_app.get_readings(hours)
+                return aurora_web_app.jsonify(readings).get_data(), len(readings)
+
+        def endpoint(query):
+            def fetch():
+                response = app.get(f'/api/history?hours={hours}&{query}')
+                return response.get_data(), len(response.get_json())
+            return fetch
+
+        measure("all raw rows (old behaviour)", everything)
+        measure(f"raw, LTTB to {args.max_points}", endpoint(f'resolution=raw&max_points={args.max_points}'))
+        measure(f"auto, LTTB to {args.max_points}", endpoint(f'max_points={args.max_points}'))
+        measure(f"auto, LTTB to {args.max_points}, power only",
+                endpoint(f'max_points={args.max_points}&fields=power_output'))
+        aurora_web_app.close_db()
+
+
+def bench_encoding(args):
+    """/api/history response size per format (rows/columnar/packed) and compression."""
+    import aurora_web_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'history.db')
+        rows = args.days * 1440
+        build_history_db(path, rows, schema_version=2)
+        aurora_web_app.db_path = path
+        aurora_web_app.init_db()
+        app = aurora_web_app.app.test_client()
+        query = f'/api/history?hours={args.days * 24}&resolution=raw&max_points={rows}'
+        print(f"{args.days} days of raw 1-minute data ({rows} rows)")
+
+        formats = ['rows', 'columnar', 'packed']
+        try:
+            import msgpack  # noqa: F401
+            formats.append('msgpack')
+        except ImportError:
+            pass
+        for fmt in formats:
+            for encoding in ('identity', 'gzip', 'br'):
+                begin = time.perf_counter()
+                response = app.get(f'{query}&format={fmt}', headers={'Accept-Encoding': encoding})
+                elapsed = time.perf_counter() - begin
+                if encoding != 'identity' and response.headers.get('Content-Encoding') != encoding:
+                    continue  # brotli not installed
+                print(f"{fmt:<10} {encoding:<9} {len(response.get_data()) / 1024:9.1f} KiB "
+                      f"{elapsed * 1000:8.1f}ms")
+        aurora_web_app.close_db()
+
+
+def bench_metrics(args):
+    """Cost of recording a metric on the hot path, and of rendering /metrics."""
+    from aurora_metrics import Registry
+
+    registry = Registry()
+    histogram = registry.histogram('bench_seconds', 'Bench histogram', ('command',))
+    counter = registry.counter('bench_total', 'Bench counter')
+    series = histogram.labels('dsp')
+    values = [random.expovariate(200) for _ in range(1000)]
+    n = args.iterations
+
+    for name, record in (('histogram.labels().observe', lambda v: histogram.labels('dsp').observe(v)),
+                         ('series.observe', series.observe),
+                         ('counter.inc', lambda v: counter.inc()),
+                         ('perf_counter() pair', lambda v: time.perf_counter() - time.perf_counter())):
+        begin = time.perf_counter()
+        for i in range(n):
+            record(values[i % 1000])
+        print(f"{name:<28} {(time.perf_counter() - begin) / n * 1e9:8.0f} ns per call")
+
+    for index in range(args.series):
+        histogram.labels(f"command{index}").observe(0.01)
+    begin = time.perf_counter()
+    text = registry.render()
+    print(f"render {args.series} histogram series   {(time.perf_counter() - begin) * 1000:8.2f}ms "
+          f"({len(text) / 1024:.0f} KiB)")
+
+
+def legacy_decode(measurement, response: bytes) -> float:
+    """The decoding replaced by the measurement registry: an if/elif chain per DSP param, bytes shuffled for CE."""
+    if not response:
+        return 0.0
+    if measurement.command == AuroraClient.CMD_GET_CE:
+        buffer = response
+        bytes_array = bytearray(4)
+        bytes_array[0] = buffer[5]
+        bytes_array[1] = buffer[4]
+        bytes_array[2] = buffer[7]
+        bytes_array[3] = buffer[6]
+        return struct.unpack('<i', bytes_array)[0] / 1000.0
+    param = measurement.param
+    value_raw = (response[6] + (response[7] << 8))
+    if param == AuroraClient.DSP_GRID_VOLTS:
+        return value_raw * 0.1
+    elif param == AuroraClient.DSP_OUTPUT_POWER:
+        return value_raw
+    elif param in [AuroraClient.DSP_TEMPERATURE_1, AuroraClient.DSP_TEMPERATURE_2]:
+        return value_raw * 0.1
+    elif param in [AuroraClient.DSP_VOLTAGE_1, AuroraClient.DSP_VOLTAGE_2]:
+        return value_raw * 0.1
+    elif param in [AuroraClient.DSP_CURRENT_1, AuroraClient.DSP_CURRENT_2]:
+        return value_raw * 0.01
+    elif param == AuroraClient.DSP_PEAK_TODAY:
+        return value_raw
+    else:
+        return float(value_raw)
+
+
+def bench_decode(args):
+    """CPU per command outside the I/O: the request frame and the decoding of its reply, before and after."""
+    from aurora_framing import build_request, request_frame
+
+    simulator = AuroraSimulator()
+    requests = [m.request(2) for m in MEASUREMENTS]
+    responses = [simulator.answer(build_request(*request)) for request in requests]
+    pairs = list(zip(MEASUREMENTS, responses))
+    n = args.iterations
+
+    def per_command(run) -> float:
+        best = math.inf
+        for _ in range(args.repeat):
+            begin = time.perf_counter()
+            for _ in range(n):
+                run()
+            best = min(best, time.perf_counter() - begin)
+        return best / n / len(requests) * 1e9
+
+    print(f"{f'{len(requests)} commands per reading':<28} {'before':>8} {'after':>8}")
+    for name, before, after in (
+            ('request frame', lambda: [build_request(*r) for r in requests],
+             lambda: [request_frame(*r) for r in requests]),
+            ('decode', lambda: [legacy_decode(m, response) for m, response in pairs],
+             lambda: [m.decode(response) for m, response in pairs])):
+        old, new = per_command(before), per_command(after)
+        print(f"{name:<28} {old:8.0f} {new:8.0f} ns per command  ({old / new:.1f}x)")
+
+
+def bench_retention(args):
+    """Compaction of old raw data: rows deleted, space reclaimed, and write latency while it runs."""
+    import threading
+    from aurora_retention import Compactor
+    from aurora_storage import rebuild_rollups
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'retention.db')
+        rows = args.days * 1440
+        build_history_db(path, rows, schema_version=len(MIGRATIONS))
+        conn = sqlite3.connect(path)
+        with conn:
+            rebuild_rollups(conn.cursor())
+        # What 'aurora_storage.py vacuum' does to an existing database
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        conn.close()
+        print(f"{args.days} days of 1-minute data ({rows} rows), {os.path.getsize(path) / 1048576:.1f} MiB; "
+              f"keeping {args.keep} days raw")
+
+        store = ReadingStore(path, batch_size=1, flush_interval=0)
+        store.open()
+        compactor = Compactor(store, {'raw': args.keep}, chunk_size=args.chunk_size)
+        latencies = []
+        done = threading.Event()
+
+        def write():
+            # A poller writing a current reading every 10ms, flushed one by one
+            reading = dict(sample_reading(0), timestamp=None)
+            while not done.is_set():
+                begin = time.perf_counter()
+                store.add(reading)
+                latencies.append(time.perf_counter() - begin)
+                time.sleep(0.01)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        result = compactor.run_once()
+        done.set()
+        writer.join()
+        store.close()
+        print(f"deleted {result['deleted']['raw']} rows, reclaimed {result['reclaimed_bytes'] / 1048576:.1f} MiB, "
+              f"busy {result['busy_seconds']:.2f}s of {result['elapsed_seconds']:.2f}s")
+        report("write latency during compaction", latencies)
+
+
+def bench_compact(args):
+    """Database size and scan time: REAL columns and text timestamps vs. the compact integer format."""
+    from aurora_analytics import load_arrays
+    from aurora_storage import convert_to_compact, rebuild_rollups
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'real.db')
+        compact_path = os.path.join(tmp, 'compact.db')
+        rows = args.days * 1440
+        end = build_history_db(path, rows, schema_version=len(MIGRATIONS))
+        conn = sqlite3.connect(path)
+        with conn:
+            rebuild_rollups(conn.cursor())
+        conn.execute('VACUUM')
+        conn.close()
+        begin = time.perf_counter()
+        convert_to_compact(path, compact_path)
+        print(f"{args.days} days of 1-minute data ({rows} rows), converted in {time.perf_counter() - begin:.1f}s")
+
+        for name, db in (('real', path), ('compact', compact_path)):
+            conn = sqlite3.connect(db)
+            # Readings with their indexes; rollups are the same in both
+            size = conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name NOT LIKE '%rollups%'").fetchone()[0]
+            print(f"{name}: readings {size / 1048576:.1f} MiB, file {os.path.getsize(db) / 1048576:.1f} MiB")
+            conn.close()
+
+            store = ReadingStore(db, flush_interval=0)
+            store.open()
+            for window, hours in (('24h', 24), ('7d', 24 * 7)):
+                start_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(end - hours * 3600))
+                samples = []
+                for _ in range(args.repeat):
+                    begin = time.perf_counter()
+                    store.readings(start_time)
+                    samples.append(time.perf_counter() - begin)
+                report(f"  raw {window}", samples)
+            with store.reader() as reader:
+                samples = []
+                for _ in range(args.repeat):
+                    begin = time.perf_counter()
+                    load_arrays(reader, '1970-01-01')
+                    samples.append(time.perf_counter() - begin)
+                report("  analytics arrays, all rows", samples)
+            store.close()
+
+
+def bench_analytics(args):
+    """/api/analytics latency: first request (cold cache) vs. later ones, plus the pure numpy part."""
+    import aurora_web_app
+    if aurora_web_app.aurora_analytics is None:
+        sys.exit("aurora_analytics needs numpy")
+    from aurora_analytics import daily_metrics, load_arrays
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'analytics.db')
+        rows = args.days * 1440
+        build_history_db(path, rows, schema_version=len(MIGRATIONS))
+        aurora_web_app.db_path = path
+        aurora_web_app.init_db()
+        aurora_web_app.config.update(system_kwp=3.3, latitude=45.0, longitude=9.0)
+        app = aurora_web_app.app.test_client()
+        print(f"{args.days} days of 1-minute data ({rows} rows)")
+
+        with sqlite3.connect(path) as conn:
+            begin = time.perf_counter()
+            arrays = load_arrays(conn, '1970-01-01')
+            loaded = time.perf_counter()
+            daily_metrics(arrays)
+            print(f"load arrays {(loaded - begin) * 1000:8.1f}ms, "
+                  f"daily metrics {(time.perf_counter() - loaded) * 1000:8.1f}ms")
+
+        query = f'/api/analytics?days={args.days}&inverter={sample_reading(0)["inverter_id"]}'
+        begin = time.perf_counter()
+        response = app.get(query)
+        print(f"cold cache  {(time.perf_counter() - begin) * 1000:8.1f}ms "
+              f"({response.get_json()['summary']['days']} days)")
+        samples = []
+        for _ in range(args.repeat):
+            # A new reading invalidates the response cache but not completed days
+            aurora_web_app.reading_store.version += 1
+            begin = time.perf_counter()
+            app.get(query)
+            samples.append(time.perf_counter() - begin)
+        report("warm cache", samples)
+        aurora_web_app.close_db()
+
+
+def main():
+    """Parse arguments and run the selected benchmark."""
+    parser = argparse.ArgumentParser(description="Aurora Inverter Monitor benchmarks")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    connection = subparsers.add_parser('connection', help=bench_connection.__doc__)
+    connection.add_argument('--cycles', type=int, default=50)
+    connection.add_argument('--connect-latency', type=float, default=0.05,
+                            help="simulated bridge session setup time in seconds")
+    connection.add_argument('--response-latency', type=float, default=0.0,
+                            help="simulated per-response latency in seconds")
+    connection.set_defaults(func=bench_connection)
+
+    loop = subparsers.add_parser('loop', help=bench_loop.__doc__)
+    loop.add_argument('--inverters', type=int, default=5)
+    loop.add_argument('--cycles', type=int, default=5)
+    loop.add_argument('--response-latency', type=float, default=0.02,
+                      help="simulated per-response latency in seconds")
+    loop.set_defaults(func=bench_loop)
+
+    engine = subparsers.add_parser('engine', help=bench_engine.__doc__)
+    engine.add_argument('--bridges', type=int, default=3)
+    engine.add_argument('--addresses', type=int, default=2, help="inverters per bridge")
+    engine.add_argument('--duration', type=float, default=5)
+    engine.add_argument('--response-latency', type=float, default=0.01,
+                        help="simulated per-response bus time in seconds (~10ms at 19200 baud)")
+    engine.set_defaults(func=bench_engine)
+
+    suite = subparsers.add_parser('suite', help=bench_suite.__doc__)
+    suite.add_argument('--commands', type=int, default=200)
+    suite.add_argument('--cycles', type=int, default=50)
+    suite.add_argument('--bridges', type=int, default=2)
+    suite.add_argument('--addresses', type=int, default=2, help="inverters per bridge")
+    suite.add_argument('--duration', type=float, default=5, help="seconds of engine polling")
+    suite.add_argument('--rows', type=int, default=5000, help="readings written to the database")
+    suite.add_argument('--response-latency', type=float, default=0.0052)
+    suite.add_argument('--jitter', type=float, default=0.002)
+    suite.add_argument('--loss', type=float, default=0.0)
+    suite.add_argument('--link-latency', type=float, default=0.005)
+    suite.add_argument('--fragment', type=int, default=4)
+    suite.add_argument('--timeout', type=int, default=500, help="response timeout in ms")
+    suite.add_argument('--save', metavar='FILE', help="write the metrics as JSON")
+    suite.add_argument('--compare', metavar='FILE', help="baseline JSON; exit 1 on regressions")
+    suite.add_argument('--tolerance', type=float, default=0.2, help="allowed relative slowdown")
+    suite.set_defaults(func=bench_suite)
+
+    commands = subparsers.add_parser('commands', help=bench_commands.__doc__)
+    commands.add_argument('--depths', type=int, nargs='+', default=[1, 2, 4, 8])
+    commands.add_argument('--duration', type=float, default=3)
+    commands.add_argument('--link-latency', type=float, default=0.02,
+                          help="simulated WiFi round trip in seconds")
+    commands.add_argument('--response-latency', type=float, default=0.0052,
+                          help="simulated serial bus time per request (10 bytes at 19200 baud)")
+    commands.add_argument('--fragment', type=int, default=3, help="max TCP segment size of replies")
+    commands.add_argument('--noise', type=float, default=0.02, help="probability of garbage before a reply")
+    commands.set_defaults(func=bench_commands)
+
+    schedule = subparsers.add_parser('schedule', help=bench_schedule.__doc__)
+    schedule.add_argument('--interval', type=float, default=0.5, help="power polling interval in seconds")
+    schedule.add_argument('--slow-factor', type=float, default=12,
+                          help="other DSP fields are read this many times less often")
+    schedule.add_argument('--duration', type=float, default=10)
+    schedule.add_argument('--response-latency', type=float, default=0.01,
+                          help="simulated per-response bus time in seconds (~10ms at 19200 baud)")
+    schedule.set_defaults(func=bench_schedule)
+
+    storage = subparsers.add_parser('storage', help=bench_storage.__doc__)
+    storage.add_argument('--rows', type=int, default=2000)
+    storage.add_argument('--batch-size', type=int, default=50)
+    storage.set_defaults(func=bench_storage)
+
+    history = subparsers.add_parser('history', help=bench_history.__doc__)
+    history.add_argument('--rows', type=int, default=2000000)
+    history.add_argument('--repeat', type=int, default=5)
+    history.add_argument('--max-points', type=int, default=1000)
+    history.set_defaults(func=bench_history)
+
+    downsample = subparsers.add_parser('downsample', help=bench_downsample.__doc__)
+    downsample.add_argument('--days', type=int, default=90)
+    downsample.add_argument('--max-points', type=int, default=1000)
+    downsample.add_argument('--repeat', type=int, default=3)
+    downsample.set_defaults(func=bench_downsample)
+
+    encoding = subparsers.add_parser('encoding', help=bench_encoding.__doc__)
+    encoding.add_argument('--days', type=int, default=7)
+    encoding.set_defaults(func=bench_encoding)
+
+    retention = subparsers.add_parser('retention', help=bench_retention.__doc__)
+    retention.add_argument('--days', type=int, default=365)
+    retention.add_argument('--keep', type=float, default=30)
+    retention.add_argument('--chunk-size', type=int, default=2000)
+    retention.set_defaults(func=bench_retention)
+
+    compact = subparsers.add_parser('compact', help=bench_compact.__doc__)
+    compact.add_argument('--days', type=int, default=365)
+    compact.add_argument('--repeat', type=int, default=3)
+    compact.set_defaults(func=bench_compact)
+
+    analytics = subparsers.add_parser('analytics', help=bench_analytics.__doc__)
+    analytics.add_argument('--days', type=int, default=365)
+    analytics.add_argument('--repeat', type=int, default=10)
+    analytics.set_defaults(func=bench_analytics)
+
+    metrics = subparsers.add_parser('metrics', help=bench_metrics.__doc__)
+    metrics.add_argument('--iterations', type=int, default=1000000)
+    metrics.add_argument('--series', type=int, default=50)
+    metrics.set_defaults(func=bench_metrics)
+
+    decode = subparsers.add_parser('decode', help=bench_decode.__doc__)
+    decode.add_argument('--iterations', type=int, default=20000)
+    decode.add_argument('--repeat', type=int, default=5)
+    decode.set_defaults(func=bench_decode)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Response Cache
+
+import hashlib
+import threading
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class CachedResponse:
+    """An encoded response body plus its compressed variants, built on demand."""
+
+    def __init__(self, body: bytes, mimetype: str, etag: str, headers: Optional[Dict[str, str]] = None):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.headers = headers or {}
+        # encoding -> (body, Content-Encoding or None)
+        self.variants: Dict[str, Tuple[bytes, Optional[str]]] = {}
+
+
+class ResponseCache:
+    """Responses cached per key for one data version.
+
+    Callers pass the version of the data a response depends on, an
+    increasing value such as a counter bumped whenever readings are
+    stored. An entry is only served while that version is current, and the
+    first put for a newer version drops everything else, so invalidation
+    costs nothing on the write path. ETags derive from key and version alone, which lets a
+    conditional request be answered with 304 before any query runs.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        """Initialize an empty cache."""
+        self.max_entries = max_entries
+        self.version: Any = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[Hashable, CachedResponse] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def etag(key: Hashable, version: Any) -> str:
+        """Entity tag for key at version."""
+        return hashlib.blake2b(repr((key, version)).encode(), digest_size=12).hexdigest()
+
+    def get(self, key: Hashable, version: Any) -> Optional[CachedResponse]:
+        """Return the cached response for key if it is still current."""
+        with self._lock:
+            entry = self._entries.get(key) if version == self.version else None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, version: Any, body: bytes, mimetype: str,
+            headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+        """Store a response for key at version and return it."""
+        entry = CachedResponse(body, mimetype, self.etag(key, version), headers)
+        with self._lock:
+            if self.version is not None and version < self.version:
+                # Built from data that has been superseded meanwhile
+                return entry
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+            if len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = entry
+        return entry
+
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+            self.version = None
@@ -3,18 +3,31 @@
 # Converted from C# to Python
 
 import socket
-import struct
 import time
 import sys
 import datetime
 import signal
 import asyncio
-from typing import Tuple
+from typing import Any, Dict, List, Optional, Tuple
+
+from aurora_framing import FrameReader, request_frame
+from aurora_measurements import CMD_GET_CE, CMD_GET_DSP, MEASUREMENTS, decode_ce, decode_dsp
+from aurora_metrics import REGISTRY
+
+COMMAND_SECONDS = REGISTRY.histogram('aurora_command_seconds',
+                                     'Round trip of one inverter command, from write to reply', ('command',))
+COMMAND_FAILURES = REGISTRY.counter('aurora_command_failures_total',
+                                    'Commands without a reply, by reason', ('reason',))
 
 class AuroraClient:
     # Aurora protocol constants
-    CMD_GET_DSP = 59
-    CMD_GET_CE = 78
+    CMD_GET_DSP = CMD_GET_DSP
+    CMD_GET_CE = CMD_GET_CE
+    # Daily energy log: data is the number of days back (0 = today, up to 365),
+    # low byte first; the reply carries Wh like a Cumulated Energy response
+    CMD_GET_DAILY_ENERGY = 76
+    # Metric labels
+    COMMAND_NAMES = {CMD_GET_DSP: 'dsp', CMD_GET_CE: 'energy', CMD_GET_DAILY_ENERGY: 'daily_energy'}
     DSP_GRID_VOLTS = 1
     DSP_OUTPUT_POWER = 3
     DSP_PEAK_TODAY = 35
@@ -24,21 +37,51 @@ class AuroraClient:
     DSP_CURRENT_1 = 25
     DSP_VOLTAGE_2 = 26
     DSP_CURRENT_2 = 27
+    # Scale of each DSP value (see aurora_measurements for the ones that are polled)
+    DSP_SCALES = {m.param: m.scale for m in MEASUREMENTS if m.command == CMD_GET_DSP}
+    DSP_SCALES[DSP_TEMPERATURE_2] = 0.1
 
     def __init__(self, host: str, port: int, timeout: int = 400):
         """Initialize the Aurora client with the given host and port."""
         self.host = host
         self.port = port
         self.timeout = timeout / 1000  # Convert to seconds
-        self.socket = None
+        self.reader = None
+        self.writer = None
+        self.frames: Optional[FrameReader] = None
         self.running = False
+        # Requests kept in flight by send_commands(); 1 waits for each reply.
+        # Only raise it for bridges that queue requests for the serial line.
+        self.pipeline_depth = 1
+        # Reconnect on demand in send_command; connection managers turn this
+        # off and handle reconnection (with backoff) themselves
+        self.auto_reconnect = True
+        # Set after a timeout: a late reply may still be on its way
+        self.stale = False
+        # Count of valid responses, lets callers tell a silent inverter from zero readings
+        self.responses = 0
+
+    @property
+    def connected(self) -> bool:
+        """True while the connection to the inverter is open."""
+        return self.writer is not None
         
     async def connect(self):
         """Connect to the Aurora inverter."""
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.settimeout(self.timeout)
-            self.socket.connect((self.host, self.port))
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout)
+            sock = self.writer.get_extra_info('socket')
+            if sock is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                # Detect a dead bridge in ~1 minute instead of the OS default (hours)
+                if hasattr(socket, 'TCP_KEEPIDLE'):
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30)
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10)
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+            self.frames = FrameReader(self.reader)
+            self.stale = False
             print(f"Connected successfully to {self.host}:{self.port}")
             return True
         except Exception as ex:
@@ -48,13 +91,31 @@ class AuroraClient:
 
     def close(self):
         """Close the connection to the inverter."""
-        if self.socket:
-            self.socket.close()
-            self.socket = None
+        if self.writer:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+        self.frames = None
+
+    async def drain(self, wait: float = 0.01):
+        """Discard any stale bytes (e.g. a late reply) waiting on the connection."""
+        if not self.reader:
+            return
+        self.frames.clear()
+        try:
+            while await asyncio.wait_for(self.reader.read(64), wait):
+                pass
+            # EOF: the bridge closed the connection
+            self.close()
+        except asyncio.TimeoutError:
+            pass
+        except OSError:
+            self.close()
+        self.stale = False
 
     async def start_monitoring(self):
         """Start monitoring the inverter data."""
-        if not self.socket and not await self.connect():
+        if not self.connected and not await self.connect():
             return
 
         self.running = True
@@ -81,48 +142,21 @@ class AuroraClient:
     async def display_inverter_data(self):
         """Display the current inverter data."""
         try:
-            # Read all important values
-            power_output = await self.send_dsp_command(2, self.DSP_OUTPUT_POWER)
-            voltage1 = await self.send_dsp_command(2, self.DSP_VOLTAGE_1)
-            current1 = await self.send_dsp_command(2, self.DSP_CURRENT_1)
-            voltage2 = await self.send_dsp_command(2, self.DSP_VOLTAGE_2)
-            current2 = await self.send_dsp_command(2, self.DSP_CURRENT_2)
-            temperature = await self.send_dsp_command(2, self.DSP_TEMPERATURE_1)
-            temperature2 = await self.send_dsp_command(2, self.DSP_TEMPERATURE_2)
-            grid_voltage = await self.send_dsp_command(2, self.DSP_GRID_VOLTS)
-            peak_today = await self.send_dsp_command(2, self.DSP_PEAK_TODAY)
-            
-            # Get energy readings
-            energy_today = await self.send_ce_command(2, 0) / 1000.0
-            energy_week = await self.send_ce_command(2, 1) / 1000.0
-            energy_month = await self.send_ce_command(2, 3) / 1000.0
-            energy_year = await self.send_ce_command(2, 4) / 1000.0
-            energy_total = await self.send_ce_command(2, 5) / 1000.0
-            
+            # Read all registered values in one batch
+            data = await read_inverter_data(self, 2)
             now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
             # Display the data
             print(f"{now} - Aurora Inverter Status")
-            print(f"Power Output:  {power_output:.1f} W")
-            print(f"Input 1:       {voltage1:.1f} V, {current1:.2f} A, {voltage1 * current1:.1f} W")
-            print(f"Input 2:       {voltage2:.1f} V, {current2:.2f} A, {voltage2 * current2:.1f} W")
-            print(f"Temperature:   {temperature:.1f}°C")
-            print(f"Grid Voltage:  {grid_voltage:.1f} V")
+            for measurement in MEASUREMENTS:
+                value = data[measurement.name]
+                print(f"{measurement.title + ':':<21} {value:.{measurement.decimals}f} {measurement.unit}")
             
-            # Calculate efficiency if possible
-            input_power = (voltage1 * current1) + (voltage2 * current2)
-            if input_power > 0:
-                efficiency = (power_output / input_power) * 100
-                print(f"Efficiency:    {efficiency:.1f}%")
+            # Efficiency is calculated from the other values
+            if data['efficiency'] > 0:
+                print(f"{'Efficiency:':<21} {data['efficiency']:.1f}%")
             else:
-                print("Efficiency:    N/A")
-            
-            print(f"Peak Today:    {peak_today:.1f} W")
-            print(f"Energy Today:  {energy_today:.2f} kWh")
-            print(f"Energy Week:   {energy_week:.2f} kWh")
-            print(f"Energy Month:  {energy_month:.2f} kWh")
-            print(f"Energy Year:   {energy_year:.2f} kWh")
-            print(f"Energy Total:  {energy_total:.2f} kWh")
+                print(f"{'Efficiency:':<21} N/A")
             print()
             
         except Exception as ex:
@@ -130,93 +164,156 @@ class AuroraClient:
 
     async def send_command(self, address: int, command: int, data: Tuple[int, int] = (0, 0)) -> bytes:
         """Send a command to the inverter and return the response."""
-        if not self.socket:
-            if not await self.connect():
-                return b''
-        
-        # Create the command packet
-        packet = bytearray(10)
-        packet[0] = address  # Inverter address
-        packet[1] = command  # Command
-        packet[2] = data[0]  # First data byte
-        packet[3] = data[1]  # Second data byte
-        
-        # Calculate the checksum
-        checksum = 0
-        for i in range(8):
-            checksum += packet[i]
-        
-        # Add the checksum to the packet
-        packet[8] = checksum & 0xFF
-        packet[9] = (checksum >> 8) & 0xFF
+        return (await self.send_commands([(address, command, data)]))[0]
+
+    async def send_commands(self, requests: List[Tuple[int, int, Tuple[int, int]]]) -> List[bytes]:
+        """Send (address, command, data) requests and return their responses in order.
+
+        Up to pipeline_depth requests are written before waiting for the
+        first reply. Replies carry no request id, so they are matched in
+        order: after a timeout, the requests still in flight can no longer
+        be matched and come back empty, like requests that failed, and the
+        batch carries on with the rest. At depth 1 only the request that
+        timed out is lost.
+        """
+        results: List[bytes] = []
+        if not self.connected:
+            if not self.auto_reconnect or not await self.connect():
+                return [b''] * len(requests)
         
+        packets = [request_frame(*request) for request in requests]
+        depth = max(1, self.pipeline_depth)
+        sent = 0
+        sent_at: List[float] = []
         try:
-            # Send the packet
-            self.socket.send(packet)
-            
-            # Wait for response
-            response = self.socket.recv(10)
-            if len(response) != 10:
-                print(f"Invalid response length: {len(response)}")
-                return b''
-            
-            # Validate the response
-            resp_checksum = response[8] + (response[9] << 8)
-            calc_checksum = 0
-            for i in range(8):
-                calc_checksum += response[i]
-            
-            if resp_checksum != calc_checksum:
-                print(f"Invalid response checksum: {resp_checksum} != {calc_checksum}")
-                return b''
+            if self.stale:
+                await self.drain()
+                if not self.connected:
+                    return [b''] * len(requests)
             
-            return response
+            while len(results) < len(packets):
+                # Keep the pipeline full, then wait for the oldest reply within one deadline
+                while sent < len(packets) and sent - len(results) < depth:
+                    self.writer.write(packets[sent])
+                    sent_at.append(time.perf_counter())
+                    sent += 1
+                try:
+                    response = await asyncio.wait_for(self._exchange(), self.timeout)
+                except asyncio.TimeoutError:
+                    # The link is still up, the inverter just did not answer in time.
+                    # Give up on the requests in flight and drop whatever arrives
+                    # late so it cannot be mistaken for the reply to the next command.
+                    print("Timeout waiting for response")
+                    COMMAND_FAILURES.labels('timeout').inc()
+                    results.extend([b''] * (sent - len(results)))
+                    await self.drain()
+                    # Late replies may still be on their way after the batch
+                    self.stale = True
+                    if not self.connected:
+                        break
+                    continue
+                results.append(response)
+                index = len(results) - 1
+                self._command_seconds(requests[index][1]).observe(time.perf_counter() - sent_at[index])
+                self.responses += 1
+        except asyncio.CancelledError:
+            # A reply may be half read, the stream position is unknown
+            self.close()
+            raise
+        except asyncio.IncompleteReadError as ex:
+            print(f"Connection closed by inverter after {len(ex.partial)} bytes")
+            COMMAND_FAILURES.labels('closed').inc()
+            self.close()
         except Exception as ex:
             print(f"Error sending command: {ex}")
+            COMMAND_FAILURES.labels('error').inc()
             self.close()
-            return b''
+        return results + [b''] * (len(packets) - len(results))
+
+    @classmethod
+    def _command_seconds(cls, command: int):
+        """Latency histogram series of a command."""
+        return COMMAND_SECONDS.labels(cls.COMMAND_NAMES.get(command, command))
+
+    async def _exchange(self) -> bytes:
+        """Flush queued request frames and read one response frame."""
+        await self.writer.drain()
+        return await self.frames.read_frame()
 
     async def send_dsp_command(self, address: int, param: int) -> float:
         """Send a DSP command to the inverter and return the response as a float."""
-        response = await self.send_command(address, self.CMD_GET_DSP, (param, 0))
+        return self.decode_dsp(param, await self.send_command(address, self.CMD_GET_DSP, (param, 0)))
+
+    @classmethod
+    def decode_dsp(cls, param: int, response: bytes) -> float:
+        """Decode the value of a DSP response; 0.0 for a missing response."""
         if not response:
             return 0.0
-        
-        # Extract the value from the response
-        value_raw = (response[6] + (response[7] << 8))
-        
-        # Special conversions based on parameter
-        if param == self.DSP_GRID_VOLTS:
-            return value_raw * 0.1  # V
-        elif param == self.DSP_OUTPUT_POWER:
-            return value_raw  # W
-        elif param in [self.DSP_TEMPERATURE_1, self.DSP_TEMPERATURE_2]:
-            return value_raw * 0.1  # °C
-        elif param in [self.DSP_VOLTAGE_1, self.DSP_VOLTAGE_2]:
-            return value_raw * 0.1  # V
-        elif param in [self.DSP_CURRENT_1, self.DSP_CURRENT_2]:
-            return value_raw * 0.01  # A
-        elif param == self.DSP_PEAK_TODAY:
-            return value_raw  # W
-        else:
-            return float(value_raw)
+        return decode_dsp(response) * cls.DSP_SCALES.get(param, 1.0)
 
     async def send_ce_command(self, address: int, param: int) -> int:
         """Send a Cumulated Energy command to the inverter and return the response as an integer."""
-        response = await self.send_command(address, self.CMD_GET_CE, (param, 0))
+        return self.decode_ce(await self.send_command(address, self.CMD_GET_CE, (param, 0)))
+
+    async def send_daily_energy_commands(self, address: int, days_back: List[int]) -> List[Optional[int]]:
+        """Read the logged energy (Wh) of several past days in one batch; None where there was no answer."""
+        responses = await self.send_commands([(address, self.CMD_GET_DAILY_ENERGY, (days & 0xFF, days >> 8))
+                                              for days in days_back])
+        return [self.decode_ce(response) if response else None for response in responses]
+
+    @staticmethod
+    def decode_ce(response: bytes) -> int:
+        """Decode the counter of a Cumulated Energy response; 0 for a missing response."""
         if not response:
             return 0
-        
-        # Energy values are 4-byte values split across the response
-        offset = 4
-        buffer = response
-        bytes_array = bytearray(4)
-        bytes_array[0] = buffer[offset + 1]
-        bytes_array[1] = buffer[offset + 0]
-        bytes_array[2] = buffer[offset + 3]
-        bytes_array[3] = buffer[offset]
-        
-        return struct.unpack('<i', bytes_array)[0]
+        return decode_ce(response)
+
+
+class AuroraSyncClient:
+    """Blocking wrapper around AuroraClient for scripts that don't run an event loop."""
+
+    def __init__(self, host: str, port: int, timeout: int = 400):
+        """Initialize the client and the private event loop driving it."""
+        self.loop = asyncio.new_event_loop()
+        self.client = AuroraClient(host, port, timeout)
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def connect(self) -> bool:
+        """Connect to the Aurora inverter."""
+        return self._run(self.client.connect())
+
+    def close(self):
+        """Close the connection and the private event loop."""
+        self.client.close()
+        if not self.loop.is_closed():
+            # Let the transport finish closing before the loop goes away
+            self._run(asyncio.sleep(0))
+            self.loop.close()
+
+    def send_command(self, address: int, command: int, data: Tuple[int, int] = (0, 0)) -> bytes:
+        """Send a command to the inverter and return the response."""
+        return self._run(self.client.send_command(address, command, data))
+
+    def send_dsp_command(self, address: int, param: int) -> float:
+        """Send a DSP command to the inverter and return the response as a float."""
+        return self._run(self.client.send_dsp_command(address, param))
+
+    def send_ce_command(self, address: int, param: int) -> int:
+        """Send a Cumulated Energy command to the inverter and return the response as an integer."""
+        return self._run(self.client.send_ce_command(address, param))
+
+    def read_inverter_data(self, address: int = 2) -> Dict[str, Any]:
+        """Read a full set of values from the inverter."""
+        return self._run(read_inverter_data(self.client, address))
 
 
 async def main():
@@ -241,55 +338,71 @@ async def main():
     await client.start_monitoring()
 
 # Helper methods for external applications
-async def get_output_power(client):
+async def get_output_power(client, address: int = 2):
     """Get the current output power from the inverter."""
-    return await client.send_dsp_command(2, client.DSP_OUTPUT_POWER)
+    return await client.send_dsp_command(address, client.DSP_OUTPUT_POWER)
 
-async def get_input_voltage(client, input_num):
+async def get_input_voltage(client, input_num, address: int = 2):
     """Get the input voltage from the inverter."""
     if input_num == 1:
-        return await client.send_dsp_command(2, client.DSP_VOLTAGE_1)
+        return await client.send_dsp_command(address, client.DSP_VOLTAGE_1)
     else:
-        return await client.send_dsp_command(2, client.DSP_VOLTAGE_2)
+        return await client.send_dsp_command(address, client.DSP_VOLTAGE_2)
 
-async def get_input_current(client, input_num):
+async def get_input_current(client, input_num, address: int = 2):
     """Get the input current from the inverter."""
     if input_num == 1:
-        return await client.send_dsp_command(2, client.DSP_CURRENT_1)
+        return await client.send_dsp_command(address, client.DSP_CURRENT_1)
     else:
-        return await client.send_dsp_command(2, client.DSP_CURRENT_2)
+        return await client.send_dsp_command(address, client.DSP_CURRENT_2)
 
-async def get_temperature(client):
+async def get_temperature(client, address: int = 2):
     """Get the temperature from the inverter."""
-    return await client.send_dsp_command(2, client.DSP_TEMPERATURE_1)
+    return await client.send_dsp_command(address, client.DSP_TEMPERATURE_1)
 
-async def get_grid_voltage(client):
+async def get_grid_voltage(client, address: int = 2):
     """Get the grid voltage from the inverter."""
-    return await client.send_dsp_command(2, client.DSP_GRID_VOLTS)
+    return await client.send_dsp_command(address, client.DSP_GRID_VOLTS)
 
-async def get_energy_today(client):
+async def get_energy_today(client, address: int = 2):
     """Get the energy produced today from the inverter."""
-    return await client.send_ce_command(2, 0) / 1000.0
+    return await client.send_ce_command(address, 0) / 1000.0
 
-async def get_energy_week(client):
+async def get_energy_week(client, address: int = 2):
     """Get the energy produced this week from the inverter."""
-    return await client.send_ce_command(2, 1) / 1000.0
+    return await client.send_ce_command(address, 1) / 1000.0
 
-async def get_energy_month(client):
+async def get_energy_month(client, address: int = 2):
     """Get the energy produced this month from the inverter."""
-    return await client.send_ce_command(2, 3) / 1000.0
+    return await client.send_ce_command(address, 3) / 1000.0
 
-async def get_energy_year(client):
+async def get_energy_year(client, address: int = 2):
     """Get the energy produced this year from the inverter."""
-    return await client.send_ce_command(2, 4) / 1000.0
+    return await client.send_ce_command(address, 4) / 1000.0
 
-async def get_energy_total(client):
+async def get_energy_total(client, address: int = 2):
     """Get the total energy produced from the inverter."""
-    return await client.send_ce_command(2, 5) / 1000.0
+    return await client.send_ce_command(address, 5) / 1000.0
 
-async def get_peak_power_today(client):
+async def get_peak_power_today(client, address: int = 2):
     """Get the peak power produced today from the inverter."""
-    return await client.send_dsp_command(2, client.DSP_PEAK_TODAY)
+    return await client.send_dsp_command(address, client.DSP_PEAK_TODAY)
+
+def calculate_efficiency(power_output: float, voltage1: float, current1: float,
+                         voltage2: float, current2: float) -> float:
+    """DC to AC conversion efficiency in percent, 0 when there is no input power."""
+    total_input = (voltage1 * current1) + (voltage2 * current2)
+    if total_input > 0:
+        return (power_output / total_input) * 100
+    return 0
+
+async def read_inverter_data(client, address: int = 2):
+    """Read a full set of values from the inverter, as stored by the web application."""
+    responses = await client.send_commands([m.request(address) for m in MEASUREMENTS])
+    data = {m.name: m.decode(response) for m, response in zip(MEASUREMENTS, responses)}
+    data['efficiency'] = calculate_efficiency(data['power_output'], data['voltage_1'], data['current_1'],
+                                              data['voltage_2'], data['current_2'])
+    return data
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
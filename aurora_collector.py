@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Collector
+
+from aurora_web_app import run_collector
+
+if __name__ == "__main__":
+    run_collector()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Configuration File Watch
+
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger("aurora_config")
+
+
+class ConfigWatcher:
+    """Follows a JSON configuration file changed by another process or by hand.
+
+    A background thread checks the file every interval seconds and parses
+    it again when its inode, size or modification time changed, then calls
+    back with the settings. No inotify is needed, so it also works on the
+    bind mounts and network file systems of containers. A half-written or
+    invalid file is logged once and retried when it changes again.
+    """
+
+    def __init__(self, path: str, callback: Callable[[Dict[str, Any]], None], interval: float = 2.0):
+        """Initialize the watcher; the file's current version counts as already applied."""
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self.reloads = 0
+        self._stamp = self._current_stamp()
+        self._failed: Optional[Tuple[int, int, int]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _current_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def check(self) -> bool:
+        """Call back if the file changed since the last check; returns whether it did."""
+        stamp = self._current_stamp()
+        if stamp is None or stamp == self._stamp or stamp == self._failed:
+            return False
+        try:
+            with open(self.path) as f:
+                settings = json.load(f)
+            if not isinstance(settings, dict):
+                raise ValueError("not a JSON object")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring configuration file {self.path} until it changes again: {e}")
+            self._failed = stamp
+            return False
+        self._stamp = stamp
+        self.reloads += 1
+        logger.info(f"Configuration file {self.path} changed, applying it")
+        self.callback(settings)
+        return True
+
+    def start(self):
+        """Check the file from a background thread."""
+        def run():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.check()
+                except Exception as e:
+                    logger.error(f"Error applying configuration file: {e}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Connection Manager
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from aurora_client import AuroraClient
+from aurora_metrics import REGISTRY
+
+logger = logging.getLogger("aurora_connection")
+
+RECONNECTS = REGISTRY.counter('aurora_reconnects_total', 'Connections re-established to a bridge', ('bridge',))
+CONNECT_FAILURES = REGISTRY.counter('aurora_connect_failures_total', 'Failed connection attempts to a bridge',
+                                    ('bridge',))
+
+
+class AuroraConnection:
+    """Long-lived connection to an EW11 bridge.
+
+    Keeps a single AuroraClient socket open across poll cycles, checks it
+    with a cheap request when the link has been idle, and reconnects with
+    exponential backoff when it drops. All requests are serialized through
+    one lock, so the poller and on-demand reads can share the same socket.
+    """
+
+    def __init__(self, host: str, port: int, timeout: int = 400,
+                 keepalive_interval: float = 60, min_backoff: float = 1,
+                 max_backoff: float = 300, probe_address: int = 2):
+        """Initialize the connection manager for the given bridge."""
+        self.client = AuroraClient(host, port, timeout)
+        self.client.auto_reconnect = False
+        self.probe_address = probe_address
+        self.keepalive_interval = keepalive_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.backoff = 0.0
+        self.next_attempt = 0.0
+        self.last_activity = 0.0
+        self.reconnects = 0
+        # Set while nothing behind the bridge is awake; suspends keepalive probes
+        self.paused = False
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._keepalive_task: Optional[asyncio.Task] = None
+
+    @property
+    def bridge(self) -> str:
+        """host:port of the bridge."""
+        return f"{self.client.host}:{self.client.port}"
+
+    @property
+    def connected(self) -> bool:
+        """True while the underlying socket is open."""
+        return self.client.connected
+
+    async def open(self):
+        """Bind to the running event loop, connect and start the keepalive task."""
+        self.loop = asyncio.get_running_loop()
+        self._lock = asyncio.Lock()
+        await self.ensure_connected()
+        if self.keepalive_interval:
+            self._keepalive_task = self.loop.create_task(self._keepalive())
+
+    async def close(self):
+        """Stop the keepalive task and close the socket."""
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+            try:
+                await self._keepalive_task
+            except asyncio.CancelledError:
+                pass
+            self._keepalive_task = None
+        self.client.close()
+
+    async def ensure_connected(self) -> bool:
+        """Connect if needed, honouring the reconnection backoff."""
+        if self.connected:
+            return True
+
+        now = time.monotonic()
+        if now < self.next_attempt:
+            return False
+
+        if await self.client.connect():
+            if self.last_activity:
+                self.reconnects += 1
+                RECONNECTS.labels(self.bridge).inc()
+                logger.info(f"Reconnected to {self.client.host}:{self.client.port}")
+            self.backoff = 0.0
+            self.next_attempt = 0.0
+            self.last_activity = now
+            return True
+
+        CONNECT_FAILURES.labels(self.bridge).inc()
+        # Exponential backoff with jitter so several pollers don't retry in lockstep
+        self.backoff = min(self.max_backoff, self.backoff * 2 or self.min_backoff)
+        self.next_attempt = now + self.backoff * random.uniform(0.8, 1.2)
+        logger.warning(f"Connection to {self.client.host}:{self.client.port} failed, "
+                       f"retrying in {self.backoff:.0f}s")
+        return False
+
+    async def request(self, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        """Run func(client, *args) with exclusive use of the connection."""
+        async with self._lock:
+            if not await self.ensure_connected():
+                raise ConnectionError(f"Inverter {self.client.host}:{self.client.port} not reachable")
+            try:
+                return await func(self.client, *args)
+            finally:
+                if self.connected:
+                    self.last_activity = time.monotonic()
+
+    def request_threadsafe(self, func: Callable[..., Awaitable[Any]], *args,
+                           timeout: Optional[float] = None) -> Any:
+        """Run a request from another thread (e.g. a Flask handler) on the poller's loop."""
+        if self.loop is None or self.loop.is_closed():
+            raise ConnectionError("Connection manager is not running")
+        future = asyncio.run_coroutine_threadsafe(self.request(func, *args), self.loop)
+        return future.result(timeout)
+
+    async def health_check(self) -> bool:
+        """Check the link with a single grid voltage read.
+
+        A missing answer only means the inverter is asleep; the link is
+        considered dead when the client had to drop the socket.
+        """
+        await self.client.send_command(self.probe_address, AuroraClient.CMD_GET_DSP,
+                                       (AuroraClient.DSP_GRID_VOLTS, 0))
+        return self.connected
+
+    async def _keepalive(self):
+        """Probe the link when idle so a dead bridge is noticed before the next poll."""
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            if self.paused or time.monotonic() - self.last_activity < self.keepalive_interval:
+                continue
+            async with self._lock:
+                if not await self.ensure_connected():
+                    continue
+                if await self.health_check():
+                    self.last_activity = time.monotonic()
+                else:
+                    logger.warning(f"Health check failed for {self.client.host}:{self.client.port}, reconnecting")
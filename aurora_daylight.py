@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Daylight and Activity Tracking
+
+import datetime
+import logging
+import math
+from typing import Optional, Tuple
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # Python < 3.9: fall back to the system's local time
+    ZoneInfo = None
+
+logger = logging.getLogger("aurora_daylight")
+
+ACTIVE = 'active'
+IDLE = 'idle'
+ASLEEP = 'asleep'
+
+
+def get_timezone(name: Optional[str]) -> Optional[datetime.tzinfo]:
+    """The named time zone, or None (local time) if it isn't available."""
+    if not name or ZoneInfo is None:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning(f"Unknown timezone {name}, using local time")
+        return None
+
+
+def sun_times(day: datetime.date, latitude: float, longitude: float,
+              tz: Optional[datetime.tzinfo] = None) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+    """Sunrise and sunset on day, as aware datetimes in tz.
+
+    Uses the NOAA approximation (within a couple of minutes, plenty for
+    scheduling). Returns None during polar night; during midnight sun the
+    whole day is returned.
+    """
+    g = 2 * math.pi / 365 * (day.timetuple().tm_yday - 1)
+    eqtime = 229.18 * (0.000075 + 0.001868 * math.cos(g) - 0.032077 * math.sin(g)
+                       - 0.014615 * math.cos(2 * g) - 0.040849 * math.sin(2 * g))
+    decl = (0.006918 - 0.399912 * math.cos(g) + 0.070257 * math.sin(g)
+            - 0.006758 * math.cos(2 * g) + 0.000907 * math.sin(2 * g)
+            - 0.002697 * math.cos(3 * g) + 0.00148 * math.sin(3 * g))
+    lat = math.radians(latitude)
+    cos_ha = (math.cos(math.radians(90.833)) / (math.cos(lat) * math.cos(decl))
+              - math.tan(lat) * math.tan(decl))
+
+    tz = tz or datetime.datetime.now().astimezone().tzinfo
+    midnight = datetime.datetime(day.year, day.month, day.day, tzinfo=tz)
+    if cos_ha > 1:
+        return None
+    if cos_ha < -1:
+        return midnight, midnight + datetime.timedelta(days=1)
+
+    ha = math.degrees(math.acos(cos_ha))
+    utc_midnight = datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc)
+    sunrise = utc_midnight + datetime.timedelta(minutes=720 - 4 * (longitude + ha) - eqtime)
+    sunset = utc_midnight + datetime.timedelta(minutes=720 - 4 * (longitude - ha) - eqtime)
+    return sunrise.astimezone(tz), sunset.astimezone(tz)
+
+
+class ActivityTracker:
+    """Decides how soon to poll an inverter again from daylight and its output.
+
+    An inverter is active while it produces power, idle once it has
+    reported zero power several times in a row and asleep when its DSP
+    stops answering. Active inverters follow their normal schedule. When
+    site coordinates are known, an idle or asleep inverter is left alone
+    until shortly before sunrise and then probed every wake_interval
+    seconds until it produces again. Otherwise, and during daytime
+    outages, polling backs off exponentially up to max_interval; with a
+    location, the back-off starts after the dawn probing.
+    """
+
+    def __init__(self, name: str, latitude: Optional[float] = None, longitude: Optional[float] = None,
+                 tz: Optional[datetime.tzinfo] = None, wake_margin: float = 1800,
+                 wake_interval: float = 60, idle_after: int = 3, max_interval: float = 1800):
+        """Initialize the tracker; latitude/longitude enable sunrise/sunset scheduling."""
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+        self.tz = tz
+        self.wake_margin = wake_margin
+        self.wake_interval = wake_interval
+        self.idle_after = idle_after
+        self.max_interval = max_interval
+        self.state = ACTIVE
+        self.zero_readings = 0
+        self.misses = 0
+
+    @property
+    def has_location(self) -> bool:
+        return self.latitude is not None and self.longitude is not None
+
+    def now(self) -> datetime.datetime:
+        """Current time in the site's time zone."""
+        return datetime.datetime.now(self.tz) if self.tz else datetime.datetime.now().astimezone()
+
+    def daylight_window(self, day: datetime.date) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+        """Span of day in which the inverter can be awake: sunrise/sunset widened by wake_margin."""
+        times = sun_times(day, self.latitude, self.longitude, self.tz)
+        if times is None:
+            return None
+        margin = datetime.timedelta(seconds=self.wake_margin)
+        return times[0] - margin, times[1] + margin
+
+    def seconds_until_daylight(self, now: datetime.datetime) -> float:
+        """0 inside today's daylight window, otherwise seconds until the next one starts."""
+        for offset in range(0, 190):
+            window = self.daylight_window(now.date() + datetime.timedelta(days=offset))
+            if window is None:
+                continue
+            start, end = window
+            if now < start:
+                return (start - now).total_seconds()
+            if now <= end:
+                return 0.0
+        return self.max_interval
+
+    def update(self, answered: bool, power: Optional[float] = None) -> str:
+        """Record the outcome of a poll and return the new state."""
+        previous = self.state
+        if not answered:
+            self.misses += 1
+            self.zero_readings = 0
+            self.state = ASLEEP
+        elif power is None:
+            # Answered, but the power wasn't read yet
+            self.misses = 0
+            if previous == ASLEEP:
+                self.state = IDLE
+        elif power:
+            self.misses = 0
+            self.zero_readings = 0
+            self.state = ACTIVE
+        else:
+            self.misses = 0
+            self.zero_readings += 1
+            if self.zero_readings >= self.idle_after:
+                self.state = IDLE
+            elif previous == ASLEEP:
+                # Answering again but not producing yet
+                self.state = IDLE
+
+        if self.state != previous:
+            logger.info(f"Inverter {self.name}: {previous} -> {self.state}")
+        return self.state
+
+    def delay(self, interval: float) -> float:
+        """Seconds until the next poll of an idle or asleep inverter normally polled every interval."""
+        if self.has_location:
+            until_daylight = self.seconds_until_daylight(self.now())
+            if until_daylight > 0:
+                # Night: nothing to read until the sun is back
+                return until_daylight
+            if self.in_wake_window():
+                # Dawn: probe often so production is picked up right away. The
+                # back-off below starts over after the window, whatever it missed.
+                self.misses = 0
+                self.zero_readings = min(self.zero_readings, self.idle_after)
+                return min(interval, self.wake_interval)
+
+        # Daytime outage or no location: back off exponentially
+        streak = max(self.misses, self.zero_readings - self.idle_after + 1, 1)
+        return min(interval * 2 ** (streak - 1), max(self.max_interval, interval))
+
+    def in_wake_window(self) -> bool:
+        """True within wake_margin either side of today's sunrise."""
+        now = self.now()
+        times = sun_times(now.date(), self.latitude, self.longitude, self.tz)
+        if times is None:
+            return False
+        return abs((now - times[0]).total_seconds()) <= self.wake_margin
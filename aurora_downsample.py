@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - History Downsampling
+
+import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+
+def lttb(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """Largest-Triangle-Three-Buckets: indices of threshold points that keep the curve's shape.
+
+    The first and last points are always kept. From every bucket in between,
+    the point forming the largest triangle with the previously kept point and
+    the average of the next bucket wins, so peaks and dips survive where a
+    plain average or stride would flatten them.
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    sampled = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Average point of the next bucket
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_count = avg_end - avg_start
+        avg_x = sum(xs[avg_start:avg_end]) / avg_count
+        avg_y = sum(ys[avg_start:avg_end]) / avg_count
+
+        # Point of this bucket with the largest triangle
+        ax, ay = xs[a], ys[a]
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        max_area = -1.0
+        next_a = range_start
+        for j in range(range_start, range_end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                next_a = j
+
+        sampled.append(next_a)
+        a = next_a
+
+    sampled.append(n - 1)
+    return sampled
+
+
+def downsample(rows: List[Dict[str, Any]], max_points: int, field: str = 'power_output') -> List[Dict[str, Any]]:
+    """Reduce history rows to at most max_points per inverter with LTTB on field."""
+    if len(rows) <= max_points:
+        return rows
+
+    # Rows of several inverters are interleaved by time; downsample each series
+    series: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for row in rows:
+        series.setdefault(row.get('inverter_id'), []).append(row)
+
+    result = []
+    for series_rows in series.values():
+        xs = [datetime.datetime.fromisoformat(row['timestamp']).timestamp() for row in series_rows]
+        ys = [row.get(field) or 0.0 for row in series_rows]
+        result.extend(series_rows[i] for i in lttb(xs, ys, max_points))
+
+    if len(series) > 1:
+        result.sort(key=lambda row: row['timestamp'])
+    return result
+
+
+def select_fields(rows: List[Dict[str, Any]], fields: Sequence[str]) -> List[Dict[str, Any]]:
+    """Keep only timestamp, inverter_id and the requested fields of each row."""
+    keep = ['timestamp', 'inverter_id'] + [f for f in fields if f not in ('timestamp', 'inverter_id')]
+    return [{key: row[key] for key in keep if key in row} for row in rows]
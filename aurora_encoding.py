@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Compact History Encodings
+
+import array
+import datetime
+import gzip
+import json
+import struct
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # Optional: only needed for application/x-msgpack responses
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip is used when brotli isn't installed
+    brotli = None
+
+MIME_JSON = 'application/json'
+MIME_COLUMNAR = 'application/vnd.aurora.columnar+json'
+MIME_PACKED = 'application/vnd.aurora.packed'
+MIME_MSGPACK = 'application/x-msgpack'
+
+# ?format= values and the media type each one selects
+FORMATS = {
+    'rows': MIME_JSON,
+    'columnar': MIME_COLUMNAR,
+    'packed': MIME_PACKED,
+    'msgpack': MIME_MSGPACK,
+}
+
+PACKED_MAGIC = b'AUR1'
+
+# Below this size compression costs more than it saves
+COMPRESS_MIN_SIZE = 1024
+COMPRESSIBLE_TYPES = (MIME_JSON, MIME_COLUMNAR, MIME_PACKED, MIME_MSGPACK, 'text/')
+
+
+def available_types() -> List[str]:
+    """Media types this server can produce, preferred first."""
+    types = [MIME_JSON, MIME_COLUMNAR, MIME_PACKED]
+    if msgpack is not None:
+        types.append(MIME_MSGPACK)
+    return types
+
+
+def columnar(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Turn history rows into one array per field.
+
+    Timestamps become epoch seconds stored as a base plus per-row deltas
+    (mostly the same small number, which compresses to almost nothing).
+    Inverter ids are listed once; 'inverter' holds an index into that list
+    per row and is left out when there is only one inverter.
+    """
+    epochs = [int(datetime.datetime.fromisoformat(row['timestamp']).timestamp()) for row in rows]
+    base = epochs[0] if epochs else 0
+    deltas = [b - a for a, b in zip([base] + epochs, epochs)]
+
+    inverters: List[str] = []
+    index: Dict[str, int] = {}
+    inverter = []
+    for row in rows:
+        inverter_id = row.get('inverter_id')
+        if inverter_id not in index:
+            index[inverter_id] = len(inverters)
+            inverters.append(inverter_id)
+        inverter.append(index[inverter_id])
+
+    names = [key for key in (rows[0] if rows else {}) if key not in ('timestamp', 'inverter_id', 'id')]
+    data: Dict[str, Any] = {
+        'count': len(rows),
+        'timestamp': {'base': base, 'deltas': deltas},
+        'inverters': inverters,
+        'fields': {name: [row.get(name) for row in rows] for name in names},
+    }
+    if len(inverters) > 1:
+        data['inverter'] = inverter
+    return data
+
+
+def pack(data: Dict[str, Any]) -> bytes:
+    """Binary form of a columnar() result.
+
+    Layout: b'AUR1', uint32 header length, JSON header (count, base,
+    inverters, field names, extras), then little-endian arrays: int32
+    timestamp deltas, uint8 inverter indexes when there are several
+    inverters, and one float32 array per field (NaN for missing values).
+    """
+    names = list(data['fields'])
+    header = {key: value for key, value in data.items() if key not in ('timestamp', 'fields', 'inverter')}
+    header.update(base=data['timestamp']['base'], fields=names, inverter='inverter' in data)
+    header_bytes = json.dumps(header, separators=(',', ':')).encode()
+
+    parts = [PACKED_MAGIC, struct.pack('<I', len(header_bytes)), header_bytes,
+             _little_endian(array.array('i', data['timestamp']['deltas']))]
+    if 'inverter' in data:
+        parts.append(bytes(data['inverter']))
+    nan = float('nan')
+    for name in names:
+        values = [nan if v is None or isinstance(v, str) else v for v in data['fields'][name]]
+        parts.append(_little_endian(array.array('f', values)))
+    return b''.join(parts)
+
+
+def _little_endian(values: array.array) -> bytes:
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def encode(rows: List[Dict[str, Any]], mimetype: str, extra: Optional[Dict[str, Any]] = None) -> bytes:
+    """Encode history rows as mimetype; extra keys are added to columnar payloads."""
+    if mimetype == MIME_JSON:
+        return json.dumps(rows, separators=(',', ':')).encode()
+
+    data = columnar(rows)
+    if extra:
+        data.update(extra)
+    if mimetype == MIME_COLUMNAR:
+        return json.dumps(data, separators=(',', ':')).encode()
+    if mimetype == MIME_PACKED:
+        return pack(data)
+    if mimetype == MIME_MSGPACK and msgpack is not None:
+        return msgpack.packb(data, use_single_float=True)
+    raise ValueError(f"Unsupported media type: {mimetype}")
+
+
+def compress(body: bytes, accept_encoding) -> Tuple[bytes, Optional[str]]:
+    """Compress body with the best encoding the client accepts; returns (body, encoding)."""
+    if len(body) < COMPRESS_MIN_SIZE:
+        return body, None
+    if brotli is not None and accept_encoding['br']:
+        return brotli.compress(body, quality=5), 'br'
+    if accept_encoding['gzip']:
+        return gzip.compress(body, compresslevel=6), 'gzip'
+    return body, None
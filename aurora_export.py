@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Streaming Export
+
+import argparse
+import csv
+import datetime
+import io
+import json
+import logging
+import os
+import sys
+import time
+from typing import Iterable, Iterator, List, Optional
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.parquet
+except ImportError:  # Optional: only needed for Parquet exports
+    pyarrow = None
+
+from aurora_storage import READING_COLUMNS, READING_FIELDS, ReadingStore
+
+logger = logging.getLogger("aurora_export")
+
+# ?format= values: media type and file extension
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+# Rows fetched, encoded and sent at a time: bounds the memory an export takes
+CHUNK_SIZE = 5000
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def available_formats() -> List[str]:
+    """Export formats this installation can write."""
+    return [name for name in FORMATS if name != 'parquet' or pyarrow is not None]
+
+
+def parse_time(value: str) -> str:
+    """Normalize a 'YYYY-MM-DD[ HH:MM[:SS]]' bound to the stored timestamp format; ValueError if invalid."""
+    return datetime.datetime.fromisoformat(value).strftime(TIMESTAMP_FORMAT)
+
+
+def encode_csv(chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """CSV with a header line, one piece per chunk of rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(READING_COLUMNS)
+    yield buffer.getvalue().encode()
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+
+
+def encode_ndjson(chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """One JSON object per line, one piece per chunk of rows."""
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(READING_COLUMNS, row)), separators=(',', ':')) + '\n'
+                      for row in rows).encode()
+
+
+class _Drain:
+    """Write-only file for ParquetWriter whose contents are taken out after every row group."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        """Everything written since the last take()."""
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def encode_parquet(chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """Parquet with one row group per chunk of rows; needs pyarrow.
+
+    Timestamps are stored as local wall-clock times, like the database
+    keeps them, and every field as a double.
+    """
+    if pyarrow is None:
+        raise RuntimeError("Parquet exports require pyarrow")
+    schema = pyarrow.schema([('inverter_id', pyarrow.string()), ('timestamp', pyarrow.timestamp('s'))]
+                            + [(field, pyarrow.float64()) for field in READING_FIELDS])
+    sink = _Drain()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+    for rows in chunks:
+        columns = list(zip(*rows))
+        arrays = [pyarrow.array(columns[0], pyarrow.string()),
+                  pyarrow.compute.strptime(pyarrow.array(columns[1], pyarrow.string()),
+                                           format=TIMESTAMP_FORMAT, unit='s')]
+        arrays += [pyarrow.array(values, pyarrow.float64()) for values in columns[2:]]
+        writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+        yield sink.take()
+    # The footer
+    writer.close()
+    yield sink.take()
+
+
+ENCODERS = {
+    'csv': encode_csv,
+    'ndjson': encode_ndjson,
+    'parquet': encode_parquet,
+}
+
+
+def export(store: ReadingStore, format: str, start_time: str, end_time: Optional[str] = None,
+           inverter_id: Optional[str] = None, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Stream the readings of a time range in one of FORMATS, chunk_size rows at a time."""
+    return ENCODERS[format](store.iter_readings(start_time, end_time, inverter_id, chunk_size=chunk_size))
+
+
+def filename(format: str, start_time: str, end_time: Optional[str] = None) -> str:
+    """Suggested file name of an export."""
+    end = end_time or datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
+    return f"aurora-{start_time[:10]}-{end[:10]}.{FORMATS[format][1]}"
+
+
+def main():
+    """Export readings to a file or stdout."""
+    parser = argparse.ArgumentParser(description="Export Aurora Inverter Monitor readings")
+    parser.add_argument('--db', default=os.environ.get('DB_PATH', 'aurora_data.db'))
+    parser.add_argument('--from', dest='start', required=True, help="first timestamp, e.g. 2024-01-01")
+    parser.add_argument('--to', dest='end', help="end of the range (exclusive); default: everything since --from")
+    parser.add_argument('--inverter', help="only this inverter")
+    parser.add_argument('--format', choices=list(FORMATS), default='csv')
+    parser.add_argument('--output', help="file to write; default: stdout")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.format not in available_formats():
+        parser.error(f"{args.format} exports require pyarrow")
+    try:
+        start_time = parse_time(args.start)
+        end_time = parse_time(args.end) if args.end else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Read-only: safe beside a running monitor
+    store = ReadingStore(args.db, readonly=True)
+    store.open()
+    start = time.perf_counter()
+    size = 0
+    output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for piece in export(store, args.format, start_time, end_time, args.inverter, args.chunk_size):
+            output.write(piece)
+            size += len(piece)
+    finally:
+        if args.output:
+            output.close()
+        store.close()
+    logger.info(f"Exported {size / 1048576:.1f} MiB of {args.format} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
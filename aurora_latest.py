@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Latest Readings
+
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+
+
+def _freeze(mappings: Mapping[str, Mapping[str, Any]]) -> Mapping[str, Mapping[str, Any]]:
+    """Read-only copy of a mapping of mappings; inner ones that are already frozen are shared."""
+    return MappingProxyType({key: value if isinstance(value, MappingProxyType) else MappingProxyType(dict(value))
+                             for key, value in mappings.items()})
+
+class ReadingSnapshot:
+    """The latest reading of every inverter at one moment; never modified.
+
+    seq increases with every new reading, and captured_at is the wall-clock
+    time the snapshot was taken. field_times holds, per inverter, the
+    wall-clock time each field was last read from the inverter: with
+    per-field polling rates a reading mixes values of different ages.
+    """
+
+    def __init__(self, seq: int, captured_at: float, readings: Dict[str, Dict[str, Any]],
+                 field_times: Dict[str, Dict[str, float]], dashboard: Optional[str]):
+        """Initialize the snapshot; the mappings are copied and frozen."""
+        self.seq = seq
+        self.captured_at = captured_at
+        self.readings: Mapping[str, Mapping[str, Any]] = _freeze(readings)
+        self.field_times: Mapping[str, Mapping[str, float]] = _freeze(field_times)
+        # Inverter shown on the dashboard
+        self.dashboard = dashboard
+
+    def reading(self, inverter_id: Optional[str] = None) -> Dict[str, Any]:
+        """Latest reading of inverter_id (default: the dashboard inverter), or {} if there is none."""
+        return dict(self.readings.get(self.dashboard if inverter_id is None else inverter_id, {}))
+
+    def age(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds since the snapshot was taken, or None before the first reading."""
+        if not self.captured_at:
+            return None
+        return round((time.time() if now is None else now) - self.captured_at, 3)
+
+    def field_ages(self, inverter_id: Optional[str] = None, now: Optional[float] = None) -> Dict[str, float]:
+        """Seconds since each field of the reading was read from the inverter."""
+        now = time.time() if now is None else now
+        times = self.field_times.get(self.dashboard if inverter_id is None else inverter_id, {})
+        return {name: round(now - read_at, 3) for name, read_at in times.items()}
+
+    def to_dict(self, inverter_id: Optional[str] = None) -> Dict[str, Any]:
+        """The snapshot of one inverter as served by /api/data?since=."""
+        now = time.time()
+        return {
+            'seq': self.seq,
+            'captured_at': self.captured_at,
+            'age': self.age(now),
+            'inverter_id': self.dashboard if inverter_id is None else inverter_id,
+            'reading': self.reading(inverter_id),
+            'field_age': self.field_ages(inverter_id, now),
+        }
+
+
+class LatestReadings:
+    """Hands the latest readings from the poller to request threads.
+
+    Every update builds a new ReadingSnapshot and swaps it in with a single
+    reference assignment, so readers take current without any lock and
+    always see one consistent snapshot. The condition is only used by
+    writers and by long-poll requests waiting for a newer seq.
+    """
+
+    def __init__(self, seq: int = 0):
+        """Initialize with an empty snapshot at seq."""
+        self.current = ReadingSnapshot(seq, 0.0, {}, {}, None)
+        self._changed = threading.Condition()
+
+    def update(self, inverter_id: str, data: Dict[str, Any], field_times: Optional[Dict[str, float]] = None,
+               dashboard: bool = False) -> ReadingSnapshot:
+        """Publish a new reading of one inverter; dashboard marks the inverter the dashboard shows."""
+        with self._changed:
+            previous = self.current
+            readings = dict(previous.readings)
+            readings[inverter_id] = data
+            times = dict(previous.field_times)
+            times[inverter_id] = field_times or {}
+            self.current = ReadingSnapshot(previous.seq + 1, time.time(), readings, times,
+                                           inverter_id if dashboard else previous.dashboard)
+            self._changed.notify_all()
+            return self.current
+
+    def replace(self, snapshot: ReadingSnapshot) -> bool:
+        """Take over a snapshot built elsewhere (e.g. by the collector); False if it is already current."""
+        with self._changed:
+            if snapshot.seq == self.current.seq:
+                return False
+            self.current = snapshot
+            self._changed.notify_all()
+            return True
+
+    def wait(self, since: int, timeout: float) -> Optional[ReadingSnapshot]:
+        """The current snapshot once its seq is past since, or None after timeout seconds."""
+        snapshot = self.current
+        if snapshot.seq > since:
+            return snapshot
+        with self._changed:
+            if self._changed.wait_for(lambda: self.current.seq > since, timeout):
+                return self.current
+        return None
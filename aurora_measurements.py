@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Measurement Registry
+
+import math
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+# Aurora protocol commands
+CMD_GET_DSP = 59
+CMD_GET_CE = 78
+
+# DSP replies carry the value as a little-endian 16-bit integer in bytes 6-7
+DSP_VALUE = struct.Struct('<H')
+# Cumulated Energy replies carry a signed 32-bit Wh counter in bytes 4-7,
+# as two big-endian words, low word first
+CE_WORDS = struct.Struct('>Hh')
+
+
+def decode_dsp(response: bytes) -> int:
+    """Raw value of a DSP reply."""
+    return DSP_VALUE.unpack_from(response, 6)[0]
+
+
+def decode_ce(response: bytes) -> int:
+    """Counter of a Cumulated Energy reply."""
+    low, high = CE_WORDS.unpack_from(response, 4)
+    return (high << 16) | low
+
+
+class Measurement:
+    """One value the inverter reports, read with one DSP or CE request.
+
+    name is the reading field and database column, and the raw integer of
+    the reply times scale is the value in unit. min_interval is the floor
+    on how often the field is read (see aurora_schedule), metric the
+    (name, help) of the Prometheus family /metrics exports it in and
+    metric_label its (label, value) within that family. Replies are
+    decoded with precompiled structs, and request tuples are built once
+    per address.
+    """
+
+    __slots__ = ('name', 'command', 'param', 'scale', 'unit', 'title', 'min_interval',
+                 'metric', 'metric_label', '_cumulated', '_requests')
+
+    def __init__(self, name: str, command: int, param: int, scale: float = 1.0, unit: str = '',
+                 title: str = '', min_interval: float = 0.0, metric: Optional[Tuple[str, str]] = None,
+                 metric_label: Optional[Tuple[str, str]] = None):
+        """Initialize a measurement."""
+        self.name = name
+        self.command = command
+        self.param = param
+        self.scale = scale
+        self.unit = unit
+        self.title = title or name
+        self.min_interval = min_interval
+        self.metric = metric
+        self.metric_label = metric_label
+        self._cumulated = command == CMD_GET_CE
+        self._requests: Dict[int, Tuple[int, int, Tuple[int, int]]] = {}
+
+    def request(self, address: int) -> Tuple[int, int, Tuple[int, int]]:
+        """The (address, command, data) request reading this measurement."""
+        request = self._requests.get(address)
+        if request is None:
+            request = self._requests[address] = (address, self.command, (self.param, 0))
+        return request
+
+    def decode(self, response: bytes) -> float:
+        """The value carried by a response frame; 0.0 for a missing response."""
+        if not response:
+            return 0.0
+        # decode_ce/decode_dsp inlined: this runs for every reply
+        if self._cumulated:
+            low, high = CE_WORDS.unpack_from(response, 4)
+            return ((high << 16) | low) * self.scale
+        return DSP_VALUE.unpack_from(response, 6)[0] * self.scale
+
+    async def read(self, client: Any, address: int) -> float:
+        """Request the value from the inverter."""
+        return self.decode(await client.send_command(*self.request(address)))
+
+    @property
+    def decimals(self) -> int:
+        """Digits after the decimal point the raw value resolves."""
+        return max(0, round(-math.log10(self.scale)))
+
+    @property
+    def factor(self) -> int:
+        """Raw units per unit, for storing the value as an integer."""
+        return round(1 / self.scale)
+
+
+# Every value read from the inverter, in reading order. An entry here is all it
+# takes to poll a register, store it in its own column and export it in /metrics.
+MEASUREMENTS = (
+    Measurement('power_output', CMD_GET_DSP, 3, 1.0, 'W', 'Power Output',
+                metric=('aurora_power_output_watts', 'AC output power')),
+    Measurement('voltage_1', CMD_GET_DSP, 23, 0.1, 'V', 'Input 1 Voltage',
+                metric=('aurora_input_voltage_volts', 'DC voltage per MPPT input'), metric_label=('input', '1')),
+    Measurement('current_1', CMD_GET_DSP, 25, 0.01, 'A', 'Input 1 Current',
+                metric=('aurora_input_current_amperes', 'DC current per MPPT input'), metric_label=('input', '1')),
+    Measurement('voltage_2', CMD_GET_DSP, 26, 0.1, 'V', 'Input 2 Voltage',
+                metric=('aurora_input_voltage_volts', 'DC voltage per MPPT input'), metric_label=('input', '2')),
+    Measurement('current_2', CMD_GET_DSP, 27, 0.01, 'A', 'Input 2 Current',
+                metric=('aurora_input_current_amperes', 'DC current per MPPT input'), metric_label=('input', '2')),
+    Measurement('temperature', CMD_GET_DSP, 21, 0.1, '°C', 'Temperature', min_interval=60,
+                metric=('aurora_temperature_celsius', 'Inverter temperature')),
+    Measurement('grid_voltage', CMD_GET_DSP, 1, 0.1, 'V', 'Grid Voltage',
+                metric=('aurora_grid_voltage_volts', 'Grid voltage')),
+    Measurement('peak_today', CMD_GET_DSP, 35, 1.0, 'W', 'Peak Today', min_interval=60,
+                metric=('aurora_peak_power_today_watts', 'Peak AC power today')),
+    # Counters move by a few Wh per minute at most
+    Measurement('energy_today', CMD_GET_CE, 0, 0.001, 'kWh', 'Energy Today', min_interval=60,
+                metric=('aurora_energy_kwh', 'Energy counters of the inverter'), metric_label=('period', 'today')),
+    Measurement('energy_week', CMD_GET_CE, 1, 0.001, 'kWh', 'Energy Week', min_interval=900,
+                metric=('aurora_energy_kwh', 'Energy counters of the inverter'), metric_label=('period', 'week')),
+    Measurement('energy_month', CMD_GET_CE, 3, 0.001, 'kWh', 'Energy Month', min_interval=900,
+                metric=('aurora_energy_kwh', 'Energy counters of the inverter'), metric_label=('period', 'month')),
+    Measurement('energy_year', CMD_GET_CE, 4, 0.001, 'kWh', 'Energy Year', min_interval=900,
+                metric=('aurora_energy_kwh', 'Energy counters of the inverter'), metric_label=('period', 'year')),
+    Measurement('energy_total', CMD_GET_CE, 5, 0.001, 'kWh', 'Energy Total', min_interval=900,
+                metric=('aurora_energy_kwh', 'Energy counters of the inverter'), metric_label=('period', 'total')),
+    Measurement('grid_frequency', CMD_GET_DSP, 4, 0.01, 'Hz', 'Grid Frequency',
+                metric=('aurora_grid_frequency_hertz', 'Grid frequency')),
+    Measurement('leakage_current', CMD_GET_DSP, 7, 0.001, 'A', 'Leakage Current', min_interval=60,
+                metric=('aurora_leakage_current_amperes', 'Leakage current to ground')),
+    # Measured by the inverter at start-up only
+    Measurement('isolation_resistance', CMD_GET_DSP, 30, 0.1, 'MΩ', 'Isolation Resistance', min_interval=900,
+                metric=('aurora_isolation_resistance_megohms', 'Insulation resistance of the PV array to ground')),
+)
+
+BY_NAME = {m.name: m for m in MEASUREMENTS}
+
+
+def metric_families() -> Tuple[Tuple[str, str, Optional[str], Dict[str, Optional[str]]], ...]:
+    """Measurements grouped by Prometheus family: (metric, help, label, field -> label value)."""
+    families: Dict[str, Tuple[str, str, Optional[str], Dict[str, Optional[str]]]] = {}
+    for m in MEASUREMENTS:
+        if m.metric is None:
+            continue
+        label, value = m.metric_label or (None, None)
+        families.setdefault(m.metric[0], (m.metric[0], m.metric[1], label, {}))[3][m.name] = value
+    return tuple(families.values())
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Metrics
+
+import bisect
+import logging
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger("aurora_metrics")
+
+# Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Bus round trips and database batches: a few ms up to the timeouts
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# HTTP handlers; long-poll requests wait up to a minute
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0, 30.0, 60.0)
+
+
+def _escape(value: Any) -> str:
+    """Label value escaped for the exposition format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """{name="value",...}, or nothing without labels."""
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _format_value(value: float) -> str:
+    """Sample value as Prometheus writes it."""
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Value:
+    """One counter or gauge series."""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        """Add amount."""
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float):
+        """Replace the value."""
+        self.value = value
+
+
+class _Buckets:
+    """One histogram series: per-bucket counts, summed when rendered."""
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Record one value."""
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Metric:
+    """A metric family: one series per combination of label values.
+
+    Series are created on first use; labels() returns the same object for
+    the same values, so hot paths can keep a reference and skip the lookup.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """Initialize an empty family."""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        # Label values as passed to labels(), so repeated lookups skip the conversion
+        self._lookup: Dict[Tuple[Any, ...], Any] = {}
+        self._lock = threading.Lock()
+        # Unlabelled metrics are used directly
+        self._default = None if self.labelnames else self.labels()
+
+    def labels(self, *values) -> Any:
+        """The series for these label values, in labelnames order."""
+        series = self._lookup.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            key = tuple(str(value) for value in values)
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+                self._lookup[values] = series
+        return series
+
+    def _new_series(self) -> Any:
+        return _Value()
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """(suffix, labels, value) of every sample."""
+        for key, series in list(self._series.items()):
+            yield '', _format_labels(self.labelnames, key), series.value
+
+    def render(self) -> List[str]:
+        """Exposition lines of the family."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1):
+        """Add amount to the unlabelled series."""
+        self._default.inc(amount)
+
+
+class Gauge(Metric):
+    """A value that can go up and down."""
+
+    kind = 'gauge'
+
+    def set(self, value: float):
+        """Set the unlabelled series."""
+        self._default.set(value)
+
+
+class Histogram(Metric):
+    """Counts observations into cumulative buckets, with their sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        """Initialize a histogram with the given upper bucket bounds."""
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_series(self) -> Any:
+        return _Buckets(self.bounds)
+
+    def observe(self, value: float):
+        """Record a value in the unlabelled series."""
+        self._default.observe(value)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        for key, series in list(self._series.items()):
+            with series._lock:
+                counts, total = list(series.counts), series.sum
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ('le',), key + (_format_value(float(bound)),))
+                yield '_bucket', labels, cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield '_sum', labels, total
+            yield '_count', labels, cumulative
+
+
+class Registry:
+    """The metrics a process exports.
+
+    Instrumented code registers its families once at import time and
+    records into them directly. Values that already exist as state
+    elsewhere (latest readings, counters kept by other objects) are
+    gathered by collectors, called only when the registry is rendered.
+    """
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Metric]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a family and return it.
+
+        A module run as a script and imported again registers its families
+        twice: the second time returns the existing one.
+        """
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if (existing.kind, existing.labelnames) != (metric.kind, metric.labelnames):
+                    raise ValueError(f"Conflicting metric: {metric.name}")
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Register a counter."""
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Register a gauge."""
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        """Register a histogram."""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collect: Callable[[], Iterable[Metric]]):
+        """Call collect() on every render for families built from current state."""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def remove_collector(self, collect: Callable[[], Iterable[Metric]]):
+        """Stop calling a collector."""
+        with self._lock:
+            if collect in self._collectors:
+                self._collectors.remove(collect)
+
+    def render(self) -> str:
+        """All families in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for collect in collectors:
+            try:
+                metrics.extend(collect())
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {e}")
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by all modules of the process
+REGISTRY = Registry()
+
+
+def serve(port: int, host: str = '0.0.0.0', registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Serve registry on http://host:port/metrics from a background thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Serving metrics on {host}:{port}")
+    return server
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Multi-Inverter Polling Engine
+
+import asyncio
+import datetime
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aurora_connection import AuroraConnection
+from aurora_daylight import ACTIVE, ASLEEP, ActivityTracker, get_timezone
+from aurora_metrics import REGISTRY
+from aurora_schedule import MeasurementSchedule, measurement_intervals
+
+logger = logging.getLogger("aurora_poller")
+
+POLL_SECONDS = REGISTRY.histogram('aurora_poll_seconds', 'Duration of one poll window of an inverter',
+                                  ('inverter',))
+
+DEFAULT_INVERTER_ID = 'default'
+
+
+class InverterTarget:
+    """One inverter: the bridge it sits behind, its RS-485 address and its schedule."""
+
+    def __init__(self, inverter_id: str, host: str, port: int, address: int = 2,
+                 interval: float = 300, schedule: Optional[MeasurementSchedule] = None,
+                 activity: Optional[ActivityTracker] = None):
+        """Initialize a polling target; without a schedule every field follows interval."""
+        self.inverter_id = inverter_id
+        self.host = host
+        self.port = port
+        self.address = address
+        self.schedule = schedule or MeasurementSchedule(measurement_intervals(interval))
+        self.interval = self.schedule.interval
+        # Adapts the schedule to night and idle periods; None polls at a fixed rate
+        self.activity = activity
+        self.next_due = 0.0
+        self.readings = 0
+        self.failures = 0
+
+    def update(self, other: 'InverterTarget'):
+        """Take over the address, field intervals and activity settings of a reconfigured copy.
+
+        Latest values, counters and the inverter's activity state are kept,
+        so a configuration change doesn't cost a reading.
+        """
+        self.address = other.address
+        self.schedule.retime({entry.name: entry.interval for entry in other.schedule.entries},
+                             other.schedule.bus_budget)
+        self.interval = self.schedule.interval
+        if self.activity is not None and other.activity is not None:
+            other.activity.state = self.activity.state
+            other.activity.zero_readings = self.activity.zero_readings
+            other.activity.misses = self.activity.misses
+        self.activity = other.activity
+        if self.next_due and (self.activity is None or self.activity.state == ACTIVE):
+            # Planned with the old intervals
+            self.next_due = self.schedule.next_due()
+
+    @property
+    def bridge(self) -> Tuple[str, int]:
+        """The (host, port) of the EW11 bridge; targets sharing it share an RS-485 bus."""
+        return (self.host, self.port)
+
+    def __repr__(self):
+        return f"InverterTarget({self.inverter_id!r}, {self.host}:{self.port}, address={self.address})"
+
+
+def targets_from_config(config: Dict[str, Any]) -> List[InverterTarget]:
+    """Build polling targets from the configuration.
+
+    Uses the 'inverters' list when present, each entry with 'id', 'host',
+    'port', 'address' and optional 'polling_interval' and
+    'measurement_intervals'. Missing fields fall back to inverter_host/
+    inverter_port/polling_interval/measurement_intervals, so the classic
+    single-inverter configuration keeps working unchanged. With
+    adaptive_polling, each target gets an ActivityTracker using the site's
+    latitude/longitude (per entry or global) and timezone.
+    """
+    interval = config.get('polling_interval', 300)
+    bus_budget = float(config.get('bus_budget', 2.0))
+    tz = get_timezone(config.get('timezone'))
+    inverters = config.get('inverters') or [{'id': DEFAULT_INVERTER_ID}]
+
+    targets = []
+    for index, entry in enumerate(inverters):
+        overrides = dict(config.get('measurement_intervals') or {})
+        overrides.update(entry.get('measurement_intervals') or {})
+        intervals = measurement_intervals(float(entry.get('polling_interval', interval)), overrides)
+        inverter_id = str(entry.get('id', f"inverter{index + 1}"))
+        activity = None
+        if config.get('adaptive_polling', True):
+            latitude = entry.get('latitude', config.get('latitude'))
+            longitude = entry.get('longitude', config.get('longitude'))
+            activity = ActivityTracker(inverter_id,
+                                       None if latitude is None else float(latitude),
+                                       None if longitude is None else float(longitude),
+                                       tz, max_interval=float(config.get('idle_max_interval', 1800)))
+        targets.append(InverterTarget(
+            inverter_id,
+            entry.get('host', config.get('inverter_host')),
+            int(entry.get('port', config.get('inverter_port', 8899))),
+            int(entry.get('address', 2)),
+            schedule=MeasurementSchedule(intervals, bus_budget),
+            activity=activity
+        ))
+    return targets
+
+
+class PollingEngine:
+    """Polls many inverters: bridges concurrently, addresses on one bus one at a time.
+
+    Each bridge gets one AuroraConnection and one task. The task walks the
+    targets behind that bridge in due order, so requests on a shared RS-485
+    bus never overlap, while different bridges proceed in parallel.
+    reconfigure() swaps in new targets while polling goes on: only bridges
+    that appear or disappear are connected or closed.
+    """
+
+    def __init__(self, targets: List[InverterTarget],
+                 on_reading: Callable[[InverterTarget, Dict[str, Any]], None],
+                 timeout: int = 400, pipeline_depth: int = 1):
+        """Initialize the engine; on_reading(target, data) is called for every reading."""
+        self.targets = targets
+        self.on_reading = on_reading
+        self.timeout = timeout
+        self.pipeline_depth = pipeline_depth
+        self.connections: Dict[Tuple[str, int], AuroraConnection] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event = None
+        self._tasks: Dict[Tuple[str, int], asyncio.Task] = {}
+
+    def bridges(self) -> Dict[Tuple[str, int], List[InverterTarget]]:
+        """Group targets by bridge."""
+        groups: Dict[Tuple[str, int], List[InverterTarget]] = {}
+        for target in self.targets:
+            groups.setdefault(target.bridge, []).append(target)
+        return groups
+
+    async def run(self, stop_event):
+        """Poll until stop_event (a threading.Event or asyncio.Event) is set."""
+        self.loop = asyncio.get_running_loop()
+        self._stop_event = stop_event
+        for bridge in self.bridges():
+            self._start_bridge(bridge)
+
+        try:
+            while not stop_event.is_set():
+                # Bridges come and go with reconfigure(): wait on the current ones
+                done, _ = await asyncio.wait(list(self._tasks.values()), timeout=1.0,
+                                             return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    if not task.cancelled():
+                        task.result()
+            # Each bridge finishes its current poll
+            await asyncio.gather(*self._tasks.values())
+        finally:
+            tasks = list(self._tasks.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._tasks = {}
+            self.loop = None
+
+    def _start_bridge(self, bridge: Tuple[str, int]):
+        """Start the task polling the targets behind a bridge."""
+        self._tasks[bridge] = self.loop.create_task(self._run_bridge(bridge))
+
+    async def _run_bridge(self, bridge: Tuple[str, int]):
+        """Connect to a bridge and poll its targets until stopped or cancelled."""
+        connection = AuroraConnection(bridge[0], bridge[1], self.timeout,
+                                      probe_address=self.bridges()[bridge][0].address)
+        connection.client.pipeline_depth = self.pipeline_depth
+        try:
+            await connection.open()
+            self.connections[bridge] = connection
+            await self._poll_bridge(connection, bridge, self._stop_event)
+        finally:
+            if self.connections.get(bridge) is connection:
+                del self.connections[bridge]
+            await connection.close()
+
+    async def reconfigure(self, targets: List[InverterTarget], pipeline_depth: Optional[int] = None):
+        """Poll targets from now on, without interrupting the bridges that stay.
+
+        A target with the inverter id and bridge of a current one updates
+        that one in place (see InverterTarget.update), so it keeps its state
+        and connection. Bridges no target uses any more are closed, new
+        ones connected.
+        """
+        if not targets:
+            raise ValueError("No inverters to poll")
+        current = {target.inverter_id: target for target in self.targets}
+        merged = []
+        for target in targets:
+            existing = current.get(target.inverter_id)
+            if existing is not None and existing.bridge == target.bridge:
+                existing.update(target)
+                target = existing
+            merged.append(target)
+        self.targets = merged
+        if pipeline_depth is not None:
+            self.pipeline_depth = pipeline_depth
+            for connection in self.connections.values():
+                connection.client.pipeline_depth = pipeline_depth
+        if self.loop is None:
+            return
+
+        bridges = self.bridges()
+        for bridge in list(self._tasks):
+            if bridge not in bridges:
+                logger.info(f"Closing bridge {bridge[0]}:{bridge[1]}: no inverter left behind it")
+                self._tasks.pop(bridge).cancel()
+        for bridge, bridge_targets in bridges.items():
+            if bridge in self._tasks:
+                if bridge in self.connections:
+                    self.connections[bridge].probe_address = bridge_targets[0].address
+            else:
+                logger.info(f"Connecting to new bridge {bridge[0]}:{bridge[1]}")
+                self._start_bridge(bridge)
+
+    def reconfigure_threadsafe(self, targets: List[InverterTarget], pipeline_depth: Optional[int] = None,
+                               timeout: Optional[float] = 10):
+        """Run reconfigure() from another thread (e.g. a Flask handler) on the engine's loop."""
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            raise RuntimeError("Polling engine is not running")
+        asyncio.run_coroutine_threadsafe(self.reconfigure(targets, pipeline_depth), loop).result(timeout)
+
+    def connection_for(self, inverter_id: str) -> Optional[AuroraConnection]:
+        """Return the shared connection serving an inverter, for on-demand reads."""
+        for target in self.targets:
+            if target.inverter_id == inverter_id:
+                return self.connections.get(target.bridge)
+        return None
+
+    async def poll_target(self, connection: AuroraConnection, target: InverterTarget) -> bool:
+        """Read the due measurements of one inverter and hand the merged reading to on_reading."""
+        try:
+            started = time.perf_counter()
+            answered = await connection.request(target.schedule.read_window, target.address)
+            POLL_SECONDS.labels(target.inverter_id).observe(time.perf_counter() - started)
+            if not answered:
+                # Bridge is up but nothing on the bus answered
+                self._missed(target, f"Inverter {target.inverter_id} (address {target.address}) not responding")
+                return False
+
+            data = target.schedule.snapshot()
+            if target.activity is not None:
+                target.activity.update(True, data['power_output'])
+            data['inverter_id'] = target.inverter_id
+            data['timestamp'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            target.readings += 1
+            self.on_reading(target, data)
+            return True
+        except ConnectionError:
+            self._missed(target, f"Failed to connect to inverter {target.inverter_id}")
+        except Exception as e:
+            target.failures += 1
+            logger.error(f"Error polling inverter {target.inverter_id}: {e}")
+        return False
+
+    def _missed(self, target: InverterTarget, message: str):
+        """Count a poll without answer; only the first of a streak is logged as a warning."""
+        target.failures += 1
+        if target.activity is not None:
+            previous = target.activity.state
+            target.activity.update(False)
+            if previous == ASLEEP:
+                logger.debug(message)
+                return
+        logger.warning(message)
+
+    def _next_due(self, target: InverterTarget, polled: bool) -> float:
+        """Monotonic time of the target's next poll."""
+        if target.activity is not None and target.activity.state != ACTIVE:
+            return time.monotonic() + target.activity.delay(target.interval)
+        if polled:
+            # Each field keeps its own cadence; wake up for the earliest one
+            return target.schedule.next_due()
+        return time.monotonic() + target.interval
+
+    async def _poll_bridge(self, connection: AuroraConnection, bridge: Tuple[str, int], stop_event):
+        """Poll the targets behind one bridge, one request at a time."""
+        while not stop_event.is_set():
+            # Looked up every round: reconfigure() may have changed them
+            targets = [t for t in self.targets if t.bridge == bridge]
+            if not targets:
+                await asyncio.sleep(1.0)
+                continue
+            now = time.monotonic()
+            due = sorted((t for t in targets if t.next_due <= now), key=lambda t: t.next_due)
+            for target in due:
+                if stop_event.is_set():
+                    break
+                polled = await self.poll_target(connection, target)
+                target.next_due = self._next_due(target, polled)
+            # No keepalive traffic while every inverter on the bus sleeps
+            connection.paused = all(t.activity is not None and t.activity.state != ACTIVE for t in targets)
+
+            # Sleep until the next target is due, waking up regularly to notice stop requests
+            wait = min(t.next_due for t in targets) - time.monotonic()
+            await asyncio.sleep(min(max(wait, 0), 1.0))
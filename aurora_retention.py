@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Retention and Compaction
+
+import datetime
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from aurora_storage import ROLLUP_RESOLUTIONS, ReadingStore
+
+logger = logging.getLogger("aurora_retention")
+
+# Data kept per tier: raw readings, then each rollup resolution
+RETENTION_TIERS = ('raw',) + tuple(name for name, _, _ in ROLLUP_RESOLUTIONS)
+
+_BUCKETS = {name: (prefix, suffix) for name, prefix, suffix in ROLLUP_RESOLUTIONS}
+
+
+class Compactor:
+    """Deletes data past its retention and shrinks the database file.
+
+    retention maps a tier ('raw', 'minute', 'hour', 'day' or 'month') to the
+    number of days it is kept; tiers that are missing or 0 are kept forever.
+    Rollups are written together with the readings, so once raw readings
+    are deleted their history is still served from the rollups.
+
+    Rows are deleted oldest first, chunk_size at a time. Each chunk and each
+    incremental vacuum step is its own short transaction on the store's
+    writer, with a pause in between so batched writes from the poller never
+    wait for more than one chunk.
+    """
+
+    def __init__(self, store: ReadingStore, retention: Dict[str, float], interval: float = 3600,
+                 chunk_size: int = 2000, vacuum_pages: int = 512, pause: float = 0.05):
+        """Initialize the compactor; call start() to run it every interval seconds."""
+        self.store = store
+        self.retention = {}
+        for tier, days in (retention or {}).items():
+            if tier not in RETENTION_TIERS:
+                logger.warning(f"Ignoring retention for unknown tier {tier}")
+            elif days:
+                self.retention[tier] = float(days)
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.vacuum_pages = vacuum_pages
+        self.pause = pause
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Data older than the horizons may already be gone: keep history queries off it
+        self.store.horizons = self.cutoffs()
+
+    def cutoffs(self, now: Optional[datetime.datetime] = None) -> Dict[str, str]:
+        """Oldest timestamp kept in each tier with a retention, rounded down to the tier's bucket."""
+        now = now or datetime.datetime.now()
+        cutoffs = {}
+        for tier, days in self.retention.items():
+            cutoff = (now - datetime.timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+            if tier in _BUCKETS:
+                prefix, suffix = _BUCKETS[tier]
+                cutoff = cutoff[:prefix] + suffix
+            cutoffs[tier] = cutoff
+        return cutoffs
+
+    def run_once(self) -> Dict[str, Any]:
+        """Delete expired rows and vacuum freed pages; returns and logs a report of the run."""
+        begin = time.perf_counter()
+        busy = 0.0
+        before = self.store.space()
+        cutoffs = self.cutoffs()
+        self.store.horizons = cutoffs
+
+        deleted = {}
+        for tier, cutoff in cutoffs.items():
+            deleted[tier] = 0
+            while not self._stop.is_set():
+                started = time.perf_counter()
+                count = self.store.delete_oldest(tier, cutoff, self.chunk_size)
+                busy += time.perf_counter() - started
+                deleted[tier] += count
+                if count < self.chunk_size:
+                    # Caught up with the cutoff
+                    break
+                self._stop.wait(self.pause)
+
+        if before['auto_vacuum'] == 2:
+            while not self._stop.is_set():
+                started = time.perf_counter()
+                free = self.store.incremental_vacuum(self.vacuum_pages)
+                busy += time.perf_counter() - started
+                if free == 0:
+                    break
+                self._stop.wait(self.pause)
+        elif any(deleted.values()):
+            logger.info("Freed pages are reused but the file won't shrink: "
+                        "run 'python aurora_storage.py vacuum' once to enable incremental vacuum")
+
+        after = self.store.space()
+        page_size = after['page_size']
+        self.last_report = {
+            'deleted': deleted,
+            'reclaimed_bytes': (before['page_count'] - after['page_count']) * page_size,
+            'free_bytes': after['freelist_count'] * page_size,
+            'size_bytes': after['page_count'] * page_size,
+            'busy_seconds': round(busy, 3),
+            'elapsed_seconds': round(time.perf_counter() - begin, 3),
+        }
+        rows = ', '.join(f"{count} {tier}" for tier, count in deleted.items()) or 'nothing'
+        logger.info(f"Compaction deleted {rows} rows, reclaimed "
+                    f"{self.last_report['reclaimed_bytes'] / 1048576:.1f} MiB in {busy:.2f}s "
+                    f"({self.last_report['elapsed_seconds']:.1f}s elapsed), "
+                    f"database now {self.last_report['size_bytes'] / 1048576:.1f} MiB")
+        return self.last_report
+
+    def start(self, delay: float = 60):
+        """Run compaction in a background thread, first after delay seconds."""
+        if not self.retention:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(delay,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread, interrupting a run between chunks."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, delay: float):
+        """Background thread: compact every interval seconds."""
+        wait = delay
+        while not self._stop.wait(wait):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Error compacting database: {e}")
+            wait = self.interval
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Measurement Scheduler
+
+import time
+from typing import Any, Dict, List, Optional
+
+from aurora_client import AuroraClient, calculate_efficiency
+from aurora_measurements import MEASUREMENTS, Measurement
+
+# Fields are never read more often than this (seconds), whatever polling_interval says
+MIN_INTERVALS = {m.name: m.min_interval for m in MEASUREMENTS if m.min_interval}
+
+# Estimated seconds per request before any have been timed: two 10 byte
+# frames at 19200 baud plus the inverter's turnaround
+DEFAULT_COST = 0.05
+
+# A measurement due within this fraction of its interval rides along in the current window
+EARLY_FRACTION = 0.25
+
+
+class ScheduledMeasurement:
+    """A measurement with its own rate, due time, measured cost and latest value."""
+
+    def __init__(self, measurement: Measurement, interval: float):
+        """Initialize the schedule entry; it is due immediately."""
+        self.measurement = measurement
+        self.interval = interval
+        self.next_due = 0.0
+        self.cost = DEFAULT_COST
+        self.value: Optional[float] = None
+        # Wall-clock time of the latest value, for its age
+        self.read_at: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        return self.measurement.name
+
+
+def measurement_intervals(polling_interval: float, overrides: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """Seconds between reads of each field.
+
+    Every field defaults to polling_interval, raised to its MIN_INTERVALS
+    floor; overrides (field -> seconds) win over both.
+    """
+    intervals = {m.name: max(polling_interval, MIN_INTERVALS.get(m.name, 0)) for m in MEASUREMENTS}
+    for name, seconds in (overrides or {}).items():
+        if name not in intervals:
+            raise ValueError(f"Unknown measurement: {name}")
+        intervals[name] = float(seconds)
+    return intervals
+
+
+class MeasurementSchedule:
+    """Per-field polling rates for one inverter, packed into bus windows.
+
+    Each window reads the measurements that are due, most overdue first,
+    then fills up with ones that are nearly due so slow counters share a
+    window with the fast ones instead of waking the bus on their own. The
+    window stops at bus_budget seconds of estimated bus time (learned per
+    measurement from past requests); anything left over stays due and goes
+    first in the next window. Every window yields a full reading made of
+    the latest value of each field.
+    """
+
+    def __init__(self, intervals: Dict[str, float], bus_budget: float = 2.0):
+        """Initialize the schedule from field -> interval seconds."""
+        self.bus_budget = bus_budget
+        self.entries = [ScheduledMeasurement(m, intervals[m.name]) for m in MEASUREMENTS]
+        self.requests = 0
+
+    @property
+    def interval(self) -> float:
+        """Shortest field interval."""
+        return min(entry.interval for entry in self.entries)
+
+    def next_due(self) -> float:
+        """Monotonic time at which the next window is needed."""
+        return min(entry.next_due for entry in self.entries)
+
+    def retime(self, intervals: Dict[str, float], bus_budget: float):
+        """Switch to new field intervals, keeping the latest values and when each field was last due."""
+        self.bus_budget = bus_budget
+        for entry in self.entries:
+            interval = intervals[entry.name]
+            if entry.next_due:
+                entry.next_due += interval - entry.interval
+            entry.interval = interval
+
+    def plan(self, now: float) -> List[ScheduledMeasurement]:
+        """Pick the measurements to read in a window starting at now."""
+        due = [e for e in self.entries if e.next_due <= now]
+        early = [e for e in self.entries
+                 if now < e.next_due <= now + e.interval * EARLY_FRACTION]
+        due.sort(key=lambda e: (e.next_due - now) / max(e.interval, 0.001))
+        early.sort(key=lambda e: e.next_due)
+
+        window, spent = [], 0.0
+        for entry in due + early:
+            # The first request always goes, however slow the bus has been
+            if window and spent + entry.cost > self.bus_budget:
+                break
+            window.append(entry)
+            spent += entry.cost
+        return window
+
+    def record(self, entry: ScheduledMeasurement, value: float, elapsed: float, now: float):
+        """Store a value read in the window starting at now and schedule the field's next read."""
+        entry.value = value
+        entry.cost += (elapsed - entry.cost) * 0.2
+        # Keep the cadence from the planned slot unless we fell behind a full interval
+        planned = entry.next_due + entry.interval
+        entry.next_due = planned if planned > now else now + entry.interval
+        self.requests += 1
+
+    async def read_window(self, client: AuroraClient, address: int) -> int:
+        """Read one window of due measurements; returns how many were answered."""
+        # Scheduling from the window start keeps fields read together in step
+        window_start = time.monotonic()
+        entries = self.plan(window_start)
+        # One batch, so the client can pipeline it
+        responses = await client.send_commands([entry.measurement.request(address) for entry in entries])
+        elapsed = (time.monotonic() - window_start) / max(len(entries), 1)
+        read_at = time.time()
+
+        answered = 0
+        for entry, response in zip(entries, responses):
+            if not response:
+                # No answer: retry with the next regular window
+                entry.next_due = window_start + self.interval
+                continue
+            self.record(entry, entry.measurement.decode(response), elapsed, window_start)
+            entry.read_at = read_at
+            answered += 1
+        return answered
+
+    def read_times(self) -> Dict[str, float]:
+        """Wall-clock time each field was last read, for fields read at least once."""
+        return {entry.name: entry.read_at for entry in self.entries if entry.read_at is not None}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The latest value of every field, as stored by the web application.
+
+        Fields not answered yet are None (stored as NULL): a zero would pass
+        for a real reading, e.g. an energy counter reset to 0 after a restart.
+        """
+        data = {entry.name: entry.value for entry in self.entries}
+        inputs = [data['power_output'], data['voltage_1'], data['current_1'], data['voltage_2'], data['current_2']]
+        data['efficiency'] = calculate_efficiency(*inputs) if None not in inputs else None
+        return data
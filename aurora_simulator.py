@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Inverter Simulator
+# Fake EW11 bridge + inverter speaking the same frames as AuroraClient.send_command
+
+import argparse
+import asyncio
+import datetime
+import math
+import os
+import random
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from aurora_client import AuroraClient
+from aurora_daylight import sun_times
+from aurora_framing import checksum
+from aurora_measurements import BY_NAME
+
+# DSP params of registers AuroraClient has no constant for
+FREQUENCY = BY_NAME['grid_frequency'].param
+LEAKAGE_CURRENT = BY_NAME['leakage_current'].param
+ISOLATION_RESISTANCE = BY_NAME['isolation_resistance'].param
+
+
+def build_response(value: int, cumulated: bool = False) -> bytes:
+    """Build a 10 byte response frame carrying value."""
+    frame = bytearray(10)
+    frame[0] = 0  # Transmission state
+    frame[1] = 6  # Global state: run
+    if cumulated:
+        # 32-bit counter, word swapped as decoded by send_ce_command
+        frame[4] = (value >> 8) & 0xFF
+        frame[5] = value & 0xFF
+        frame[6] = (value >> 24) & 0xFF
+        frame[7] = (value >> 16) & 0xFF
+    else:
+        frame[6] = value & 0xFF
+        frame[7] = (value >> 8) & 0xFF
+    total = checksum(frame)
+    frame[8] = total & 0xFF
+    frame[9] = (total >> 8) & 0xFF
+    return bytes(frame)
+
+
+class PVModel:
+    """Synthetic PV inverter whose output follows the sun.
+
+    Power is a sine over the daylight hours of the given site, scaled by a
+    slowly drifting cloud factor; string voltages and currents, temperature
+    and grid voltage are derived from it, and the energy counters integrate
+    it and roll over at midnight/week/month/year. The DSP is off (the
+    inverter doesn't answer) between sunset and sunrise. time_scale speeds
+    up the simulated clock, e.g. 60 runs a day in 24 minutes.
+    """
+
+    def __init__(self, peak_power: float = 3000, latitude: float = 45.46, longitude: float = 9.19,
+                 time_scale: float = 1.0, start: Optional[datetime.datetime] = None,
+                 clouds: float = 0.3, seed: Optional[int] = None):
+        """Initialize the model at start (default: now)."""
+        self.peak_power = peak_power
+        self.latitude = latitude
+        self.longitude = longitude
+        self.time_scale = time_scale
+        self.clouds = clouds
+        self.random = random.Random(seed)
+        self.start = start or datetime.datetime.now().astimezone()
+        self.started = time.monotonic()
+        self.cloud_factor = 1.0
+        self.updated: Optional[datetime.datetime] = None
+        self.power = 0.0
+        self.peak_today = 0.0
+        # Wh: today, week, month, year, total
+        self.energy = [0.0, 0.0, 0.0, 0.0, 2500000.0 * peak_power / 3000]
+        # Wh of past days, as kept in the inverter's daily energy log
+        self.history: Dict[datetime.date, float] = {}
+        self._sun: Tuple[Optional[datetime.date], Optional[tuple]] = (None, None)
+
+    def now(self) -> datetime.datetime:
+        """Current simulated time."""
+        return self.start + datetime.timedelta(seconds=(time.monotonic() - self.started) * self.time_scale)
+
+    def sun(self, day: datetime.date) -> Optional[tuple]:
+        """Sunrise and sunset of day, cached."""
+        if self._sun[0] != day:
+            self._sun = (day, sun_times(day, self.latitude, self.longitude, self.start.tzinfo))
+        return self._sun[1]
+
+    def output(self, when: datetime.datetime) -> Optional[float]:
+        """Clear-sky AC power at when, or None while the sun is down."""
+        times = self.sun(when.date())
+        if times is None or not times[0] <= when <= times[1]:
+            return None
+        daylight = (times[1] - times[0]).total_seconds()
+        elevation = math.sin(math.pi * (when - times[0]).total_seconds() / daylight)
+        return self.peak_power * elevation ** 1.3
+
+    def update(self) -> bool:
+        """Advance the model to the current simulated time; False while asleep."""
+        when = self.now()
+        if self.updated is not None:
+            if when.date() != self.updated.date():
+                self.roll_over(self.updated.date(), when.date())
+            hours = (when - self.updated).total_seconds() / 3600
+            # Clouds drift slowly between (1 - clouds) and 1
+            step = self.random.gauss(0, 0.05) * min(hours * 4, 1) ** 0.5
+            self.cloud_factor = min(1.0, max(1 - self.clouds, self.cloud_factor + step))
+            for i in range(len(self.energy)):
+                self.energy[i] += self.power * hours
+        self.updated = when
+
+        clear_sky = self.output(when)
+        if clear_sky is None:
+            self.power = 0.0
+            return False
+        self.power = clear_sky * self.cloud_factor
+        self.peak_today = max(self.peak_today, self.power)
+        return True
+
+    def roll_over(self, previous: datetime.date, today: datetime.date):
+        """Reset the counters whose period ended."""
+        self.history[previous] = self.energy[0]
+        self.energy[0] = 0.0
+        self.peak_today = 0.0
+        if today.isocalendar()[:2] != previous.isocalendar()[:2]:
+            self.energy[1] = 0.0
+        if (today.year, today.month) != (previous.year, previous.month):
+            self.energy[2] = 0.0
+        if today.year != previous.year:
+            self.energy[3] = 0.0
+
+    def daily_energy(self, days_back: int) -> int:
+        """Logged Wh of the day days_back days ago; days before the model started get a plausible value."""
+        day = self.now().date() - datetime.timedelta(days=days_back)
+        if days_back == 0:
+            return int(self.energy[0])
+        if day in self.history:
+            return int(self.history[day])
+        times = sun_times(day, self.latitude, self.longitude, self.start.tzinfo)
+        if times is None:
+            return 0
+        hours = (times[1] - times[0]).total_seconds() / 3600
+        # Mean of the sine^1.3 curve is about 0.6 of its peak, minus some clouds
+        weather = 1 - self.clouds * random.Random(day.toordinal()).random()
+        return int(self.peak_power * hours * 0.6 * weather)
+
+    def registers(self) -> Optional[Tuple[Dict[int, int], Dict[int, int]]]:
+        """Raw (DSP, CE) register values, or None while the DSP is off."""
+        if not self.update():
+            return None
+        load = self.power / self.peak_power
+        voltage = 280 + 70 * min(1.0, load * 4)
+        # Two equal strings, 96% conversion efficiency
+        current = self.power / 0.96 / 2 / voltage
+        dsp = {
+            AuroraClient.DSP_GRID_VOLTS: int((230 + self.random.uniform(-2, 2)) * 10),
+            AuroraClient.DSP_OUTPUT_POWER: int(self.power),
+            AuroraClient.DSP_PEAK_TODAY: int(self.peak_today),
+            AuroraClient.DSP_TEMPERATURE_1: int((25 + 30 * load) * 10),
+            AuroraClient.DSP_TEMPERATURE_2: int((23 + 27 * load) * 10),
+            AuroraClient.DSP_VOLTAGE_1: int(voltage * 10),
+            AuroraClient.DSP_CURRENT_1: int(current * 100),
+            AuroraClient.DSP_VOLTAGE_2: int((voltage - 2) * 10),
+            AuroraClient.DSP_CURRENT_2: int(current * 100),
+            FREQUENCY: int((50 + self.random.uniform(-0.02, 0.02)) * 100),
+            LEAKAGE_CURRENT: int((0.005 + 0.02 * load) * 1000),
+            ISOLATION_RESISTANCE: 125,
+        }
+        ce = {0: int(self.energy[0]), 1: int(self.energy[1]), 3: int(self.energy[2]),
+              4: int(self.energy[3]), 5: int(self.energy[4])}
+        return dsp, ce
+
+
+class AuroraSimulator:
+    """Asyncio TCP server answering DSP (59), cumulated energy (78) and daily energy log (76) requests."""
+
+    # Raw register values, scaled the way send_dsp_command expects
+    DSP_VALUES = {
+        AuroraClient.DSP_GRID_VOLTS: 2312,     # 231.2 V
+        AuroraClient.DSP_OUTPUT_POWER: 2450,   # W
+        AuroraClient.DSP_PEAK_TODAY: 3120,     # W
+        AuroraClient.DSP_TEMPERATURE_1: 412,   # 41.2 °C
+        AuroraClient.DSP_TEMPERATURE_2: 388,   # 38.8 °C
+        AuroraClient.DSP_VOLTAGE_1: 3405,      # 340.5 V
+        AuroraClient.DSP_CURRENT_1: 385,       # 3.85 A
+        AuroraClient.DSP_VOLTAGE_2: 3380,      # 338.0 V
+        AuroraClient.DSP_CURRENT_2: 372,       # 3.72 A
+        FREQUENCY: 5001,                       # 50.01 Hz
+        LEAKAGE_CURRENT: 12,                   # 0.012 A
+        ISOLATION_RESISTANCE: 125,             # 12.5 MΩ
+    }
+    CE_VALUES = {0: 12450, 1: 84210, 3: 312400, 4: 2810300, 5: 45210900}  # Wh
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 connect_latency: float = 0.0, response_latency: float = 0.0,
+                 addresses: Optional[Iterable[int]] = None, link_latency: float = 0.0,
+                 fragment: int = 0, noise: float = 0.0, jitter: float = 0.0, loss: float = 0.0,
+                 pv: bool = False, **pv_options):
+        """Initialize the simulator; port 0 picks a free port.
+
+        addresses lists the RS-485 addresses of the inverters on the bus behind
+        this bridge; requests for other addresses go unanswered. None answers
+        every address. response_latency is serial bus time per request (one
+        request at a time), link_latency the WiFi round trip added to every
+        reply (overlapping when requests are pipelined). fragment splits
+        replies into TCP segments of at most that many bytes, and noise is
+        the probability of a few garbage bytes before a reply. jitter adds up
+        to that many seconds to the bus time and loss is the probability a
+        request goes unanswered. With pv, every address gets its own PVModel
+        (pv_options are passed on) instead of the fixed DSP_VALUES/CE_VALUES.
+        """
+        self.host = host
+        self.port = port
+        self.connect_latency = connect_latency
+        self.response_latency = response_latency
+        self.addresses = set(addresses) if addresses is not None else None
+        self.link_latency = link_latency
+        self.fragment = fragment
+        self.noise = noise
+        self.jitter = jitter
+        self.loss = loss
+        self.pv = pv
+        self.pv_options = pv_options
+        self.models: Dict[int, PVModel] = {}
+        self.connections = 0
+        self.requests = 0
+        self.server: Optional[asyncio.base_events.Server] = None
+        self.writers = set()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._bus: Optional[asyncio.Lock] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def model(self, address: int) -> PVModel:
+        """The PV model of the inverter at address; sizes differ a little per address."""
+        if address not in self.models:
+            options = dict(self.pv_options)
+            options.setdefault('peak_power', 3000)
+            options['peak_power'] *= 1 + 0.1 * (address % 5 - 2)
+            options.setdefault('seed', address)
+            self.models[address] = PVModel(**options)
+        return self.models[address]
+
+    def answer(self, request: bytes) -> Optional[bytes]:
+        """Return the response frame for a request frame, or None to stay silent."""
+        if checksum(request) != request[8] + (request[9] << 8):
+            return None
+        if self.addresses is not None and request[0] not in self.addresses:
+            return None
+        if self.loss and random.random() < self.loss:
+            return None
+
+        command, param = request[1], request[2]
+        if self.pv:
+            registers = self.model(request[0]).registers()
+            if registers is None:
+                # Night: the DSP is off
+                return None
+            dsp_values, ce_values = registers
+        else:
+            dsp_values, ce_values = self.DSP_VALUES, self.CE_VALUES
+
+        if command == AuroraClient.CMD_GET_DSP:
+            return build_response(dsp_values.get(param, 0))
+        if command == AuroraClient.CMD_GET_CE:
+            return build_response(ce_values.get(param, 0), cumulated=True)
+        if command == AuroraClient.CMD_GET_DAILY_ENERGY:
+            days_back = param + (request[3] << 8)
+            if days_back > 365:
+                return None
+            if self.pv:
+                return build_response(self.model(request[0]).daily_energy(days_back), cumulated=True)
+            # Fixed mode: a repeating pattern around today's CE_VALUES
+            return build_response(self.CE_VALUES[0] + 700 * (days_back % 7), cumulated=True)
+        return None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one client connection."""
+        self.connections += 1
+        self.writers.add(writer)
+        outgoing: asyncio.Queue = asyncio.Queue()
+        sender = asyncio.ensure_future(self._send(writer, outgoing))
+        try:
+            # The EW11 needs a while to set up a new TCP session over WiFi
+            if self.connect_latency:
+                await asyncio.sleep(self.connect_latency)
+            while True:
+                request = await reader.readexactly(10)
+                self.requests += 1
+                # One serial line behind the bridge: requests take turns on the bus
+                async with self._bus:
+                    response = self.answer(request)
+                    if response is None:
+                        continue
+                    latency = self.response_latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+                    if latency:
+                        await asyncio.sleep(latency)
+                if self.noise and random.random() < self.noise:
+                    response = os.urandom(random.randint(1, 5)) + response
+                outgoing.put_nowait((time.monotonic() + self.link_latency, response))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            sender.cancel()
+            self.writers.discard(writer)
+            writer.close()
+
+    async def _send(self, writer: asyncio.StreamWriter, outgoing: asyncio.Queue):
+        """Deliver replies after the link latency, fragmented if configured."""
+        try:
+            while True:
+                due, response = await outgoing.get()
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if not self.fragment:
+                    writer.write(response)
+                    await writer.drain()
+                    continue
+                while response:
+                    size = random.randint(1, self.fragment)
+                    writer.write(response[:size])
+                    await writer.drain()
+                    response = response[size:]
+                    # Let the segment go out on its own
+                    await asyncio.sleep(0.0005)
+        except ConnectionError:
+            pass
+
+    async def start(self):
+        """Start listening; updates self.port when a free port was requested."""
+        self._bus = asyncio.Lock()
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Stop listening."""
+        if self.server:
+            self.server.close()
+            # Drop open client sessions so their handlers finish cleanly
+            for writer in list(self.writers):
+                writer.close()
+            await self.server.wait_closed()
+            await asyncio.sleep(0)
+            self.server = None
+
+    def start_in_thread(self):
+        """Run the simulator on its own event loop in a daemon thread."""
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.start())
+            started.set()
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop_thread(self):
+        """Stop a simulator started with start_in_thread()."""
+        if self.loop and self._thread:
+            asyncio.run_coroutine_threadsafe(self.stop(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self.loop.close()
+            self._thread = None
+
+
+async def main():
+    """Run the simulator until interrupted."""
+    parser = argparse.ArgumentParser(description="Aurora inverter simulator")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8899)
+    parser.add_argument('--connect-latency', type=float, default=0.0,
+                        help="seconds before a new connection is served")
+    parser.add_argument('--response-latency', type=float, default=0.0,
+                        help="seconds before each response is sent")
+    parser.add_argument('--addresses', type=int, nargs='+',
+                        help="RS-485 addresses on the simulated bus (default: answer all)")
+    parser.add_argument('--link-latency', type=float, default=0.0,
+                        help="WiFi round trip in seconds added to every reply")
+    parser.add_argument('--fragment', type=int, default=0,
+                        help="split replies into TCP segments of at most this many bytes")
+    parser.add_argument('--noise', type=float, default=0.0,
+                        help="probability of garbage bytes before a reply")
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help="up to this many seconds added to each response latency")
+    parser.add_argument('--loss', type=float, default=0.0,
+                        help="probability that a request goes unanswered")
+    parser.add_argument('--static', action='store_true',
+                        help="answer fixed values instead of following a daily PV curve")
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help="simulated seconds per real second")
+    parser.add_argument('--latitude', type=float, default=45.46)
+    parser.add_argument('--longitude', type=float, default=9.19)
+    parser.add_argument('--peak-power', type=float, default=3000, help="W")
+    args = parser.parse_args()
+
+    pv_options = {}
+    if not args.static:
+        pv_options = dict(time_scale=args.time_scale, latitude=args.latitude, longitude=args.longitude,
+                          peak_power=args.peak_power)
+    simulator = AuroraSimulator(args.host, args.port, args.connect_latency, args.response_latency,
+                                args.addresses, args.link_latency, args.fragment, args.noise,
+                                args.jitter, args.loss, not args.static, **pv_options)
+    await simulator.start()
+    print(f"Aurora simulator listening on {simulator.host}:{simulator.port}")
+    await simulator.server.serve_forever()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Shared Snapshot
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger("aurora_snapshot")
+
+
+class SnapshotWriter:
+    """Publishes the collector's latest state to a file for web workers.
+
+    Each publish writes the whole state to a temporary file and renames it
+    over the previous one, so readers always see a complete snapshot
+    without any locking between processes.
+    """
+
+    def __init__(self, path: str):
+        """Initialize the writer; the directory must exist."""
+        self.path = path
+        # Starts from the clock so versions keep increasing across collector restarts
+        self.version = int(time.time() * 1000)
+        self._lock = threading.Lock()
+
+    def publish(self, state: Dict[str, Any]):
+        """Write state with the next version number."""
+        with self._lock:
+            self.version += 1
+            data = json.dumps(dict(state, version=self.version))
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)),
+                                             prefix='.snapshot-')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(data)
+                os.replace(temp_path, self.path)
+            except OSError:
+                os.unlink(temp_path)
+                raise
+
+    def remove(self):
+        """Delete the snapshot, so readers don't serve a stopped collector's state."""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class SnapshotReader:
+    """Follows the snapshot file written by a SnapshotWriter in another process.
+
+    read() only parses the file again when its inode, size or modification
+    time changed, so it is cheap enough to call on every request. watch()
+    checks it from a background thread and calls back with each new state.
+    """
+
+    def __init__(self, path: str):
+        """Initialize the reader; the file doesn't have to exist yet."""
+        self.path = path
+        self.state: Dict[str, Any] = {}
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def read(self) -> Dict[str, Any]:
+        """The latest state, or {} if nothing was published yet."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self.state
+        stamp = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if stamp != self._stamp:
+                try:
+                    with open(self.path) as f:
+                        self.state = json.load(f)
+                    self._stamp = stamp
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Could not read snapshot {self.path}: {e}")
+            return self.state
+
+    def watch(self, callback: Callable[[Dict[str, Any]], None], interval: float = 0.5):
+        """Call callback(state) from a background thread whenever a new version appears."""
+        def run():
+            version = None
+            while not self._stop.wait(interval):
+                state = self.read()
+                if state and state.get('version') != version:
+                    version = state.get('version')
+                    try:
+                        callback(state)
+                    except Exception as e:
+                        logger.error(f"Error handling snapshot: {e}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Write-Ahead Spool
+
+import logging
+import os
+import struct
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("aurora_spool")
+
+# Record header: payload length, big-endian
+HEADER = struct.Struct('>I')
+
+# (segment number, byte offset): positions compare in write order
+Position = Tuple[int, int]
+
+
+class Spool:
+    """Append-only log of length-prefixed records in numbered segment files.
+
+    Writers append records and get their position back; whoever consumes
+    them records the position it got to and calls discard() with it, which
+    deletes the segments entirely before it. A new segment is started once
+    the current one passes segment_size, so discarding keeps the spool
+    small. A record cut short by a crash ends its segment: reading skips
+    the rest, and appends after a restart always go to a new segment.
+    """
+
+    def __init__(self, directory: str, segment_size: int = 4 * 1024 * 1024, fsync: bool = False):
+        """Initialize the spool; call open() before appending. fsync also survives power loss."""
+        self.directory = directory
+        self.segment_size = segment_size
+        self.fsync = fsync
+        self.segment = 0
+        self.offset = 0
+        self._file = None
+        self._broken = False
+        self._lock = threading.Lock()
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:010d}.log")
+
+    def segments(self) -> List[int]:
+        """Numbers of the segment files on disk, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(int(name[:-4]) for name in os.listdir(self.directory)
+                      if name.endswith('.log') and name[:-4].isdigit())
+
+    def records(self, after: Position, until: Optional[Position] = None) -> Iterator[Tuple[bytes, Position]]:
+        """Yield (payload, end position) of the records after a position, up to until."""
+        for segment in self.segments():
+            if segment < after[0] or (until is not None and segment > until[0]):
+                continue
+            offset = after[1] if segment == after[0] else 0
+            end = until[1] if until is not None and segment == until[0] else None
+            with open(self._path(segment), 'rb') as f:
+                f.seek(offset)
+                while end is None or offset < end:
+                    header = f.read(HEADER.size)
+                    if len(header) < HEADER.size:
+                        break
+                    payload = f.read(HEADER.unpack(header)[0])
+                    if len(payload) < HEADER.unpack(header)[0]:
+                        logger.warning(f"Skipping a torn record at the end of spool segment {segment}")
+                        break
+                    offset += HEADER.size + len(payload)
+                    yield payload, (segment, offset)
+
+    def open(self):
+        """Start appending to a new segment after the existing ones."""
+        os.makedirs(self.directory, exist_ok=True)
+        existing = self.segments()
+        self._start(existing[-1] + 1 if existing else 1)
+
+    def _start(self, segment: int):
+        """Switch appends to a new segment file."""
+        if self._file:
+            self._file.close()
+        self.segment, self.offset = segment, 0
+        self._file = open(self._path(segment), 'ab')
+
+    @property
+    def position(self) -> Position:
+        """Position after the last appended record."""
+        return (self.segment, self.offset)
+
+    def append(self, payload: bytes) -> Tuple[Position, Position]:
+        """Write a record; returns its start and end positions."""
+        with self._lock:
+            if self.offset >= self.segment_size or self._broken:
+                self._broken = False
+                self._start(self.segment + 1)
+            start = (self.segment, self.offset)
+            try:
+                self._file.write(HEADER.pack(len(payload)) + payload)
+                # Into the OS buffers: survives a crash of the process
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+            except OSError:
+                # Part of the record may be on disk: end the segment there
+                self._broken = True
+                raise
+            self.offset += HEADER.size + len(payload)
+            return start, (self.segment, self.offset)
+
+    def discard(self, position: Position):
+        """Delete the segments wholly before position, once everything up to it is stored elsewhere."""
+        for segment in self.segments():
+            if segment >= position[0] or segment == self.segment:
+                break
+            try:
+                os.unlink(self._path(segment))
+            except FileNotFoundError:
+                pass
+        if position == self.position and self.offset >= self.segment_size:
+            # Fully consumed: don't wait for the next append to move on
+            with self._lock:
+                if position == self.position:
+                    self._start(self.segment + 1)
+                    os.unlink(self._path(position[0]))
+
+    def size(self) -> int:
+        """Bytes on disk."""
+        total = 0
+        for segment in self.segments():
+            try:
+                total += os.path.getsize(self._path(segment))
+            except FileNotFoundError:
+                pass
+        return total
+
+    def close(self):
+        """Close the current segment."""
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,1074 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Storage Layer
+
+import argparse
+import collections
+import contextlib
+import datetime
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import urllib.request
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aurora_measurements import MEASUREMENTS
+from aurora_metrics import REGISTRY
+from aurora_spool import Position, Spool
+
+logger = logging.getLogger("aurora_storage")
+
+FLUSH_SECONDS = REGISTRY.histogram('aurora_db_flush_seconds',
+                                   'Insert and commit of one batch of readings and their rollups')
+FLUSH_ERRORS = REGISTRY.counter('aurora_db_flush_errors_total',
+                                'Batches of readings the database failed to store; they are retried')
+# Handing a reading over never waits for the database: microseconds
+ADD_SECONDS = REGISTRY.histogram('aurora_store_add_seconds', 'Time the poller spends queueing one reading',
+                                 buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                                          0.001, 0.0025, 0.01, 0.1))
+DROPPED_READINGS = REGISTRY.counter('aurora_readings_dropped_total',
+                                    'Readings lost because the queue was full and the spool not writable')
+
+# Readings read back from the spool per transaction, when catching up or replaying
+SPOOL_BATCH = 1000
+
+# Value columns of the readings table, in insert order: every registered measurement,
+# with efficiency (calculated, not read) where it has always been
+_MEASURED = tuple(m.name for m in MEASUREMENTS)
+READING_FIELDS = (_MEASURED[:_MEASURED.index('peak_today')] + ('efficiency',)
+                  + _MEASURED[_MEASURED.index('peak_today'):])
+# Every column of a reading, as exported
+READING_COLUMNS = ('inverter_id', 'timestamp') + READING_FIELDS
+
+INSERT_READING = '''
+INSERT INTO readings (inverter_id, timestamp, {columns})
+VALUES (?, ?, {placeholders})
+'''.format(columns=', '.join(READING_FIELDS),
+           placeholders=', '.join('?' for _ in READING_FIELDS))
+
+# Applied to every connection. WAL lets readers run alongside the writer and,
+# with synchronous=NORMAL, commits no longer fsync (only checkpoints do).
+CONNECTION_PRAGMAS = (
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -8000',  # 8 MB
+)
+WRITER_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA wal_autocheckpoint = 1000',
+)
+
+
+# Rollup resolutions, finest first: name, timestamp prefix length, suffix.
+# A bucket is the bucket's start time, e.g. '2024-06-01 13:00:00' for the hour.
+ROLLUP_RESOLUTIONS = (
+    ('minute', 16, ':00'),
+    ('hour', 13, ':00:00'),
+    ('day', 10, ' 00:00:00'),
+    ('month', 7, '-01 00:00:00'),
+)
+
+# Fields averaged in rollups (stored as sums, divided by samples on read)
+ROLLUP_SUM_FIELDS = (
+    'power_output', 'voltage_1', 'current_1', 'voltage_2', 'current_2',
+    'temperature', 'grid_voltage', 'efficiency'
+)
+
+ROLLUP_COLUMNS = (
+    ('resolution', 'inverter_id', 'bucket', 'samples')
+    + tuple(f'{field}_sum' for field in ROLLUP_SUM_FIELDS)
+    + ('power_min', 'power_max', 'temperature_max', 'energy_first', 'energy_last', 'energy_today_max')
+)
+
+# Merge a partial aggregate into the stored one. Scalar MIN()/MAX() return NULL
+# if either side is, so a side that is NULL (a field not read yet) is ignored.
+UPSERT_ROLLUP = '''
+INSERT INTO rollups ({columns}) VALUES ({placeholders})
+ON CONFLICT (resolution, inverter_id, bucket) DO UPDATE SET
+    samples = samples + excluded.samples,
+    {sums},
+    power_min = MIN(ifnull(power_min, excluded.power_min), ifnull(excluded.power_min, power_min)),
+    power_max = MAX(ifnull(power_max, excluded.power_max), ifnull(excluded.power_max, power_max)),
+    temperature_max = MAX(ifnull(temperature_max, excluded.temperature_max),
+                          ifnull(excluded.temperature_max, temperature_max)),
+    energy_first = MIN(ifnull(energy_first, excluded.energy_first), ifnull(excluded.energy_first, energy_first)),
+    energy_last = MAX(ifnull(energy_last, excluded.energy_last), ifnull(excluded.energy_last, energy_last)),
+    energy_today_max = MAX(ifnull(energy_today_max, excluded.energy_today_max),
+                           ifnull(excluded.energy_today_max, energy_today_max))
+'''.format(columns=', '.join(ROLLUP_COLUMNS),
+           placeholders=', '.join('?' for _ in ROLLUP_COLUMNS),
+           sums=',\n    '.join(f'{field}_sum = {field}_sum + excluded.{field}_sum'
+                               for field in ROLLUP_SUM_FIELDS))
+
+_FIELD_INDEX = {field: index + 2 for index, field in enumerate(READING_FIELDS)}
+_SUM_INDEXES = tuple(_FIELD_INDEX[field] for field in ROLLUP_SUM_FIELDS)
+_POWER, _TEMPERATURE, _ENERGY, _ENERGY_TODAY = (_FIELD_INDEX['power_output'], _FIELD_INDEX['temperature'],
+                                                _FIELD_INDEX['energy_total'], _FIELD_INDEX['energy_today'])
+
+
+def _least(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    """The smaller of two values, ignoring None as SQL's MIN() ignores NULL."""
+    return b if a is None else a if b is None or a <= b else b
+
+
+def _greatest(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    """The larger of two values, ignoring None as SQL's MAX() ignores NULL."""
+    return b if a is None else a if b is None or a >= b else b
+
+
+def rollup_rows(rows: List[tuple]) -> List[tuple]:
+    """Aggregate reading rows (as built by reading_row) into UPSERT_ROLLUP parameters.
+
+    A batch usually falls into one hour, day and month, so aggregating here
+    first turns most of the upserts into a single row per resolution.
+    Fields not read yet (None) add nothing to sums, minimums or maximums,
+    and neither does an energy_total of 0: the counter never goes back to
+    zero, so the first and last energy of a bucket only take real counts.
+    """
+    aggregates: Dict[tuple, list] = {}
+    for row in rows:
+        inverter_id, timestamp = row[0], row[1]
+        energy = row[_ENERGY] or None
+        for resolution, prefix, suffix in ROLLUP_RESOLUTIONS:
+            key = (resolution, inverter_id, timestamp[:prefix] + suffix)
+            aggregate = aggregates.get(key)
+            if aggregate is None:
+                aggregates[key] = [1] + [row[i] or 0.0 for i in _SUM_INDEXES] + [
+                    row[_POWER], row[_POWER], row[_TEMPERATURE], energy, energy, row[_ENERGY_TODAY]]
+                continue
+            aggregate[0] += 1
+            for offset, i in enumerate(_SUM_INDEXES, start=1):
+                aggregate[offset] += row[i] or 0.0
+            aggregate[-6] = _least(aggregate[-6], row[_POWER])
+            aggregate[-5] = _greatest(aggregate[-5], row[_POWER])
+            aggregate[-4] = _greatest(aggregate[-4], row[_TEMPERATURE])
+            aggregate[-3] = _least(aggregate[-3], energy)
+            aggregate[-2] = _greatest(aggregate[-2], energy)
+            aggregate[-1] = _greatest(aggregate[-1], row[_ENERGY_TODAY])
+    return [key + tuple(aggregate) for key, aggregate in aggregates.items()]
+
+
+def rebuild_rollups(cursor: sqlite3.Cursor):
+    """Recompute every rollup from the raw readings.
+
+    Only the finest resolution scans readings; each coarser one is
+    aggregated from the resolution before it, which is far fewer rows.
+    """
+    cursor.execute('DELETE FROM rollups')
+    columns = ', '.join(ROLLUP_COLUMNS)
+    previous = None
+    for resolution, prefix, suffix in ROLLUP_RESOLUTIONS:
+        if previous is None:
+            sums = ', '.join(f'TOTAL({field})' for field in ROLLUP_SUM_FIELDS)
+            cursor.execute(f'''
+            INSERT INTO rollups ({columns})
+            SELECT ?, inverter_id, substr(timestamp, 1, {prefix}) || ?, COUNT(*), {sums},
+                   MIN(power_output), MAX(power_output), MAX(temperature),
+                   MIN(NULLIF(energy_total, 0)), MAX(NULLIF(energy_total, 0)), MAX(energy_today)
+            FROM readings
+            GROUP BY inverter_id, substr(timestamp, 1, {prefix})
+            ''', (resolution, suffix))
+        else:
+            sums = ', '.join(f'TOTAL({field}_sum)' for field in ROLLUP_SUM_FIELDS)
+            cursor.execute(f'''
+            INSERT INTO rollups ({columns})
+            SELECT ?, inverter_id, substr(bucket, 1, {prefix}) || ?, SUM(samples), {sums},
+                   MIN(power_min), MAX(power_max), MAX(temperature_max),
+                   MIN(energy_first), MAX(energy_last), MAX(energy_today_max)
+            FROM rollups
+            WHERE resolution = ?
+            GROUP BY inverter_id, substr(bucket, 1, {prefix})
+            ''', (resolution, suffix, previous))
+        previous = resolution
+
+
+def _schema_v1(cursor: sqlite3.Cursor):
+    """Version 1: readings table keyed by inverter_id."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS readings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        inverter_id TEXT NOT NULL DEFAULT 'default',
+        timestamp TEXT NOT NULL,
+        power_output REAL,
+        voltage_1 REAL,
+        current_1 REAL,
+        voltage_2 REAL,
+        current_2 REAL,
+        temperature REAL,
+        grid_voltage REAL,
+        efficiency REAL,
+        peak_today REAL,
+        energy_today REAL,
+        energy_week REAL,
+        energy_month REAL,
+        energy_year REAL,
+        energy_total REAL
+    )
+    ''')
+
+    # Databases created before multi-inverter support have no inverter_id
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(readings)')]
+    if 'inverter_id' not in columns:
+        logger.info("Adding inverter_id column to readings")
+        cursor.execute("ALTER TABLE readings ADD COLUMN inverter_id TEXT NOT NULL DEFAULT 'default'")
+
+
+def _schema_v2(cursor: sqlite3.Cursor):
+    """Version 2: time indexes, so range queries stop scanning and sorting the whole table.
+
+    Timestamps stay ISO 8601 text ('YYYY-MM-DD HH:MM:SS'), which sorts
+    chronologically, so the index serves both the range and the ORDER BY.
+    """
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_readings_timestamp ON readings (timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_readings_inverter_timestamp ON readings (inverter_id, timestamp)')
+    cursor.execute('ANALYZE readings')
+
+
+def _schema_v3(cursor: sqlite3.Cursor):
+    """Version 3: pre-aggregated rollups, filled from the existing readings."""
+    sums = ',\n        '.join(f'{field}_sum REAL' for field in ROLLUP_SUM_FIELDS)
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS rollups (
+        resolution TEXT NOT NULL,
+        inverter_id TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        samples INTEGER NOT NULL,
+        {sums},
+        power_min REAL,
+        power_max REAL,
+        temperature_max REAL,
+        energy_first REAL,
+        energy_last REAL,
+        energy_today_max REAL,
+        PRIMARY KEY (resolution, inverter_id, bucket)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_rollups_bucket ON rollups (resolution, bucket)')
+    rebuild_rollups(cursor)
+
+
+def _schema_v4(cursor: sqlite3.Cursor):
+    """Version 4: daily energy read back from the inverters' logs, for days the readings miss."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS daily_energy (
+        inverter_id TEXT NOT NULL,
+        day TEXT NOT NULL,
+        energy REAL NOT NULL,
+        PRIMARY KEY (inverter_id, day)
+    ) WITHOUT ROWID
+    ''')
+
+
+def _schema_v5(cursor: sqlite3.Cursor):
+    """Version 5: position up to which the write-ahead spool is stored, committed with each batch."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS spool_position (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        segment INTEGER NOT NULL,
+        byte_offset INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO spool_position VALUES (0, 0, 0)')
+
+
+def _schema_v6(cursor: sqlite3.Cursor):
+    """Version 6: the compact view no longer turns the efficiency of a partial reading into 0."""
+    if is_compact(cursor.connection):
+        # Dropping the view drops its trigger; both are created again
+        cursor.execute('DROP VIEW readings')
+        _compact_views(cursor)
+
+
+def _schema_v7(cursor: sqlite3.Cursor):
+    """Version 7: rollups no longer count from an energy_total of 0; rebuilt where they did."""
+    if cursor.execute('SELECT 1 FROM rollups WHERE energy_first = 0 LIMIT 1').fetchone():
+        logger.info("Rebuilding rollups that count energy from a zero counter")
+        rebuild_rollups(cursor)
+
+
+def _schema_v8(cursor: sqlite3.Cursor):
+    """Version 8: highest daily energy counter per rollup, the energy of a day however late monitoring began."""
+    # Created by version 3 in databases that start out at this version
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(rollups)')]
+    if 'energy_today_max' not in columns:
+        cursor.execute('ALTER TABLE rollups ADD COLUMN energy_today_max REAL')
+        rebuild_rollups(cursor)
+
+
+# Schema upgrades, in order; the database's user_version records how many were applied
+MIGRATIONS = (_schema_v1, _schema_v2, _schema_v3, _schema_v4, _schema_v5, _schema_v6, _schema_v7, _schema_v8)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+# Partial counters derived from energy_total and the day's baselines: the
+# total minus the counter, fixed by the first reading of the day where it runs
+COMPACT_COUNTERS = ('energy_week', 'energy_month', 'energy_year')
+
+# Compact format: fields stored as the integers the inverter sends, divided by these on read
+COMPACT_SCALES = tuple((m.name, m.factor) for m in MEASUREMENTS if m.name not in COMPACT_COUNTERS)
+
+# Readings as local wall-clock seconds since the epoch, like julianday() on the text timestamps
+_LOCAL_EPOCH = "CAST(round((julianday({}) - 2440587.5) * 86400) AS INTEGER)"
+
+
+def _compact_schema(cursor: sqlite3.Cursor):
+    """Compact format: integer samples behind a readings view that decodes them.
+
+    samples holds one row of scaled integers per reading, keyed by the epoch
+    second, so SQLite stores most values in one or two bytes and the primary
+    key doubles as the time index. efficiency is computed from the other
+    fields and the week/month/year counters from energy_total and one
+    baseline row per day. The view looks like the readings table to every
+    query, and inserts into it are encoded by a trigger. Range queries must
+    filter on its ts column (see readings_query) to use the key.
+    """
+    cursor.execute('CREATE TABLE inverters (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)')
+    values = ',\n        '.join(f'{field} INTEGER' for field, _ in COMPACT_SCALES)
+    cursor.execute(f'''
+    CREATE TABLE samples (
+        ts INTEGER NOT NULL,
+        inverter INTEGER NOT NULL,
+        {values},
+        PRIMARY KEY (ts, inverter)
+    ) WITHOUT ROWID
+    ''')
+    baselines = ',\n        '.join(f'{field} INTEGER' for field in COMPACT_COUNTERS)
+    cursor.execute(f'''
+    CREATE TABLE counter_baselines (
+        inverter INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        {baselines},
+        PRIMARY KEY (inverter, day)
+    ) WITHOUT ROWID
+    ''')
+    _compact_views(cursor)
+    _schema_v3(cursor)
+    _schema_v4(cursor)
+    _schema_v5(cursor)
+
+
+def _compact_views(cursor: sqlite3.Cursor):
+    """The readings view of the compact format and the trigger encoding inserts into it."""
+    decoded = {field: f's.{field} / {float(scale)}' if scale != 1 else f's.{field}'
+               for field, scale in COMPACT_SCALES}
+    dc = 's.voltage_1 * s.current_1 + s.voltage_2 * s.current_2'
+    # NULL, like the reading, until every field it needs has been read
+    decoded['efficiency'] = (f'CASE WHEN {dc} > 0 THEN s.power_output * 100000.0 / ({dc}) '
+                             f'WHEN {dc} <= 0 AND s.power_output IS NOT NULL THEN 0 END')
+    for field in COMPACT_COUNTERS:
+        # A subquery rather than a join: only evaluated when the column is selected.
+        # Without a baseline, count from the start of the day.
+        baseline = f'SELECT {field} FROM counter_baselines b WHERE b.inverter = s.inverter AND b.day = s.ts / 86400'
+        decoded[field] = f'(s.energy_total - COALESCE(({baseline}), s.energy_total - s.energy_today)) / 1000.0'
+    columns = ',\n        '.join(f'{decoded[field]} AS {field}' for field in READING_FIELDS)
+    cursor.execute(f'''
+    CREATE VIEW readings AS
+    SELECT s.ts AS ts, i.name AS inverter_id, datetime(s.ts, 'unixepoch') AS timestamp,
+        {columns}
+    FROM samples s
+    JOIN inverters i ON i.id = s.inverter
+    ''')
+
+    inverter = '(SELECT id FROM inverters WHERE name = NEW.inverter_id)'
+    epoch = _LOCAL_EPOCH.format('NEW.timestamp')
+    encoded = ', '.join(f'CAST(round(NEW.{field} * {scale}) AS INTEGER)' for field, scale in COMPACT_SCALES)
+    updates = ',\n            '.join(
+        f'{field} = COALESCE({field}, CASE WHEN NEW.{field} > 0 '
+        f'THEN CAST(round((NEW.energy_total - NEW.{field}) * 1000) AS INTEGER) END)'
+        for field in COMPACT_COUNTERS)
+    missing = ' OR '.join(f'{field} IS NULL' for field in COMPACT_COUNTERS)
+    cursor.execute(f'''
+    CREATE TRIGGER readings_insert INSTEAD OF INSERT ON readings
+    BEGIN
+        INSERT OR IGNORE INTO inverters (name) VALUES (NEW.inverter_id);
+        INSERT OR REPLACE INTO samples (ts, inverter, {', '.join(field for field, _ in COMPACT_SCALES)})
+        VALUES ({epoch}, {inverter}, {encoded});
+        INSERT OR IGNORE INTO counter_baselines (inverter, day) VALUES ({inverter}, {epoch} / 86400);
+        UPDATE counter_baselines SET
+            {updates}
+        WHERE inverter = {inverter} AND day = {epoch} / 86400 AND ({missing});
+    END
+    ''')
+
+
+def is_compact(conn: sqlite3.Connection) -> bool:
+    """True if the database stores readings in the compact format."""
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = 'readings'").fetchone()
+    return row is not None and row[0] == 'view'
+
+
+def local_epoch(timestamp: str) -> int:
+    """Local wall-clock seconds since the epoch of a 'YYYY-MM-DD[ HH:MM:SS]' timestamp."""
+    moment = datetime.datetime.fromisoformat(timestamp)
+    return int((moment - datetime.datetime(1970, 1, 1)).total_seconds())
+
+
+def create_schema(conn: sqlite3.Connection, compact: bool = False):
+    """Create the schema, or upgrade a database written by an older version.
+
+    compact only applies to a new database: the format of an existing one
+    is kept. Future upgrades must handle both formats.
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if compact and version == 0 and not conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE name = 'readings'").fetchone()[0]:
+        logger.info("Creating database in the compact format")
+        with conn:
+            cursor = conn.cursor()
+            _compact_schema(cursor)
+            cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        version = SCHEMA_VERSION
+
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        logger.info(f"Upgrading database schema to version {number}")
+        with conn:
+            cursor = conn.cursor()
+            migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {number}')
+
+    with conn:
+        added = add_measurement_columns(conn)
+    if added:
+        logger.info(f"Added columns for new measurements: {', '.join(added)}")
+
+
+def add_measurement_columns(conn: sqlite3.Connection) -> List[str]:
+    """Add a column for every registered measurement the database lacks; returns their names.
+
+    Measurements join the registry without a schema version: a database
+    created before one was added gets its column, empty in older readings,
+    the next time it is opened.
+    """
+    if is_compact(conn):
+        existing = {row[1] for row in conn.execute('PRAGMA table_info(samples)')}
+        missing = [field for field, _ in COMPACT_SCALES if field not in existing]
+        for field in missing:
+            conn.execute(f'ALTER TABLE samples ADD COLUMN {field} INTEGER')
+        if missing:
+            # The view and its trigger list every column; dropping the view drops the trigger
+            conn.execute('DROP VIEW readings')
+            _compact_views(conn.cursor())
+    else:
+        existing = {row[1] for row in conn.execute('PRAGMA table_info(readings)')}
+        missing = [field for field in READING_FIELDS if field not in existing]
+        for field in missing:
+            conn.execute(f'ALTER TABLE readings ADD COLUMN {field} REAL')
+    return missing
+
+
+def convert_to_compact(source: str, target: str) -> int:
+    """Copy a database into a new file in the compact format; returns the number of readings copied.
+
+    Readings with the same inverter and second are merged (the last one wins).
+    """
+    if os.path.exists(target):
+        raise FileExistsError(target)
+    conn = sqlite3.connect(target)
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    for pragma in CONNECTION_PRAGMAS + WRITER_PRAGMAS:
+        conn.execute(pragma)
+    create_schema(conn, compact=True)
+    conn.execute('ATTACH DATABASE ? AS source', (source,))
+    if conn.execute("SELECT type FROM source.sqlite_master WHERE name = 'readings'").fetchone()[0] == 'view':
+        conn.close()
+        os.remove(target)
+        raise ValueError(f"{source} is already in the compact format")
+    columns = ', '.join(('inverter_id', 'timestamp') + READING_FIELDS)
+    with conn:
+        conn.execute(f'INSERT INTO readings ({columns}) SELECT {columns} FROM source.readings ORDER BY timestamp')
+        conn.execute('DELETE FROM rollups')
+        conn.execute('INSERT INTO rollups SELECT * FROM source.rollups')
+        conn.execute('INSERT INTO daily_energy SELECT * FROM source.daily_energy')
+        # The converted file takes over the spool of the source
+        conn.execute('INSERT OR REPLACE INTO spool_position SELECT * FROM source.spool_position')
+    conn.execute('DETACH DATABASE source')
+    count = conn.execute('SELECT COUNT(*) FROM samples').fetchone()[0]
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+    return count
+
+
+def reading_row(data: Dict[str, Any]) -> tuple:
+    """Turn a reading dict into a parameter tuple for INSERT_READING."""
+    timestamp = data.get('timestamp') or datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return (data.get('inverter_id', 'default'), timestamp) + tuple(data.get(f, 0) for f in READING_FIELDS)
+
+
+def spooled_row(payload: bytes) -> tuple:
+    """A row read back from the spool; rows spooled before a measurement was added lack its column."""
+    row = tuple(json.loads(payload))
+    return row + (None,) * (len(READING_COLUMNS) - len(row))
+
+
+def readings_query(start_time: str, end_time: Optional[str] = None,
+                   inverter_id: Optional[str] = None, columns: str = '*',
+                   compact: bool = False) -> Tuple[str, List[Any]]:
+    """Build the SQL and parameters for a time range query on readings.
+
+    With compact, the range is on the view's integer ts column, which the
+    samples key serves, and '*' leaves ts out.
+    """
+    if compact:
+        column, convert = 'ts', local_epoch
+        if columns == '*':
+            columns = ', '.join(('inverter_id', 'timestamp') + READING_FIELDS)
+    else:
+        column, convert = 'timestamp', str
+    conditions = [f'{column} >= ?']
+    params: List[Any] = [convert(start_time)]
+    if end_time is not None:
+        conditions.append(f'{column} < ?')
+        params.append(convert(end_time))
+    if inverter_id is not None:
+        conditions.append('inverter_id = ?')
+        params.append(inverter_id)
+    sql = f"SELECT {columns} FROM readings WHERE {' AND '.join(conditions)} ORDER BY {column} ASC"
+    return sql, params
+
+
+def rollups_query(resolution: str, start_time: str, end_time: Optional[str] = None,
+                  inverter_id: Optional[str] = None, columns: Optional[str] = None) -> Tuple[str, List[Any]]:
+    """Build the SQL and parameters for a time range query on one rollup resolution.
+
+    Rows look like readings (averages under the reading field names, the
+    bucket start as timestamp) plus samples, power_min/power_max,
+    temperature_max and energy_delta, the energy produced in the bucket.
+    """
+    prefix, suffix = next((p, s) for name, p, s in ROLLUP_RESOLUTIONS if name == resolution)
+    conditions = ['resolution = ?', 'bucket >= ?']
+    params: List[Any] = [resolution, start_time[:prefix] + suffix]
+    if end_time is not None:
+        conditions.append('bucket < ?')
+        params.append(end_time)
+    if inverter_id is not None:
+        conditions.append('inverter_id = ?')
+        params.append(inverter_id)
+    if columns is None:
+        averages = ', '.join(f'{field}_sum / samples AS {field}' for field in ROLLUP_SUM_FIELDS)
+        columns = (f"inverter_id, bucket AS timestamp, samples, {averages}, "
+                   "power_min, power_max, temperature_max, energy_last AS energy_total, "
+                   "energy_last - COALESCE(LAG(energy_last) OVER (PARTITION BY inverter_id ORDER BY bucket), "
+                   "energy_first) AS energy_delta")
+    sql = f"SELECT {columns} FROM rollups WHERE {' AND '.join(conditions)} ORDER BY bucket ASC, inverter_id"
+    return sql, params
+
+
+class ReadingStore:
+    """SQLite storage with one long-lived writer and pooled read-only readers.
+
+    Readings are buffered in memory and written with executemany in a single
+    transaction once batch_size readings are pending or flush_interval
+    seconds have passed, whichever comes first. close() flushes whatever is
+    left, so a clean shutdown loses nothing. A readonly store only opens
+    readers, for processes that serve a database another process writes.
+
+    With spool_dir, every reading is first appended to a write-ahead spool
+    (see aurora_spool) and each batch commits the spool position it reaches,
+    so open() replays exactly the readings a crash left unwritten. add()
+    never waits for the database: a background flusher does the writing,
+    and once max_pending readings are queued in memory new ones go to the
+    spool only, to be read back from it when the database catches up.
+    Without a spool the queue is bounded the same way and readings past
+    it are dropped. With flush_interval 0 there is no flusher and add()
+    writes full batches itself.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 50, flush_interval: float = 5.0,
+                 compact: bool = False, readonly: bool = False, spool_dir: Optional[str] = None,
+                 max_pending: int = 10000):
+        """Initialize the store; call open() before use. compact picks the format of a new database."""
+        self.db_path = db_path
+        self.compact = compact
+        self.readonly = readonly
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = None if readonly else spool_dir
+        self.max_pending = max_pending
+        self.writer: Optional[sqlite3.Connection] = None
+        self.spool: Optional[Spool] = None
+        # (row, spool position after it) of the readings queued in memory
+        self._pending: Deque[Tuple[tuple, Optional[Position]]] = collections.deque()
+        # Start of the readings that only went to the spool, while memory was full
+        self._spilled_from: Optional[Position] = None
+        self.spilled = 0
+        self.dropped = 0
+        self._spool_failing = False
+        # Writer lock: held for database writes. Queue lock: held briefly by add() and the flusher.
+        self._lock = threading.Lock()
+        self._queue_lock = threading.Lock()
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self.rows_written = 0
+        self.flushes = 0
+        # Bumped after every committed write; lets caches tell when stored data changed.
+        # Starts from the clock so a restarted process never reuses an earlier version.
+        self.version = int(time.time() * 1000)
+        # Called after each committed batch
+        self.on_flush: Optional[Callable[[], None]] = None
+        # Tier ('raw' or a rollup resolution) -> oldest timestamp retention keeps in it
+        self.horizons: Dict[str, str] = {}
+
+    def open(self):
+        """Open the writer connection, create the schema, replay the spool and start the flusher."""
+        if self.readonly:
+            if not os.path.exists(self.db_path):
+                raise FileNotFoundError(self.db_path)
+            with self.reader() as conn:
+                self.compact = is_compact(conn)
+            return
+
+        self.writer = sqlite3.connect(self.db_path, check_same_thread=False)
+        for pragma in CONNECTION_PRAGMAS:
+            self.writer.execute(pragma)
+        if not self.writer.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()[0]:
+            # Only possible before anything (even the WAL switch) is written: lets retention shrink the file
+            self.writer.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        for pragma in WRITER_PRAGMAS:
+            self.writer.execute(pragma)
+        create_schema(self.writer, self.compact)
+        self.compact = is_compact(self.writer)
+
+        if self.spool_dir:
+            self.spool = Spool(self.spool_dir)
+            self._replay()
+            self.spool.open()
+            # Everything before the new segment is stored now
+            self.spool.discard(self.spool.position)
+
+        self._stop.clear()
+        if self.flush_interval:
+            self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._flusher.start()
+
+    def _replay(self) -> int:
+        """Store the spooled readings past the committed position; returns how many there were."""
+        committed = tuple(self.writer.execute('SELECT segment, byte_offset FROM spool_position').fetchone())
+        rows: List[tuple] = []
+        replayed = 0
+        for payload, position in self.spool.records(committed):
+            rows.append(spooled_row(payload))
+            if len(rows) >= SPOOL_BATCH:
+                self._write(rows, position)
+                replayed += len(rows)
+                rows = []
+        if rows:
+            self._write(rows, position)
+            replayed += len(rows)
+        if replayed:
+            logger.info(f"Replayed {replayed} unwritten readings from the spool")
+        return replayed
+
+    def close(self):
+        """Flush pending readings and close all connections."""
+        self._stop.set()
+        self._wake.set()
+        if self._flusher:
+            self._flusher.join()
+            self._flusher = None
+        if self.writer:
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                if not self.spool:
+                    raise
+                logger.error(f"Could not write {self.pending} readings, kept in the spool for the next start: {e}")
+            with self._lock:
+                self.writer.close()
+                self.writer = None
+        if self.spool:
+            self.spool.close()
+            self.spool = None
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+    def add(self, data: Dict[str, Any]):
+        """Queue a reading, spooled to disk first; never waits for the database while a flusher runs."""
+        started = time.perf_counter()
+        row = reading_row(data)
+        with self._queue_lock:
+            start = end = None
+            if self.spool:
+                try:
+                    start, end = self.spool.append(json.dumps(row, separators=(',', ':')).encode())
+                    if self._spool_failing:
+                        self._spool_failing = False
+                        logger.info("Spool is writable again")
+                except OSError as e:
+                    if not self._spool_failing:
+                        self._spool_failing = True
+                        logger.error(f"Could not write to the spool, queueing readings in memory only: {e}")
+            if self._spilled_from is None and len(self._pending) < self.max_pending:
+                self._pending.append((row, end))
+            elif end is not None:
+                if self._spilled_from is None:
+                    self._spilled_from = start
+                self.spilled += 1
+            else:
+                self.dropped += 1
+                DROPPED_READINGS.inc()
+            full = len(self._pending) + self.spilled >= self.batch_size
+        ADD_SECONDS.observe(time.perf_counter() - started)
+        if full:
+            if self._flusher:
+                self._wake.set()
+            else:
+                self.flush()
+
+    def flush(self) -> int:
+        """Write all pending readings (spilled ones in chunks) and return how many were written."""
+        written = 0
+        while True:
+            count = self._flush_batch()
+            if not count:
+                return written
+            written += count
+
+    def _flush_batch(self) -> int:
+        """Write the readings queued in memory, or else the next chunk of spilled ones."""
+        with self._lock:
+            if not self.writer:
+                return 0
+            position = spilled_from = None
+            with self._queue_lock:
+                rows = [row for row, _ in self._pending]
+                for _, end in reversed(self._pending):
+                    if end is not None:
+                        position = end
+                        break
+                if not rows and self._spilled_from is not None:
+                    spilled_from, until = self._spilled_from, self.spool.position
+            if spilled_from is not None:
+                # Records before until are complete: read them without holding up add()
+                for payload, position in self.spool.records(spilled_from, until):
+                    rows.append(spooled_row(payload))
+                    if len(rows) >= SPOOL_BATCH:
+                        break
+            if not rows:
+                return 0
+
+            try:
+                self._write(rows, position)
+            except sqlite3.Error:
+                # Nothing was taken off the queue: the next attempt writes the same readings
+                FLUSH_ERRORS.inc()
+                raise
+            with self._queue_lock:
+                if spilled_from is None:
+                    for _ in rows:
+                        self._pending.popleft()
+                else:
+                    self.spilled -= len(rows)
+                    self._spilled_from = position if position < self.spool.position else None
+            if position is not None:
+                self.spool.discard(position)
+        if self.on_flush:
+            self.on_flush()
+        return len(rows)
+
+    def _write(self, rows: List[tuple], position: Optional[Position]):
+        """Insert readings and their rollups, and record the spool position they reach, in one transaction."""
+        started = time.perf_counter()
+        with self.writer:
+            self.writer.executemany(INSERT_READING, rows)
+            self.writer.executemany(UPSERT_ROLLUP, rollup_rows(rows))
+            if position is not None:
+                self.writer.execute('UPDATE spool_position SET segment = ?, byte_offset = ?', position)
+        FLUSH_SECONDS.observe(time.perf_counter() - started)
+        self.rows_written += len(rows)
+        self.flushes += 1
+        self.version += 1
+
+    @property
+    def pending(self) -> int:
+        """Number of readings waiting to be written."""
+        return len(self._pending) + self.spilled
+
+    def backlog(self) -> Dict[str, Any]:
+        """Queue state: readings in memory and only in the spool, spool size, dropped readings."""
+        return {
+            'memory': len(self._pending),
+            'spilled': self.spilled,
+            'spool_bytes': self.spool.size() if self.spool else 0,
+            'dropped': self.dropped,
+        }
+
+    def _flush_periodically(self):
+        """Background thread: writes full batches as add() signals them, the rest every flush_interval."""
+        backoff = 0.0
+        while True:
+            if backoff:
+                # The database failed: retry later, readings keep queueing meanwhile
+                self._stop.wait(backoff)
+            else:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.flush()
+                backoff = 0.0
+            except Exception as e:
+                logger.error(f"Error flushing readings to database: {e}")
+                backoff = min(max(backoff * 2, 1.0), 30.0)
+
+    def delete_oldest(self, tier: str, cutoff: str, chunk_size: int = 2000) -> int:
+        """Delete about chunk_size of the oldest rows of a tier older than cutoff; returns rows deleted.
+
+        tier is 'raw' for readings or a rollup resolution. Each call is one
+        short transaction, so batched writes get the writer between chunks.
+        """
+        if tier == 'raw' and self.compact:
+            table, column, condition, params = 'samples', 'ts', '', []
+            cutoff = local_epoch(cutoff)
+        elif tier == 'raw':
+            table, column, condition, params = 'readings', 'timestamp', '', []
+        else:
+            table, column, condition, params = 'rollups', 'bucket', 'resolution = ? AND ', [tier]
+        with self._lock:
+            if not self.writer:
+                return 0
+            # Timestamp of the chunk_size-th oldest row, found on the index
+            row = self.writer.execute(
+                f"SELECT {column} FROM {table} WHERE {condition}{column} < ? ORDER BY {column} LIMIT 1 OFFSET ?",
+                params + [cutoff, chunk_size - 1]).fetchone()
+            if row is None:
+                sql, bound = f"DELETE FROM {table} WHERE {condition}{column} < ?", cutoff
+            else:
+                sql, bound = f"DELETE FROM {table} WHERE {condition}{column} <= ?", row[0]
+            with self.writer:
+                deleted = self.writer.execute(sql, params + [bound]).rowcount
+            if deleted:
+                self.version += 1
+            return deleted
+
+    def incremental_vacuum(self, pages: int = 512) -> int:
+        """Return up to pages free pages to the file system; returns the free pages left."""
+        with self._lock:
+            if not self.writer:
+                return 0
+            # The pragma frees one page per step and execute() steps only once; executescript() runs it to completion
+            self.writer.executescript(f'PRAGMA incremental_vacuum({int(pages)});')
+            return self.writer.execute('PRAGMA freelist_count').fetchone()[0]
+
+    def space(self) -> Dict[str, int]:
+        """Page size, page count, free pages and auto_vacuum mode (0 none, 1 full, 2 incremental)."""
+        with self._lock:
+            return {name: self.writer.execute(f'PRAGMA {name}').fetchone()[0]
+                    for name in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum')}
+
+    def add_daily_energy(self, inverter_id: str, days: List[Tuple[str, float]]) -> int:
+        """Store (day, kWh) pairs from an inverter's energy log in one transaction."""
+        with self._lock:
+            if not self.writer or not days:
+                return 0
+            with self.writer:
+                self.writer.executemany(
+                    'INSERT OR REPLACE INTO daily_energy (inverter_id, day, energy) VALUES (?, ?, ?)',
+                    [(inverter_id, day, energy) for day, energy in days])
+            self.version += 1
+            return len(days)
+
+    def incomplete_days(self, inverter_id: str, first_day: str, last_day: str,
+                        min_power: float = 50) -> List[str]:
+        """Days from first_day to last_day whose energy the readings may not cover, newest first.
+
+        The inverter's own daily counter is stored with every reading, so an
+        outage during the day loses nothing. A day is incomplete when it has
+        no readings, or its last hour with readings still shows at least
+        min_power (the monitor stopped before production did). Days already
+        in daily_energy are skipped, so an interrupted backfill resumes
+        where it left off.
+        """
+        end = (datetime.date.fromisoformat(last_day) + datetime.timedelta(days=1)).isoformat()
+        with self.reader() as conn:
+            last_hour = {}
+            for bucket, power_min in conn.execute(
+                    "SELECT bucket, power_min FROM rollups WHERE resolution = 'hour' AND inverter_id = ? "
+                    "AND bucket >= ? AND bucket < ? ORDER BY bucket", (inverter_id, first_day, end)):
+                last_hour[bucket[:10]] = power_min
+            logged = {row[0] for row in conn.execute(
+                'SELECT day FROM daily_energy WHERE inverter_id = ? AND day >= ? AND day < ?',
+                (inverter_id, first_day, end))}
+
+        days = []
+        day = datetime.date.fromisoformat(last_day)
+        first = datetime.date.fromisoformat(first_day)
+        while day >= first:
+            name = day.isoformat()
+            if name not in logged and (last_hour.get(name) is None or last_hour[name] >= min_power):
+                days.append(name)
+            day -= datetime.timedelta(days=1)
+        return days
+
+    def daily_energy(self, first_day: str, last_day: str, inverter_id: str) -> List[Dict[str, Any]]:
+        """Energy per day: from the inverter's log where it was backfilled, otherwise from the day rollups.
+
+        A day rollup's energy is the highest daily counter the inverter
+        reported, which also covers the part of the day before monitoring
+        began, or the rise of the lifetime counter if that is more (the
+        daily counter was not read).
+        """
+        end = (datetime.date.fromisoformat(last_day) + datetime.timedelta(days=1)).isoformat()
+        days: Dict[str, Dict[str, Any]] = {}
+        with self.reader() as conn:
+            for bucket, energy in conn.execute(
+                    "SELECT bucket, MAX(ifnull(energy_today_max, 0), ifnull(energy_last - energy_first, 0)) "
+                    "FROM rollups WHERE resolution = 'day' AND inverter_id = ? AND bucket >= ? AND bucket < ?",
+                    (inverter_id, first_day, end)):
+                days[bucket[:10]] = {'day': bucket[:10], 'energy_kwh': round(energy or 0.0, 3), 'source': 'readings'}
+            for day, energy in conn.execute(
+                    'SELECT day, energy FROM daily_energy WHERE inverter_id = ? AND day >= ? AND day < ?',
+                    (inverter_id, first_day, end)):
+                days[day] = {'day': day, 'energy_kwh': round(energy, 3), 'source': 'inverter_log'}
+        return [days[day] for day in sorted(days)]
+
+    def readings(self, start_time: str, end_time: Optional[str] = None,
+                 inverter_id: Optional[str] = None) -> List[sqlite3.Row]:
+        """Return readings with start_time <= timestamp (< end_time), oldest first."""
+        sql, params = readings_query(start_time, end_time, inverter_id, compact=self.compact)
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def iter_readings(self, start_time: str, end_time: Optional[str] = None,
+                      inverter_id: Optional[str] = None, columns: Sequence[str] = READING_COLUMNS,
+                      chunk_size: int = 5000) -> Iterator[List[tuple]]:
+        """Yield readings as plain tuples of columns, chunk_size at a time, oldest first.
+
+        Rows are fetched from one cursor as they are consumed, so memory stays
+        flat however long the range. The reader connection (and its read
+        snapshot) is held until the generator is exhausted or closed.
+        """
+        sql, params = readings_query(start_time, end_time, inverter_id, ', '.join(columns), compact=self.compact)
+        with self.reader() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+    def history(self, start_time: str, end_time: Optional[str] = None,
+                inverter_id: Optional[str] = None, max_points: int = 1000,
+                resolution: str = 'auto') -> Tuple[str, List[sqlite3.Row]]:
+        """Return (resolution, rows) for a time range.
+
+        With resolution 'auto', raw readings are returned if they fit in
+        max_points, otherwise the finest rollup resolution that does, so long
+        windows never ship every raw sample.
+        """
+        with self.reader() as conn:
+            if resolution == 'auto':
+                resolution = self._pick_resolution(conn, start_time, end_time, inverter_id, max_points,
+                                                   self.horizons, self.compact)
+            if resolution == 'raw':
+                sql, params = readings_query(start_time, end_time, inverter_id, compact=self.compact)
+            else:
+                sql, params = rollups_query(resolution, start_time, end_time, inverter_id)
+            return resolution, conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _pick_resolution(conn: sqlite3.Connection, start_time: str, end_time: Optional[str],
+                         inverter_id: Optional[str], max_points: int,
+                         horizons: Optional[Dict[str, str]] = None, compact: bool = False) -> str:
+        """Finest resolution with at most max_points rows in the range.
+
+        Resolutions whose retention horizon is after start_time are skipped:
+        their few remaining rows would only cover the end of the range.
+        """
+        horizons = horizons or {}
+        candidates = [('raw', readings_query(start_time, end_time, inverter_id, columns='1', compact=compact))]
+        candidates += [(name, rollups_query(name, start_time, end_time, inverter_id, columns='1'))
+                       for name, _, _ in ROLLUP_RESOLUTIONS]
+        for name, (sql, params) in candidates:
+            if start_time < horizons.get(name, ''):
+                continue
+            # Bounded count: stops after max_points + 1 index entries
+            count = conn.execute(f"SELECT COUNT(*) FROM ({sql} LIMIT ?)", params + [max_points + 1]).fetchone()[0]
+            if count <= max_points:
+                return name
+        return ROLLUP_RESOLUTIONS[-1][0]
+
+    @contextlib.contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read-only connection from the pool."""
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            uri = 'file:' + urllib.request.pathname2url(os.path.abspath(self.db_path)) + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            # Don't hold a read snapshot open while the connection sits in the pool
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+
+def main():
+    """Maintenance commands for an existing database."""
+    parser = argparse.ArgumentParser(description="Aurora Inverter Monitor database maintenance")
+    parser.add_argument('command', choices=['upgrade', 'rebuild-rollups', 'vacuum', 'compact', 'convert'],
+                        help="upgrade: apply pending schema upgrades; "
+                             "rebuild-rollups: recompute all rollups from raw readings; "
+                             "vacuum: rewrite the file once with incremental vacuum enabled; "
+                             "compact: delete data past --retain and shrink the file; "
+                             "convert: copy the database to --output in the compact format")
+    parser.add_argument('--db', default=os.environ.get('DB_PATH', 'aurora_data.db'))
+    parser.add_argument('--output', help="new database file written by convert")
+    parser.add_argument('--retain', action='append', default=[], metavar='TIER=DAYS',
+                        help="days to keep a tier (raw, minute, hour, day, month), e.g. raw=90; repeatable")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == 'compact':
+        from aurora_retention import Compactor
+        retention = {tier: float(days) for tier, days in (item.split('=', 1) for item in args.retain)}
+        store = ReadingStore(args.db, flush_interval=0)
+        store.open()
+        Compactor(store, retention, pause=0).run_once()
+        store.close()
+        return
+
+    conn = sqlite3.connect(args.db)
+    conn.execute('PRAGMA busy_timeout = 30000')
+    create_schema(conn)
+    if args.command == 'rebuild-rollups':
+        start = time.perf_counter()
+        with conn:
+            rebuild_rollups(conn.cursor())
+        count = conn.execute('SELECT COUNT(*) FROM rollups').fetchone()[0]
+        logger.info(f"Rebuilt {count} rollup rows in {time.perf_counter() - start:.1f}s")
+    elif args.command == 'vacuum':
+        # Switching auto_vacuum on an existing database takes effect with the next VACUUM
+        start = time.perf_counter()
+        size = os.path.getsize(args.db)
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        logger.info(f"Vacuumed {size / 1048576:.1f} MiB to {os.path.getsize(args.db) / 1048576:.1f} MiB "
+                    f"in {time.perf_counter() - start:.1f}s")
+    elif args.command == 'convert':
+        if not args.output:
+            parser.error("convert needs --output")
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        start = time.perf_counter()
+        count = convert_to_compact(args.db, args.output)
+        logger.info(f"Converted {count} readings from {os.path.getsize(args.db) / 1048576:.1f} MiB "
+                    f"to {os.path.getsize(args.output) / 1048576:.1f} MiB in {time.perf_counter() - start:.1f}s")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Live Reading Stream
+
+import json
+import logging
+import queue
+import threading
+from typing import Any, Dict, Hashable, Iterator, List, Optional
+
+logger = logging.getLogger("aurora_stream")
+
+# Comment line sent when nothing happened, so proxies keep the connection open
+HEARTBEAT = b': keepalive\n\n'
+
+
+def sse_event(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    """Format one Server-Sent Event."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+class Subscription:
+    """One connected client: a bounded queue of encoded events."""
+
+    def __init__(self, max_queue: int):
+        """Initialize an empty subscription."""
+        self.queue: queue.Queue = queue.Queue(max_queue)
+        self.dropped = 0
+        self.closed = False
+
+
+class StreamHub:
+    """Fans out readings to all stream subscribers.
+
+    Each event is encoded once in publish() and handed to every subscriber
+    with a non-blocking put, so the poller never waits for a client. A
+    subscriber that stops reading loses its oldest queued events rather
+    than holding up the others. The latest event per replay key is kept so
+    new clients render immediately instead of waiting for the next reading.
+    """
+
+    def __init__(self, max_queue: int = 32, heartbeat: float = 15.0):
+        """Initialize a hub without subscribers."""
+        self.max_queue = max_queue
+        self.heartbeat = heartbeat
+        self.published = 0
+        self.last_events: Dict[Hashable, bytes] = {}
+        self._subscribers: List[Subscription] = []
+        self._lock = threading.Lock()
+
+    @property
+    def subscribers(self) -> int:
+        """Number of connected clients."""
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event: str, data: Dict[str, Any], key: Optional[Hashable] = None):
+        """Send an event to every subscriber without blocking.
+
+        key (default: the event name) identifies the latest-value slot the
+        event replaces for replay to new subscribers.
+        """
+        with self._lock:
+            self.published += 1
+            message = sse_event(event, data, self.published)
+            self.last_events[event if key is None else key] = message
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            self._offer(subscription, message)
+
+    def _offer(self, subscription: Subscription, message: Optional[bytes]):
+        """Queue a message, dropping the oldest one if the client fell behind."""
+        while True:
+            try:
+                subscription.queue.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    subscription.queue.get_nowait()
+                    subscription.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def subscribe(self) -> Subscription:
+        """Register a new client; it starts with the latest events."""
+        subscription = Subscription(self.max_queue)
+        with self._lock:
+            for message in list(self.last_events.values())[-self.max_queue:]:
+                subscription.queue.put_nowait(message)
+            self._subscribers.append(subscription)
+        logger.info(f"Stream client connected ({self.subscribers} connected)")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Remove a client."""
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+        logger.info(f"Stream client disconnected ({self.subscribers} connected)")
+
+    def events(self, subscription: Subscription) -> Iterator[bytes]:
+        """Yield encoded events for a subscription until the hub closes."""
+        try:
+            while not subscription.closed:
+                try:
+                    message = subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield HEARTBEAT
+                    continue
+                if message is None:
+                    break
+                yield message
+        finally:
+            self.unsubscribe(subscription)
+
+    def close(self):
+        """Disconnect all subscribers."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.closed = True
+            self._offer(subscription, None)
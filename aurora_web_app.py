@@ -7,16 +7,36 @@ import json
 import logging
 import os
 import signal
-import sqlite3
 import sys
 import threading
 import time
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, g, render_template, jsonify, request
 
 # Import our Aurora client
-from aurora_client import AuroraClient
+from aurora_backfill import Backfiller
+from aurora_cache import ResponseCache
+from aurora_config import ConfigWatcher
+from aurora_downsample import downsample, select_fields
+from aurora_encoding import COMPRESSIBLE_TYPES, FORMATS, MIME_JSON, available_types, compress, encode
+import aurora_export
+from aurora_daylight import get_timezone
+from aurora_latest import LatestReadings, ReadingSnapshot
+from aurora_measurements import metric_families
+from aurora_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, HTTP_BUCKETS, REGISTRY, Counter, Gauge, Metric, serve
+from aurora_poller import DEFAULT_INVERTER_ID, PollingEngine, targets_from_config
+from aurora_retention import Compactor
+from aurora_schedule import measurement_intervals
+from aurora_snapshot import SnapshotReader, SnapshotWriter
+from aurora_storage import ROLLUP_RESOLUTIONS, ReadingStore
+from aurora_stream import StreamHub
+
+# Analytics need numpy, which is optional
+try:
+    import aurora_analytics
+except ImportError:
+    aurora_analytics = None
 
 # Set up logging
 logging.basicConfig(
@@ -33,6 +53,14 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_key')
 # Config file path
 config_file = os.environ.get('CONFIG_FILE', 'aurora_config.json')
 
+# Settings that shape the polling targets: applied to the running poller
+POLLING_KEYS = {'inverter_host', 'inverter_port', 'polling_interval', 'inverters', 'measurement_intervals',
+                'bus_budget', 'pipeline_depth', 'adaptive_polling', 'latitude', 'longitude',
+                'idle_max_interval', 'timezone'}
+# Settings only read at startup
+RESTART_KEYS = {'web_host', 'web_port', 'db_path', 'db_compact', 'db_spool', 'snapshot_path', 'metrics_port',
+                'config_watch_interval'}
+
 # Default configuration
 default_config = {
     'inverter_host': os.environ.get('INVERTER_HOST', '192.168.1.100'),
@@ -43,18 +71,106 @@ default_config = {
     'web_host': os.environ.get('WEB_HOST', '0.0.0.0'),
     'web_port': int(os.environ.get('WEB_PORT', '5000')),
     'timezone': os.environ.get('TZ', 'Europe/Rome'),
-    'db_path': os.environ.get('DB_PATH', 'aurora_data.db')
+    'db_path': os.environ.get('DB_PATH', 'aurora_data.db'),
+    # Latest readings shared by aurora_collector.py with web workers; empty means next to the database
+    'snapshot_path': os.environ.get('SNAPSHOT_PATH', ''),
+    # Optional list of {id, host, port, address, polling_interval}; empty means
+    # a single inverter at inverter_host/inverter_port, RS-485 address 2
+    'inverters': [],
+    # Per-field read intervals in seconds, e.g. {"power_output": 5}; unlisted fields
+    # follow polling_interval (energy counters at most every 15 minutes)
+    'measurement_intervals': {},
+    # Seconds of RS-485 bus time one poll window may use per inverter
+    'bus_budget': 2.0,
+    # Requests kept in flight per bridge; >1 hides WiFi round trips but only
+    # works with bridges that buffer requests for the serial line
+    'pipeline_depth': 1,
+    # Poll less while the inverter sleeps; site coordinates (decimal degrees)
+    # let the poller sleep through the night and wake up at sunrise
+    'adaptive_polling': True,
+    'latitude': None,
+    'longitude': None,
+    'idle_max_interval': 1800,
+    # DC nameplate power (kWp) and AC power limit (W) of the inverter, for
+    # specific yield, performance ratio and clipping in /api/analytics
+    'system_kwp': None,
+    'ac_power_limit': None,
+    # Readings are written in batches: after this many, or after this many seconds
+    'db_batch_size': 50,
+    # New databases store readings as scaled integers (see aurora_storage.py convert)
+    'db_compact': False,
+    'db_flush_interval': 5,
+    # Readings are appended to a write-ahead spool (<db_path>-spool/) before the
+    # database, and replayed after a crash; past db_max_pending queued readings
+    # they wait in the spool only
+    'db_spool': True,
+    'db_max_pending': 10000,
+    # Longer history periods are served from rollups to stay under this many points
+    'history_max_points': 1000,
+    # Days to keep each tier, e.g. {"raw": 90, "minute": 365}; missing or 0 keeps it forever.
+    # Older history is then served from the coarser rollups.
+    'retention_days': {},
+    'compaction_interval': 3600,
+    # Days to look back for days the readings miss, filled from the inverters'
+    # daily energy logs (at most 365); 0 disables the backfill
+    'backfill_days': 0,
+    # Port where aurora_collector.py serves /metrics; 0 disables it
+    'metrics_port': int(os.environ.get('METRICS_PORT', '0')),
+    # Seconds between checks of the config file for changes made by web workers,
+    # other processes or by hand; 0 disables the watch
+    'config_watch_interval': 2
 }
 
 # Current configuration
 config = default_config.copy()
+# Held while a configuration change is saved and applied
+config_lock = threading.Lock()
+config_watcher = None
 
 # Global variables
 db_path = config['db_path']
 inverter_host = config['inverter_host']
 inverter_port = config['inverter_port']
 polling_interval = config['polling_interval']
-last_reading = {}
+polling_engine = None
+reading_store = None
+compactor = None
+backfiller = None
+# Collector: publishes the latest readings; web worker: follows them
+snapshot_writer = None
+snapshot_reader = None
+
+# Latest reading of each inverter; its seq versions the cached /api/status responses.
+# Starts from the clock so browsers' ETags from before a restart never match.
+latest = LatestReadings(int(time.time() * 1000))
+# Longest /api/data?since= wait, in seconds
+LONG_POLL_MAX = 60
+status_cache = ResponseCache()
+# Responses built from stored data, versioned by the store
+response_cache = ResponseCache()
+# Pushes new readings to /api/stream clients
+stream_hub = StreamHub()
+
+# Completed days of /api/analytics, computed once
+analytics_cache = aurora_analytics.AnalyticsCache() if aurora_analytics else None
+ANALYTICS_MAX_DAYS = 3660
+
+HTTP_SECONDS = REGISTRY.histogram('aurora_http_request_seconds', 'Time spent in web request handlers',
+                                  ('endpoint', 'method', 'status'), HTTP_BUCKETS)
+
+# Latest readings exported by /metrics: (metric, help, extra label, field -> label value),
+# one family per registered measurement plus the calculated efficiency
+READING_METRICS = metric_families() + (
+    ('aurora_efficiency_percent', 'DC to AC conversion efficiency', None, {'efficiency': None}),
+)
+
+# Dashboard periods served by /api/readings
+PERIOD_HOURS = {'day': 24, 'week': 24 * 7, 'month': 24 * 30, 'year': 24 * 365}
+
+HISTORY_RESOLUTIONS = ['auto', 'raw'] + [name for name, _, _ in ROLLUP_RESOLUTIONS]
+# Fetch up to this many times max_points rows before downsampling
+HISTORY_OVERSAMPLE = 4
+HISTORY_MAX_POINTS_LIMIT = 20000
 monitoring_thread = None
 stop_event = threading.Event()
 
@@ -67,7 +183,7 @@ def load_config():
         if os.path.exists(config_file):
             with open(config_file, 'r') as f:
                 saved_config = json.load(f)
-                config.update(saved_config)
+                config.update(parse_settings(saved_config))
         else:
             # Save default config if file doesn't exist
             save_config()
@@ -82,6 +198,36 @@ def load_config():
     
     logger.info(f"Configuration loaded: inverter={inverter_host}:{inverter_port}, polling={polling_interval}s")
 
+# Settings converted from what the setup page sends: numbers arrive as strings
+INT_KEYS = {'inverter_port', 'web_port', 'polling_interval', 'ui_refresh_interval', 'chart_refresh_interval',
+            'db_batch_size', 'history_max_points', 'metrics_port', 'backfill_days', 'db_max_pending',
+            'pipeline_depth', 'idle_max_interval', 'compaction_interval'}
+FLOAT_KEYS = {'bus_budget', 'db_flush_interval', 'config_watch_interval'}
+# Empty means not set
+OPTIONAL_FLOAT_KEYS = {'latitude', 'longitude', 'system_kwp', 'ac_power_limit'}
+# Mappings of name -> days or seconds
+SECONDS_MAP_KEYS = {'retention_days', 'measurement_intervals'}
+
+# Convert settings to the types the application uses
+def parse_settings(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Settings with numbers converted; ValueError naming the setting if one doesn't parse."""
+    settings = {}
+    for key, value in data.items():
+        try:
+            if key in INT_KEYS:
+                settings[key] = int(value)
+            elif key in FLOAT_KEYS:
+                settings[key] = float(value)
+            elif key in OPTIONAL_FLOAT_KEYS:
+                settings[key] = float(value) if value not in (None, '') else None
+            elif key in SECONDS_MAP_KEYS:
+                settings[key] = {name: float(number) for name, number in (value or {}).items()}
+            else:
+                settings[key] = value
+        except (TypeError, ValueError, AttributeError):
+            raise ValueError(f"{key}: {value!r} is not a valid value") from None
+    return settings
+
 # Save configuration to file
 def save_config():
     """Save configuration to JSON file."""
@@ -94,107 +240,165 @@ def save_config():
         logger.error(f"Error saving configuration: {e}")
         return False
 
+# Apply a changed configuration without a restart
+def apply_config(previous: Dict[str, Any]) -> List[str]:
+    """Apply the settings that differ from previous to the running application.
+    
+    The poller is reconfigured in place, so polling goes on and only an
+    inverter whose endpoint changed reconnects. Returns the changed
+    settings that take effect after a restart only.
+    """
+    global inverter_host, inverter_port, polling_interval, backfiller
+    
+    changed = {key for key in config if config[key] != previous.get(key)}
+    if not changed:
+        return []
+    logger.info(f"Configuration changed: {', '.join(sorted(changed))}")
+    inverter_host = config['inverter_host']
+    inverter_port = config['inverter_port']
+    polling_interval = config['polling_interval']
+    restart = sorted(changed & RESTART_KEYS)
+    
+    if changed & POLLING_KEYS and polling_engine is not None and polling_engine.loop is not None:
+        polling_engine.reconfigure_threadsafe(targets_from_config(config), int(config['pipeline_depth']))
+        logger.info(f"Poller reconfigured: {len(polling_engine.targets)} inverter(s), "
+                    f"{len(polling_engine.connections)} bridge(s) connected")
+    if changed & {'retention_days', 'compaction_interval'} and compactor is not None:
+        stop_compaction()
+        start_compaction()
+    if 'backfill_days' in changed and backfiller is not None:
+        backfiller.stop()
+        backfiller = Backfiller(reading_store, polling_engine, days=int(config['backfill_days']))
+        backfiller.start()
+    if reading_store is not None and not reading_store.readonly:
+        reading_store.batch_size = int(config['db_batch_size'])
+        reading_store.max_pending = int(config['db_max_pending'])
+        if 'db_flush_interval' in changed:
+            # The flusher thread only exists with a non-zero interval
+            if reading_store.flush_interval and config['db_flush_interval']:
+                reading_store.flush_interval = float(config['db_flush_interval'])
+            else:
+                restart.append('db_flush_interval')
+    if changed & {'ui_refresh_interval', 'chart_refresh_interval'}:
+        # Open dashboards take them over from the stream
+        stream_hub.publish('config', {'ui_refresh_interval': config['ui_refresh_interval'],
+                                      'chart_refresh_interval': config['chart_refresh_interval']})
+    
+    if restart:
+        logger.warning(f"Restart to apply: {', '.join(restart)}")
+    return restart
+
+# Check settings before they are saved or applied
+def validate_config(values: Dict[str, Any]):
+    """Raise ValueError (or TypeError) if the poller can't be built from values."""
+    measurement_intervals(float(values['polling_interval']), values.get('measurement_intervals'))
+    targets_from_config(values)
+
+# Take over changes made to the config file by another process
+def reload_config(settings: Dict[str, Any]):
+    """Apply the settings read from the config file; invalid ones are logged and skipped."""
+    with config_lock:
+        previous = dict(config)
+        try:
+            config.update(parse_settings(settings))
+            validate_config(config)
+            apply_config(previous)
+        except Exception as e:
+            config.clear()
+            config.update(previous)
+            logger.error(f"Ignoring invalid configuration file: {e}")
+
+# Follow the config file
+def start_config_watch():
+    """Apply changes to the config file while running, unless config_watch_interval is 0."""
+    global config_watcher
+    
+    interval = float(config.get('config_watch_interval') or 0)
+    if interval > 0:
+        config_watcher = ConfigWatcher(config_file, reload_config, interval)
+        config_watcher.start()
+
+# Stop following the config file
+def stop_config_watch():
+    """Stop the config file watch."""
+    global config_watcher
+    
+    if config_watcher is not None:
+        config_watcher.stop()
+        config_watcher = None
+
 # Initialize database
-def init_db():
-    """Initialize the SQLite database."""
+def init_db(readonly: bool = False):
+    """Initialize the SQLite database; readonly for web workers beside a collector."""
+    global reading_store
+    
     logger.info(f"Initializing database at {db_path}")
     
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Create readings table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS readings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            power_output REAL,
-            voltage_1 REAL,
-            current_1 REAL,
-            voltage_2 REAL,
-            current_2 REAL,
-            temperature REAL,
-            grid_voltage REAL,
-            efficiency REAL,
-            peak_today REAL,
-            energy_today REAL,
-            energy_week REAL,
-            energy_month REAL,
-            energy_year REAL,
-            energy_total REAL
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        if reading_store is not None:
+            reading_store.close()
+        reading_store = ReadingStore(db_path,
+                                     batch_size=config['db_batch_size'],
+                                     flush_interval=config['db_flush_interval'],
+                                     compact=bool(config['db_compact']),
+                                     readonly=readonly,
+                                     spool_dir=f"{db_path}-spool" if config['db_spool'] else None,
+                                     max_pending=int(config['db_max_pending']))
+        reading_store.open()
         return True
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
         return False
 
+# Flush and close the database
+def close_db():
+    """Write any buffered readings and close the database."""
+    global reading_store
+    
+    if reading_store is not None:
+        try:
+            reading_store.close()
+            logger.info(f"Database closed ({reading_store.rows_written} readings written)")
+        except Exception as e:
+            logger.error(f"Error closing database: {e}")
+        reading_store = None
+
+# Start the background retention task
+def start_compaction():
+    """Start deleting data past its retention, if any is configured."""
+    global compactor
+    
+    compactor = Compactor(reading_store, config['retention_days'],
+                          interval=float(config['compaction_interval']))
+    compactor.start()
+
+# Stop the background retention task
+def stop_compaction():
+    """Stop the retention task, between two chunks of work."""
+    global compactor
+    
+    if compactor is not None:
+        compactor.stop()
+        compactor = None
+
 # Store data in the database
 def store_reading(data: Dict[str, Any]):
-    """Store a reading in the database."""
+    """Queue a reading for the next batched write to the database."""
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Get current timestamp
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Insert data
-        cursor.execute('''
-        INSERT INTO readings (
-            timestamp, power_output, voltage_1, current_1, 
-            voltage_2, current_2, temperature, grid_voltage,
-            efficiency, peak_today, energy_today, energy_week,
-            energy_month, energy_year, energy_total
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            timestamp,
-            data.get('power_output', 0),
-            data.get('voltage_1', 0),
-            data.get('current_1', 0),
-            data.get('voltage_2', 0),
-            data.get('current_2', 0),
-            data.get('temperature', 0),
-            data.get('grid_voltage', 0),
-            data.get('efficiency', 0),
-            data.get('peak_today', 0),
-            data.get('energy_today', 0),
-            data.get('energy_week', 0),
-            data.get('energy_month', 0),
-            data.get('energy_year', 0),
-            data.get('energy_total', 0)
-        ))
-        
-        conn.commit()
-        conn.close()
+        reading_store.add(data)
         return True
     except Exception as e:
         logger.error(f"Error storing data in database: {e}")
         return False
 
 # Get readings from database
-def get_readings(hours: int = 24) -> List[Dict[str, Any]]:
-    """Get readings from the database for the specified time period."""
+def get_readings(hours: int = 24, inverter_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Get readings from the database for the specified time period, optionally for one inverter."""
     try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
         # Calculate start time
         start_time = (datetime.datetime.now() - datetime.timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:%S')
         
-        # Query data
-        cursor.execute('''
-        SELECT * FROM readings 
-        WHERE timestamp >= ? 
-        ORDER BY timestamp ASC
-        ''', (start_time,))
-        
-        rows = cursor.fetchall()
-        conn.close()
+        rows = reading_store.readings(start_time, inverter_id=inverter_id)
         
         # Convert to list of dicts
         return [dict(row) for row in rows]
@@ -202,77 +406,128 @@ def get_readings(hours: int = 24) -> List[Dict[str, Any]]:
         logger.error(f"Error retrieving data from database: {e}")
         return []
 
+# Get history at a resolution that fits the point budget
+def get_history(hours: int = 24, inverter_id: Optional[str] = None,
+                resolution: str = 'auto', max_points: Optional[int] = None,
+                fields: Optional[List[str]] = None) -> Tuple[str, List[Dict[str, Any]]]:
+    """Get history for the specified time period, downsampled to at most max_points per inverter.
+    
+    Raw readings or the finest rollup with up to HISTORY_OVERSAMPLE times
+    max_points rows is fetched, then reduced with LTTB so the shape of the
+    power curve survives the cut.
+    """
+    if max_points is None:
+        max_points = config['history_max_points']
+    try:
+        start_time = (datetime.datetime.now() - datetime.timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:%S')
+        
+        resolution, rows = reading_store.history(start_time, inverter_id=inverter_id,
+                                                 max_points=max_points * HISTORY_OVERSAMPLE,
+                                                 resolution=resolution)
+        readings = downsample([dict(row) for row in rows], max_points)
+        if fields:
+            readings = select_fields(readings, fields)
+        return resolution, readings
+    except Exception as e:
+        logger.error(f"Error retrieving history from database: {e}")
+        return resolution, []
+
+# Get per-day analytics from the cache
+def get_analytics(days: int, inverter_id: str) -> Dict[str, Any]:
+    """Analytics of the last days days, today included."""
+    # Timestamps are stored in local time, so days since the epoch count local days
+    today = (datetime.date.today() - datetime.date(1970, 1, 1)).days
+    ac_limit = float(config['ac_power_limit']) if config.get('ac_power_limit') else None
+    with reading_store.reader() as conn:
+        daily = analytics_cache.daily(conn, today - days + 1, today, inverter_id, ac_limit)
+    return aurora_analytics.summarize(daily, config.get('system_kwp'), config.get('latitude'),
+                                      config.get('longitude'), get_timezone(config['timezone']))
+
+# Fill the analytics cache in the background
+def warm_analytics():
+    """Compute the completed days of the longest /api/analytics range, so requests only compute today."""
+    inverters = config.get('inverters') or [{'id': DEFAULT_INVERTER_ID}]
+    try:
+        begin = time.perf_counter()
+        for inverter in inverters:
+            get_analytics(ANALYTICS_MAX_DAYS, inverter.get('id', DEFAULT_INVERTER_ID))
+        logger.info(f"Analytics cache filled in {time.perf_counter() - begin:.1f}s")
+    except Exception as e:
+        logger.error(f"Error computing analytics: {e}")
+
+# Format a reading value for the log, fields not read yet as '-'
+def format_value(value: Optional[float], spec: str) -> str:
+    return '-' if value is None else format(value, spec)
+
+# Handle a new reading from the polling engine
+def handle_reading(target, data: Dict[str, Any]):
+    """Store a reading and publish it as the latest value for its inverter."""
+    # The dashboard shows the first configured inverter
+    dashboard = target is polling_engine.targets[0]
+    latest.update(target.inverter_id, data, target.schedule.read_times(), dashboard)
+    if dashboard:
+        stream_hub.publish('status', data)
+    stream_hub.publish('reading', data, key=('reading', target.inverter_id))
+    store_reading(data)
+    publish_snapshot()
+    
+    logger.info(f"Inverter {target.inverter_id} data updated: {format_value(data['power_output'], '.2f')}W, Efficiency: {format_value(data['efficiency'], '.1f')}%, Today: {format_value(data['energy_today'], '.2f')}kWh")
+
+# Where the collector shares the latest readings
+def snapshot_path() -> str:
+    """Path of the snapshot file."""
+    return config.get('snapshot_path') or f"{db_path}.snapshot.json"
+
+# Share the latest readings with web workers
+def publish_snapshot():
+    """Publish the latest readings and the store version, when running as the collector."""
+    if snapshot_writer is None or polling_engine is None:
+        return
+    snapshot = latest.current
+    try:
+        snapshot_writer.publish({
+            'seq': snapshot.seq,
+            'captured_at': snapshot.captured_at,
+            'readings': {inverter_id: dict(data) for inverter_id, data in snapshot.readings.items()},
+            'field_times': {inverter_id: dict(times) for inverter_id, times in snapshot.field_times.items()},
+            'dashboard': snapshot.dashboard,
+            'store_version': reading_store.version,
+            'horizons': reading_store.horizons,
+        })
+    except Exception as e:
+        logger.error(f"Error publishing snapshot: {e}")
+
+# Take over the collector's latest readings in a web worker
+def apply_snapshot(state: Dict[str, Any]):
+    """Update the latest readings from a snapshot and push changed ones to stream clients."""
+    previous = latest.current
+    snapshot = ReadingSnapshot(state.get('seq', previous.seq), state.get('captured_at', 0.0),
+                               state.get('readings', {}), state.get('field_times', {}),
+                               state.get('dashboard'))
+    if latest.replace(snapshot):
+        if snapshot.seq < previous.seq:
+            # Started ahead of the collector's clock: drop entries from the worker's own seq
+            status_cache.clear()
+        for inverter_id, data in snapshot.readings.items():
+            if previous.readings.get(inverter_id) != data:
+                stream_hub.publish('reading', dict(data), key=('reading', inverter_id))
+        if snapshot.dashboard is not None and snapshot.reading() != previous.reading():
+            stream_hub.publish('status', snapshot.reading())
+    # Stored data changes in the collector: follow its store's version and retention
+    reading_store.version = state.get('store_version', reading_store.version)
+    reading_store.horizons = state.get('horizons', reading_store.horizons)
+
 # Async function to poll inverter
 async def poll_inverter():
-    """Poll the inverter for data at regular intervals."""
-    global last_reading
+    """Poll all configured inverters at their polling intervals."""
+    global polling_engine, backfiller
     
-    # Initialize client
-    client = AuroraClient(inverter_host, inverter_port)
-    
-    while not stop_event.is_set():
-        try:
-            # Connect to inverter
-            if await client.connect():
-                # Get data
-                power_output = await client.get_output_power()
-                voltage1 = await client.get_input_voltage(1)
-                current1 = await client.get_input_current(1)
-                voltage2 = await client.get_input_voltage(2)
-                current2 = await client.get_input_current(2)
-                temperature = await client.get_temperature()
-                grid_voltage = await client.get_grid_voltage()
-                energy_today = await client.get_energy_today()
-                energy_week = await client.get_energy_week()
-                energy_month = await client.get_energy_month()
-                energy_year = await client.get_energy_year()
-                energy_total = await client.get_energy_total()
-                peak_today = await client.get_peak_power_today()
-                
-                # Calculate efficiency if possible
-                efficiency = 0
-                input_power1 = voltage1 * current1
-                input_power2 = voltage2 * current2
-                total_input = input_power1 + input_power2
-                
-                if total_input > 0:
-                    efficiency = (power_output / total_input) * 100
-                
-                # Create data structure
-                data = {
-                    'power_output': power_output,
-                    'voltage_1': voltage1,
-                    'current_1': current1,
-                    'voltage_2': voltage2,
-                    'current_2': current2,
-                    'temperature': temperature,
-                    'grid_voltage': grid_voltage,
-                    'efficiency': efficiency,
-                    'peak_today': peak_today,
-                    'energy_today': energy_today,
-                    'energy_week': energy_week,
-                    'energy_month': energy_month,
-                    'energy_year': energy_year,
-                    'energy_total': energy_total,
-                    'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }
-                
-                # Store data
-                last_reading = data
-                store_reading(data)
-                
-                logger.info(f"Inverter data updated: {power_output:.2f}W, Efficiency: {efficiency:.1f}%, Today: {energy_today:.2f}kWh")
-                
-                # Close connection
-                client.close()
-            else:
-                logger.warning("Failed to connect to inverter")
-        except Exception as e:
-            logger.error(f"Error polling inverter: {e}")
-            client.close()
-        
-        # Wait for next polling interval
-        await asyncio.sleep(polling_interval)
+    polling_engine = PollingEngine(targets_from_config(config), handle_reading,
+                                   pipeline_depth=int(config['pipeline_depth']))
+    # Shares the engine's connections between poll windows
+    backfiller = Backfiller(reading_store, polling_engine, days=int(config['backfill_days']))
+    backfiller.start()
+    await polling_engine.run(stop_event)
 
 # Start monitoring thread
 def start_monitoring():
@@ -300,8 +555,12 @@ def start_monitoring():
 # Stop monitoring thread
 def stop_monitoring():
     """Stop the monitoring thread."""
-    global monitoring_thread, stop_event
+    global monitoring_thread, stop_event, backfiller
     
+    # Before the engine: its requests run on the polling loop
+    if backfiller is not None:
+        backfiller.stop()
+        backfiller = None
     if monitoring_thread and monitoring_thread.is_alive():
         stop_event.set()
         monitoring_thread.join(timeout=5)
@@ -315,7 +574,7 @@ def index():
     """Render the main dashboard."""
     return render_template('index.html', 
                            config=config, 
-                           last_reading=last_reading)
+                           last_reading=latest.current.reading())
 
 @app.route('/setup')
 def setup():
@@ -332,28 +591,43 @@ def api_config():
         try:
             data = request.json
             
-            # Update configuration
-            for key in data:
-                if key in config:
-                    # Type conversion for numeric values
-                    if key in ['inverter_port', 'web_port', 'polling_interval', 'ui_refresh_interval', 'chart_refresh_interval']:
-                        config[key] = int(data[key])
-                    else:
-                        config[key] = data[key]
-            
-            # Save configuration
-            if save_config():
-                # Reload configuration
-                load_config()
+            with config_lock:
+                previous = dict(config)
+                try:
+                    # Update configuration, checked before anything is saved
+                    config.update(parse_settings({key: data[key] for key in data if key in config}))
+                    validate_config(config)
+                except (TypeError, ValueError) as e:
+                    config.clear()
+                    config.update(previous)
+                    return jsonify({'status': 'error', 'message': f'Invalid configuration: {e}'})
                 
-                # Restart monitoring if needed
-                if monitoring_thread and monitoring_thread.is_alive():
-                    stop_monitoring()
-                    start_monitoring()
+                # Save configuration
+                if not save_config():
+                    config.clear()
+                    config.update(previous)
+                    return jsonify({'status': 'error', 'message': 'Failed to save configuration'})
                 
-                return jsonify({'status': 'success', 'message': 'Configuration updated successfully'})
-            else:
-                return jsonify({'status': 'error', 'message': 'Failed to save configuration'})
+                # Apply it to the running poller and tasks
+                try:
+                    restart = apply_config(previous)
+                except Exception:
+                    # Back to the settings that are running
+                    config.clear()
+                    config.update(previous)
+                    save_config()
+                    raise
+            
+            message = 'Configuration updated successfully'
+            if snapshot_reader is not None:
+                # The collector picks the change up from the file
+                if config.get('config_watch_interval'):
+                    message = f"Configuration saved; the collector applies it within {config['config_watch_interval']}s"
+                else:
+                    message = 'Configuration saved; restart the collector to apply it'
+            if restart:
+                message += f" (restart to apply: {', '.join(restart)})"
+            return jsonify({'status': 'success', 'message': message, 'restart': restart})
         except Exception as e:
             logger.error(f"Error updating configuration: {e}")
             return jsonify({'status': 'error', 'message': f'Error updating configuration: {e}'})
@@ -363,8 +637,28 @@ def api_config():
 
 @app.route('/api/data')
 def api_data():
-    """API endpoint to get current data."""
-    return jsonify(last_reading)
+    """API endpoint to get current data; with ?since=<seq>, wait for a newer snapshot."""
+    inverter_id = request.args.get('inverter')
+    since = request.args.get('since', type=int)
+    if since is None:
+        # The reading itself, as always; the snapshot's seq and age go in headers
+        snapshot = latest.current
+        response = jsonify(snapshot.reading(inverter_id))
+        if snapshot.captured_at:
+            response.headers['X-Reading-Age'] = str(snapshot.age())
+    else:
+        timeout = min(max(request.args.get('timeout', default=30, type=float), 0), LONG_POLL_MAX)
+        snapshot = latest.wait(since, timeout)
+        if snapshot is None:
+            # Nothing new: the client asks again with the same seq
+            response = Response(status=204)
+            response.headers['X-Reading-Seq'] = str(latest.current.seq)
+            return response
+        response = jsonify(snapshot.to_dict(inverter_id))
+    
+    response.headers['X-Reading-Seq'] = str(snapshot.seq)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/api/history')
 def api_history():
@@ -372,15 +666,308 @@ def api_history():
     try:
         # Get hours parameter
         hours = request.args.get('hours', default=24, type=int)
+        inverter_id = request.args.get('inverter')
+        resolution = request.args.get('resolution', default='auto')
+        if resolution not in HISTORY_RESOLUTIONS:
+            return jsonify({'status': 'error', 'message': f'Unknown resolution: {resolution}'}), 400
+        max_points = request.args.get('max_points', default=config['history_max_points'], type=int)
+        max_points = min(max(max_points, 3), HISTORY_MAX_POINTS_LIMIT)
+        fields = [f for f in request.args.get('fields', default='').split(',') if f]
+        
+        mimetype = negotiate_format()
+        if mimetype is None:
+            return jsonify({'status': 'error', 'message': f"Unsupported format: {request.args['format']}"}), 400
         
-        # Get readings
-        readings = get_readings(hours)
+        # Get readings, or rollups for long periods, downsampled to max_points
+        resolution, readings = get_history(hours, inverter_id, resolution, max_points, fields)
         
-        return jsonify(readings)
+        response = Response(encode(readings, mimetype, {'resolution': resolution}), mimetype=mimetype)
+        response.headers['X-History-Resolution'] = resolution
+        response.vary.add('Accept')
+        return response
     except Exception as e:
         logger.error(f"Error retrieving history: {e}")
         return jsonify({'status': 'error', 'message': f'Error retrieving history: {e}'})
 
+@app.route('/api/status')
+def api_status():
+    """API endpoint to get the latest reading, revalidated with ETags."""
+    inverter_id = request.args.get('inverter')
+    
+    snapshot = latest.current
+    
+    def build():
+        return json.dumps(snapshot.reading(inverter_id)).encode(), MIME_JSON, {}
+    
+    return cached_response(('status', inverter_id), snapshot.seq, build, status_cache)
+
+@app.route('/api/readings')
+def api_readings():
+    """API endpoint to get the chart data for a dashboard period (day/week/month/year)."""
+    period = request.args.get('period', default='day')
+    if period not in PERIOD_HOURS:
+        return jsonify({'status': 'error', 'message': f'Unknown period: {period}'}), 400
+    inverter_id = request.args.get('inverter')
+    max_points = request.args.get('max_points', default=config['history_max_points'], type=int)
+    max_points = min(max(max_points, 3), HISTORY_MAX_POINTS_LIMIT)
+    fields = [f for f in request.args.get('fields', default='').split(',') if f]
+    mimetype = negotiate_format()
+    if mimetype is None:
+        return jsonify({'status': 'error', 'message': f"Unsupported format: {request.args['format']}"}), 400
+    
+    def build():
+        resolution, readings = get_history(PERIOD_HOURS[period], inverter_id, 'auto', max_points, fields)
+        return (encode(readings, mimetype, {'resolution': resolution}), mimetype,
+                {'X-History-Resolution': resolution})
+    
+    # Only new stored readings change the answer, so the store's write version keys the cache
+    key = ('readings', period, inverter_id, max_points, tuple(fields), mimetype)
+    return cached_response(key, reading_store.version, build)
+
+@app.route('/api/analytics')
+def api_analytics():
+    """API endpoint to get daily yield, performance ratio, clipping and string mismatch."""
+    if aurora_analytics is None:
+        return jsonify({'status': 'error', 'message': 'Analytics require numpy'}), 501
+    days = min(max(request.args.get('days', default=30, type=int), 1), ANALYTICS_MAX_DAYS)
+    # Readings are per inverter: default to the one the dashboard shows
+    inverters = config.get('inverters') or [{'id': DEFAULT_INVERTER_ID}]
+    inverter_id = request.args.get('inverter', default=inverters[0].get('id', DEFAULT_INVERTER_ID))
+    
+    def build():
+        return json.dumps(get_analytics(days, inverter_id)).encode(), MIME_JSON, {}
+    
+    return cached_response(('analytics', days, inverter_id), reading_store.version, build)
+
+@app.route('/api/energy')
+def api_energy():
+    """API endpoint to get the energy per day, including days read back from the inverter's log."""
+    days = min(max(request.args.get('days', default=30, type=int), 1), ANALYTICS_MAX_DAYS)
+    inverters = config.get('inverters') or [{'id': DEFAULT_INVERTER_ID}]
+    inverter_id = request.args.get('inverter', default=inverters[0].get('id', DEFAULT_INVERTER_ID))
+    
+    def build():
+        today = datetime.date.today()
+        first_day = (today - datetime.timedelta(days=days - 1)).isoformat()
+        energy = reading_store.daily_energy(first_day, today.isoformat(), inverter_id)
+        return json.dumps(energy).encode(), MIME_JSON, {}
+    
+    return cached_response(('energy', days, inverter_id), reading_store.version, build)
+
+@app.route('/api/export')
+def api_export():
+    """API endpoint to stream the readings of any time range as CSV, NDJSON or Parquet."""
+    export_format = request.args.get('format', default='csv')
+    if export_format not in aurora_export.FORMATS:
+        return jsonify({'status': 'error', 'message': f'Unknown format: {export_format}'}), 400
+    if export_format not in aurora_export.available_formats():
+        return jsonify({'status': 'error', 'message': f'{export_format} exports require pyarrow'}), 501
+    if 'from' not in request.args:
+        return jsonify({'status': 'error', 'message': 'from is required'}), 400
+    try:
+        start_time = aurora_export.parse_time(request.args['from'])
+        end_time = aurora_export.parse_time(request.args['to']) if 'to' in request.args else None
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid time: {e}'}), 400
+    inverter_id = request.args.get('inverter')
+    
+    # Rows are read and sent a chunk at a time; streamed responses aren't compressed
+    mimetype = aurora_export.FORMATS[export_format][0]
+    name = aurora_export.filename(export_format, start_time, end_time)
+    return Response(aurora_export.export(reading_store, export_format, start_time, end_time, inverter_id),
+                    mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename="{name}"'})
+
+@app.route('/api/stream')
+def api_stream():
+    """Server-Sent Events stream: 'status' for the dashboard inverter, 'reading' for every inverter, 'config'."""
+    subscription = stream_hub.subscribe()
+    response = Response(stream_hub.events(subscription), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Pick the response encoding: ?format= wins over the Accept header
+def negotiate_format() -> Optional[str]:
+    """Return the media type to answer with, or None for an unsupported ?format=."""
+    fmt = request.args.get('format')
+    if fmt is not None:
+        mimetype = FORMATS.get(fmt)
+        return mimetype if mimetype in available_types() else None
+    return request.accept_mimetypes.best_match(available_types(), default=MIME_JSON)
+
+# Serve a response from the cache, honouring If-None-Match
+def cached_response(key, version, build, cache: ResponseCache = response_cache) -> Response:
+    """Answer with 304, a cached response or one freshly built by build() -> (body, mimetype, headers)."""
+    etag = ResponseCache.etag(key, version)
+    if request.if_none_match.contains(etag):
+        # Client is up to date: no query, no encoding
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    
+    entry = cache.get(key, version)
+    if entry is None:
+        body, mimetype, headers = build()
+        entry = cache.put(key, version, body, mimetype, headers)
+    
+    # Compress once per Accept-Encoding variant
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    variant = entry.variants.get(accept_encoding)
+    if variant is None:
+        variant = entry.variants[accept_encoding] = compress(entry.body, request.accept_encodings)
+    body, encoding = variant
+    
+    response = Response(body, mimetype=entry.mimetype, headers=entry.headers)
+    response.set_etag(entry.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept')
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics: the latest readings plus poller, database and request latencies."""
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+# Values gathered from current state on every scrape
+def collect_metrics() -> List[Metric]:
+    """Build the metric families for the latest readings and the counters kept by other objects."""
+    snapshot = latest.current
+    families: List[Metric] = []
+    for name, documentation, label, fields in READING_METRICS:
+        gauge = Gauge(name, documentation, ('inverter', label) if label else ('inverter',))
+        for inverter_id, reading in snapshot.readings.items():
+            for field, value in fields.items():
+                if reading.get(field) is not None:
+                    gauge.labels(*((inverter_id, value) if label else (inverter_id,))).set(reading[field])
+        families.append(gauge)
+    
+    ages = Gauge('aurora_field_age_seconds', 'Seconds since each field was read from the inverter',
+                 ('inverter', 'field'))
+    for inverter_id in snapshot.field_times:
+        for field, age in snapshot.field_ages(inverter_id).items():
+            ages.labels(inverter_id, field).set(age)
+    families.append(ages)
+    
+    if polling_engine is not None:
+        polls = Counter('aurora_polls_total', 'Poll windows that produced a reading', ('inverter',))
+        failures = Counter('aurora_poll_failures_total', 'Poll windows without a reading', ('inverter',))
+        for target in polling_engine.targets:
+            polls.labels(target.inverter_id).inc(target.readings)
+            failures.labels(target.inverter_id).inc(target.failures)
+        families += [polls, failures]
+    if reading_store is not None and not reading_store.readonly:
+        rows = Counter('aurora_db_rows_written_total', 'Readings written to the database')
+        rows.inc(reading_store.rows_written)
+        pending = Gauge('aurora_db_pending_rows', 'Readings waiting for the next batch write')
+        pending.set(reading_store.pending)
+        backlog = reading_store.backlog()
+        spilled = Gauge('aurora_db_spilled_rows', 'Pending readings only in the spool, the memory queue being full')
+        spilled.set(backlog['spilled'])
+        spool = Gauge('aurora_spool_bytes', 'Size of the write-ahead spool on disk')
+        spool.set(backlog['spool_bytes'])
+        families += [rows, pending, spilled, spool]
+    
+    clients = Gauge('aurora_stream_clients', 'Connected /api/stream clients')
+    clients.set(stream_hub.subscribers)
+    hits = Counter('aurora_response_cache_hits_total', 'Responses served from the cache', ('cache',))
+    misses = Counter('aurora_response_cache_misses_total', 'Responses built because the cache had none',
+                     ('cache',))
+    for name, cache in (('status', status_cache), ('stored', response_cache)):
+        hits.labels(name).inc(cache.hits)
+        misses.labels(name).inc(cache.misses)
+    return families + [clients, hits, misses]
+
+REGISTRY.add_collector(collect_metrics)
+
+# Time requests for /metrics
+@app.before_request
+def start_request_timer():
+    """Remember when the request started."""
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    """Observe the handler latency; registered first, so it runs after compression."""
+    started = g.get('request_started')
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_SECONDS.labels(endpoint, request.method, response.status_code).observe(time.perf_counter() - started)
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Compress responses with brotli or gzip when the client accepts it."""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or not response.mimetype.startswith(COMPRESSIBLE_TYPES)):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    body, encoding = compress(response.get_data(), request.accept_encodings)
+    if encoding:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+# Run as the only poller, for web workers started with create_app()
+def run_collector():
+    """Poll the inverters, store readings and publish the latest ones until stopped."""
+    global snapshot_writer
+    
+    load_config()
+    if not init_db():
+        sys.exit(1)
+    snapshot_writer = SnapshotWriter(snapshot_path())
+    reading_store.on_flush = publish_snapshot
+    start_compaction()
+    start_monitoring()
+    start_config_watch()
+    metrics_server = serve(int(config['metrics_port']), config['web_host']) if config.get('metrics_port') else None
+    logger.info(f"Collector running, publishing to {snapshot_path()}")
+    
+    stopped = threading.Event()
+    signal.signal(signal.SIGINT, lambda sig, frame: stopped.set())
+    signal.signal(signal.SIGTERM, lambda sig, frame: stopped.set())
+    stopped.wait()
+    
+    logger.info("Shutting down...")
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    stop_config_watch()
+    stop_monitoring()
+    stop_compaction()
+    close_db()
+    snapshot_writer.remove()
+
+# WSGI application for web workers
+def create_app(wait: float = 30):
+    """Set up a web worker, e.g. gunicorn 'aurora_web_app:create_app()'.
+    
+    Workers don't poll: aurora_collector.py does, and they serve its
+    database (read-only) and latest readings. The collector creates the
+    database, so wait up to wait seconds for it.
+    """
+    global snapshot_reader
+    
+    load_config()
+    deadline = time.monotonic() + wait
+    while not os.path.exists(db_path) and time.monotonic() < deadline:
+        time.sleep(0.5)
+    if not init_db(readonly=True):
+        raise RuntimeError(f"Cannot open {db_path}: start aurora_collector.py first")
+    snapshot_reader = SnapshotReader(snapshot_path())
+    state = snapshot_reader.read()
+    if state:
+        apply_snapshot(state)
+    snapshot_reader.watch(apply_snapshot)
+    # Settings saved by other workers
+    start_config_watch()
+    return app
+
 # Initialize and start
 def main():
     """Main function to initialize and start the application."""
@@ -389,14 +976,23 @@ def main():
     
     # Initialize database
     init_db()
+    start_compaction()
     
     # Start monitoring
     start_monitoring()
+    start_config_watch()
+    
+    if aurora_analytics is not None:
+        threading.Thread(target=warm_analytics, daemon=True).start()
     
     # Set up signal handlers
     def signal_handler(sig, frame):
         logger.info("Shutting down...")
+        stop_config_watch()
         stop_monitoring()
+        stream_hub.close()
+        stop_compaction()
+        close_db()
         sys.exit(0)
     
     signal.signal(signal.SIGINT, signal_handler)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Client Tests
+
+import asyncio
+
+from aurora_client import AuroraClient
+from aurora_simulator import AuroraSimulator
+
+
+class DroppingSimulator(AuroraSimulator):
+    """Simulator that leaves the request with a given number unanswered."""
+
+    def __init__(self, drop: int, **options):
+        super().__init__(**options)
+        self.drop = drop
+        self.answered = 0
+
+    def answer(self, request: bytes):
+        self.answered += 1
+        if self.answered == self.drop:
+            return None
+        return super().answer(request)
+
+
+async def send_batch(depth: int, size: int, drop: int):
+    simulator = DroppingSimulator(drop)
+    await simulator.start()
+    client = AuroraClient(simulator.host, simulator.port, timeout=200)
+    client.pipeline_depth = depth
+    await client.connect()
+    try:
+        request = (2, AuroraClient.CMD_GET_DSP, (AuroraClient.DSP_OUTPUT_POWER, 0))
+        return await client.send_commands([request] * size)
+    finally:
+        client.close()
+        await simulator.stop()
+
+
+def test_dropped_reply_loses_only_its_request():
+    responses = asyncio.run(send_batch(depth=1, size=8, drop=4))
+    assert [bool(r) for r in responses] == [True, True, True, False, True, True, True, True]
+
+
+def test_dropped_reply_loses_only_requests_in_flight_when_pipelining():
+    responses = asyncio.run(send_batch(depth=3, size=9, drop=4))
+    # Replies are matched in order, so the timeout hits the last request;
+    # only the one still in flight then is given up
+    assert sum(1 for r in responses if r) == 8
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Daylight and Activity Tracking Tests
+
+import datetime
+
+from aurora_daylight import ASLEEP, ActivityTracker, sun_times
+
+DAY = datetime.date(2026, 6, 1)
+
+
+class ClockedTracker(ActivityTracker):
+    """Tracker for a site in Munich whose clock is set by the test."""
+
+    def __init__(self, **options):
+        super().__init__('test', 48.14, 11.58, datetime.timezone.utc, **options)
+        self.clock = None
+
+    def now(self):
+        return self.clock
+
+
+def test_backoff_starts_over_after_wake_window():
+    tracker = ClockedTracker()
+    sunrise = sun_times(DAY, tracker.latitude, tracker.longitude, tracker.tz)[0]
+
+    # Probed every minute from half an hour before sunrise, without an answer
+    tracker.clock = sunrise - datetime.timedelta(seconds=tracker.wake_margin)
+    while tracker.in_wake_window():
+        tracker.update(False)
+        assert tracker.delay(300) == tracker.wake_interval
+        tracker.clock += datetime.timedelta(seconds=tracker.wake_interval)
+
+    # A late riser: the first miss after the window backs off from the normal interval
+    tracker.update(False)
+    assert tracker.state == ASLEEP
+    assert tracker.delay(300) == 300
+    tracker.update(False)
+    assert tracker.delay(300) == 600
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Measurement Scheduler Tests
+
+from aurora_schedule import MeasurementSchedule, measurement_intervals
+
+
+def schedule_with(values):
+    """A schedule whose fields in values have been read."""
+    schedule = MeasurementSchedule(measurement_intervals(30))
+    for entry in schedule.entries:
+        if entry.name in values:
+            entry.value = values[entry.name]
+    return schedule
+
+
+def test_unread_fields_are_none():
+    data = schedule_with({'power_output': 1500.0, 'voltage_1': 300.0, 'current_1': 5.0}).snapshot()
+    assert data['power_output'] == 1500.0
+    assert data['energy_total'] is None
+    assert data['energy_today'] is None
+    # current_2 and voltage_2 were never read
+    assert data['efficiency'] is None
+
+
+def test_efficiency_once_inputs_are_read():
+    data = schedule_with({'power_output': 1500.0, 'voltage_1': 300.0, 'current_1': 5.0,
+                          'voltage_2': 0.0, 'current_2': 0.0}).snapshot()
+    assert data['efficiency'] == 100.0
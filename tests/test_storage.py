@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# Aurora Inverter Monitor - Storage Tests
+
+import pytest
+
+from aurora_storage import ReadingStore, rebuild_rollups
+
+ENERGY = [0.0, 1000.0, 1002.5, 1005.0]
+
+
+def store_readings(path, compact, batches):
+    """A store holding readings with the ENERGY counters, flushed in the given number of batches."""
+    store = ReadingStore(str(path), flush_interval=0, compact=compact)
+    store.open()
+    per_batch = len(ENERGY) // batches
+    for index, energy in enumerate(ENERGY):
+        store.add({'timestamp': f'2026-06-01 10:{index:02d}:00', 'power_output': 1000.0,
+                   'energy_today': energy - 1000.0 if energy else 0.0, 'energy_total': energy})
+        if (index + 1) % per_batch == 0:
+            store.flush()
+    return store
+
+
+def day_rollup(store):
+    with store.reader() as conn:
+        return tuple(conn.execute("SELECT energy_first, energy_last FROM rollups WHERE resolution = 'day'").fetchone())
+
+
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('batches', [1, 2])
+def test_zero_first_counter_is_skipped(tmp_path, compact, batches):
+    store = store_readings(tmp_path / 'aurora.db', compact, batches)
+    try:
+        assert day_rollup(store) == (1000.0, 1005.0)
+        assert store.daily_energy('2026-06-01', '2026-06-01', 'default')[0]['energy_kwh'] == 5.0
+    finally:
+        store.close()
+
+
+def test_rebuild_skips_zero_counter(tmp_path):
+    store = store_readings(tmp_path / 'aurora.db', False, 1)
+    try:
+        with store._lock, store.writer:
+            rebuild_rollups(store.writer.cursor())
+        assert day_rollup(store) == (1000.0, 1005.0)
+    finally:
+        store.close()
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_daily_energy_includes_morning_before_monitoring(tmp_path, compact):
+    # Monitoring starts at noon, after 4 kWh were already produced
+    store = ReadingStore(str(tmp_path / 'aurora.db'), flush_interval=0, compact=compact)
+    store.open()
+    try:
+        for index, produced in enumerate([0.0, 0.5, 1.0]):
+            store.add({'timestamp': f'2026-06-01 12:{index:02d}:00', 'power_output': 1000.0,
+                       'energy_today': 4.0 + produced, 'energy_total': 1000.0 + produced})
+        store.flush()
+        assert store.daily_energy('2026-06-01', '2026-06-01', 'default')[0]['energy_kwh'] == 5.0
+    finally:
+        store.close()